@@ -1,17 +1,36 @@
-import os, re, numpy as np, pandas as pd, geopandas as gpd
+import os, re, hashlib, numpy as np, pandas as pd, geopandas as gpd
+from concurrent.futures import ThreadPoolExecutor
 from shapely.geometry import Point
 
+from desc_table import parse_desc_table
+from geojson_writer import write_geojson
+from instrument import span
+from layer_cache import cached_layer
+
 TARGET_CRS = 3414  # Singapore SVY21 (meters)
-os.makedirs("content/out", exist_ok=True)
 
-PATH_SUBZONES = "content/MasterPlan2019SubzoneBoundaryNoSeaGEOJSON.geojson"
-PATH_MRT      = "content/LTAMRTStationExitGEOJSON.geojson"
-PATH_HAWKER   = "content/HawkerCentresGEOJSON.geojson"
-PATH_POP      = "content/ResidentPopulationbyPlanningAreaSubzoneofResidenceAgeGroupandSexCensusofPopulation2020.csv"
+# inputs and caches resolve against the repo root, so the backend can import
+# this module from any working directory
+CONTENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content")
+
+PATH_SUBZONES = os.path.join(CONTENT, "MasterPlan2019SubzoneBoundaryNoSeaGEOJSON.geojson")
+PATH_MRT      = os.path.join(CONTENT, "LTAMRTStationExitGEOJSON.geojson")
+PATH_HAWKER   = os.path.join(CONTENT, "HawkerCentresGEOJSON.geojson")
+PATH_POP      = os.path.join(CONTENT, "ResidentPopulationbyPlanningAreaSubzoneofResidenceAgeGroupandSexCensusofPopulation2020.csv")
 
-BUS_GPKG  = "content/bus_stops.geojson"
+BUS_GPKG  = os.path.join(CONTENT, "bus_stops.geojson")
 BUS_LAYER = "bus_stops"
 
+CACHE_DIR = os.path.join(CONTENT, "cache")  # persisted demand-side kernel sums
+LAYER_CACHE_DIR = os.path.join(CACHE_DIR, "layers")  # parsed input layers (layer_cache)
+LAYER_VERSION = 3  # bump when a loader below changes what it returns
+
+# Optional pedestrian graph (line layer, e.g. an offline OSM extract); when it
+# exists the kernels use walking distance (network.py)
+PATH_WALK_NETWORK = os.path.join(CONTENT, "walk_network.gpkg")
+NETWORK_CACHE_DIR = os.path.join(CACHE_DIR, "network")  # built graph + distance matrices
+OUT_DIR = os.path.join(CONTENT, "out")  # __main__ outputs
+
 
 def kernel(dist_m, lam, kind="exp"):
     t = np.clip(dist_m / lam, 0, None)
@@ -30,25 +49,266 @@ def robust_z(x):
 def xy_from_gdf(gdf):
     return np.vstack([gdf.geometry.x.to_numpy(), gdf.geometry.y.to_numpy()]).T
 
+def eval_points_xy(eval_units_gdf):
+    # evaluation points = centroids if polygons
+    with span("eval.centroid", rows=len(eval_units_gdf)):
+        eval_pts = (eval_units_gdf.geometry.centroid
+                    if eval_units_gdf.geom_type.isin(["Polygon","MultiPolygon"]).any()
+                    else eval_units_gdf.geometry)
+    return xy_from_gdf(gpd.GeoDataFrame(geometry=eval_pts, crs=eval_units_gdf.crs))
+
 def pairwise_dist(A, B):
+    # |a-b|^2 = |a|^2 + |b|^2 - 2ab cancels catastrophically for nearby points
+    # when |a| is large; centring first shrinks |a| from SVY21's ~3e4 m to the
+    # data extent, so the absolute error in D^2 is ~eps*extent^2 (~1e-7 m^2)
+    A, B = _centre(A, B)
     A2 = np.sum(A**2, axis=1)[:, None]
     B2 = np.sum(B**2, axis=1)[None, :]
     D2 = np.clip(A2 + B2 - 2 * A @ B.T, 0, None)
     return np.sqrt(D2)
 
-def compute_hawker_opportunity(
+def _centre(A, B, dtype=None):
+    """A, B shifted by the midpoint of their joint bounding box (optionally cast)."""
+    A, B = np.asarray(A, float), np.asarray(B, float)
+    pts = [X for X in (A, B) if len(X)]
+    if pts:
+        lo = np.min([X.min(axis=0) for X in pts], axis=0)
+        hi = np.max([X.max(axis=0) for X in pts], axis=0)
+        c = (lo + hi) / 2
+        A, B = A - c, B - c
+    return (A, B) if dtype is None else (A.astype(dtype), B.astype(dtype))
+
+# Default truncation radius of the sparse engine, in multiples of lambda.
+# Only the evaluation-side kernels (Dem, Sup, Acc) are truncated: the 2SFCA
+# ratio C_j/denom_j amplifies the relative error of hawkers whose catchment is
+# mostly kernel tail, so compute_components always sums denom_j exactly
+# (it is only |U| x |J|). On the Singapore layers 5*lambda keeps 4-15% of the
+# pairs (bus 0.04, demand 0.09, hawker 0.10, MRT 0.15) against 24-63% at
+# 15*lambda, which at 48 B/pair used more memory than the 16 B/pair dense path.
+SPARSE_CUTOFF = {"exp": 5.0, "gauss": 5.0}
+
+# Scratch bytes per (source, destination) pair held by one streaming block:
+# two float64 buffers for the dense engine. For the sparse one (an upper
+# bound, every pair in range) the KD-tree's (i, j, d) records (24) are live
+# alongside their argsort (8) and the sorted copy (24); its result vector
+# can briefly hold up to twice the records while growing. Measured peak
+# (tracemalloc and RSS, tests/test_kernels.py): 56-58 bytes per pair.
+_BLOCK_PAIR_BYTES = {"dense": 16, "dense32": 8, "sparse": 80}
+
+# Per-worker block budget when workers is given without max_bytes.
+WORKER_BLOCK_BYTES = 64 * 2**20
+
+# Block budget of the float32 dense path when max_bytes is not given: small
+# enough that a block's buffer stays cache-resident while it is turned from
+# squared distances into weighted kernel values in place.
+FUSED_BLOCK_BYTES = 4 * 2**20
+
+def kernel_sum(XY_src, w_src, XY_dst, lam, kind="exp", *, engine="dense", cutoff=None,
+               max_bytes=None, workers=None, dtype=None):
+    """sum_s w_s * K(d(s, d) / lam) for every destination point d.
+
+    engine="dense" materialises the full |src| x |dst| distance matrix.
+    engine="sparse" only visits pairs closer than cutoff*lam (KD-tree query), so
+    memory is proportional to the number of neighbour pairs. Pairs beyond the
+    cutoff are dropped, which under-estimates each sum by at most
+    exp(-cutoff) * sum(w) for kind="exp" and exp(-cutoff**2/2) * sum(w) for
+    the gaussian.
+
+    With max_bytes set, destinations are streamed in blocks whose scratch
+    arrays stay under that budget; only the length-|dst| result is kept.
+
+    workers=N evaluates the blocks on N threads (NumPy releases the GIL in
+    the elementwise kernel and the reductions), sharing the coordinate and
+    weight arrays in place. max_bytes is then split across the workers.
+    Every destination is reduced in the same order whatever the blocking
+    (the default call is a single block), so the result is bit-identical for
+    any workers/max_bytes combination, including neither.
+
+    dtype=np.float32 (dense engine only) centres the coordinates on their
+    joint bounding box in float64, then evaluates distance, kernel and
+    weighting in place on float32 blocks (FUSED_BLOCK_BYTES unless max_bytes
+    is given) and accumulates the sums in float64: half the scratch memory
+    and bandwidth of float64. Error bounds, for centred coordinates within
+    R of the origin: each distance is off by at most ~4*R*2**-24 (~6 mm for
+    Singapore's R ~ 25 km), so each kernel term is off by a relative
+    ~(6 mm / lam + t * 2**-23) at t = d/lam, i.e. below 1e-5 for lam >= 500 m
+    and the terms that matter (t < 30); with all weights non-negative the
+    same relative bound holds for the sums. Measured on the Singapore layers:
+    Dem/Sup/Acc within 3e-7 relative, H_score within 1e-6, same ranking.
+    """
+    w_src = np.asarray(w_src, float)
+    if engine not in ("dense", "sparse"):
+        raise ValueError(f"unknown engine: {engine!r}")
+    f32 = dtype is not None and np.dtype(dtype) == np.float32
+    if dtype is not None and np.dtype(dtype) not in (np.float32, np.float64):
+        raise ValueError(f"unsupported dtype: {dtype!r}")
+    if f32 and engine != "dense":
+        raise ValueError("dtype=float32 needs engine='dense'")
+    if engine == "sparse" and cutoff is None:
+        cutoff = SPARSE_CUTOFF["exp" if kind == "exp" else "gauss"]
+    if f32:
+        XY_src, XY_dst = _centre(XY_src, XY_dst, np.float32)
+    elif max_bytes is None and workers is None:
+        if engine == "sparse":
+            return _kernel_sum_sparse(XY_src, w_src, XY_dst, lam, kind, cutoff)
+        # one block through the same reduction as the blocked/threaded paths,
+        # so every workers/max_bytes setting gives the same bits
+        return _kernel_sum_block(np.asarray(XY_src, float), w_src, np.asarray(XY_dst, float), lam, kind)
+
+    out = np.zeros(len(XY_dst))
+    if len(XY_src) == 0:
+        return out
+    workers = max(1, workers or 1)
+    if max_bytes is not None:
+        block_bytes = max_bytes / workers
+    else:
+        block_bytes = FUSED_BLOCK_BYTES if f32 else WORKER_BLOCK_BYTES
+    tree = None
+    if engine == "sparse":
+        from scipy.spatial import cKDTree
+        tree = cKDTree(XY_src)
+
+    def run(block):
+        lo, hi = block
+        if engine == "sparse":
+            out[lo:hi] = _kernel_sum_sparse(XY_src, w_src, XY_dst[lo:hi], lam, kind, cutoff, src_tree=tree)
+        else:
+            out[lo:hi] = _kernel_sum_block(XY_src, w_src, XY_dst[lo:hi], lam, kind)
+
+    blocks = eval_blocks(len(XY_dst), len(XY_src), block_bytes, engine="dense32" if f32 else engine,
+                         min_blocks=workers)
+    if workers == 1:
+        for b in blocks:
+            run(b)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, blocks))
+    return out
+
+def eval_blocks(n_dst, n_src, max_bytes, engine="dense", min_blocks=1):
+    """(lo, hi) destination ranges whose kernel scratch fits in max_bytes."""
+    rows = max(1, int(max_bytes // (_BLOCK_PAIR_BYTES[engine] * max(n_src, 1))))
+    rows = min(rows, max(1, -(-n_dst // min_blocks)))
+    return [(lo, min(lo + rows, n_dst)) for lo in range(0, n_dst, rows)]
+
+def _kernel_sum_block(XY_src, w_src, XY_blk, lam, kind):
+    # Laid out (dst, src) and reduced along the contiguous src axis, so each
+    # destination's sum is independent of how the destinations were blocked.
+    # Distances come from coordinate differences, updated in place, in the
+    # coordinates' dtype; the sums are always accumulated in float64.
+    D = np.subtract.outer(XY_blk[:, 0], XY_src[:, 0])
+    D *= D
+    dy = np.subtract.outer(XY_blk[:, 1], XY_src[:, 1])
+    dy *= dy
+    D += dy
+    del dy
+    np.sqrt(D, out=D)
+    D /= lam
+    if kind == "exp":
+        D *= -1
+    else:
+        D *= D
+        D *= -0.5
+    np.exp(D, out=D)
+    D *= w_src
+    return D.sum(axis=1, dtype=np.float64)
+
+def _kernel_sum_sparse(XY_src, w_src, XY_dst, lam, kind, cutoff, src_tree=None):
+    from scipy.spatial import cKDTree
+    if len(XY_src) == 0 or len(XY_dst) == 0:
+        return np.zeros(len(XY_dst))
+    tree = src_tree if src_tree is not None else cKDTree(XY_src)
+    pairs = tree.sparse_distance_matrix(cKDTree(XY_dst), cutoff * lam, output_type="ndarray")
+    # pair order follows the destination tree; sort by source so every
+    # destination accumulates in the same order however dst was blocked
+    pairs = pairs[np.argsort(pairs["i"], kind="stable")]
+    contrib = w_src[pairs["i"]] * kernel(pairs["v"], lam, kind=kind)
+    return np.bincount(pairs["j"], weights=contrib, minlength=len(XY_dst))
+
+def content_hash(*parts):
+    """Stable hex digest over arrays (dtype, shape and bytes) and scalars."""
+    h = hashlib.sha1()
+    for p in parts:
+        if isinstance(p, np.ndarray):
+            h.update(f"{p.dtype}{p.shape}".encode())
+            h.update(np.ascontiguousarray(p).tobytes())
+        else:
+            h.update(repr(p).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+def cached_kernel_sum(cache_dir, name, XY_src, w_src, XY_dst, lam, kind="exp", **kw):
+    """kernel_sum persisted as <cache_dir>/<name>_<hash>.npy.
+
+    The key covers the source/destination coordinates, the weights, lam, kind
+    and the engine settings that change the numbers (engine, the cutoff the
+    sparse engine actually uses, float32); workers and max_bytes only pick
+    the blocking, which does not affect the result.
+    """
+    if cache_dir is None:
+        return kernel_sum(XY_src, w_src, XY_dst, lam, kind, **kw)
+    f32 = kw.get("dtype") is not None and np.dtype(kw["dtype"]) == np.float32
+    engine = kw.get("engine", "dense")
+    cutoff = None
+    if engine == "sparse":  # resolved here, so a new SPARSE_CUTOFF default misses the old entries
+        cutoff = float(kw.get("cutoff") or SPARSE_CUTOFF["exp" if kind == "exp" else "gauss"])
+    key = content_hash(name, np.asarray(XY_src, float), np.asarray(w_src, float),
+                       np.asarray(XY_dst, float), float(lam), kind,
+                       engine, cutoff, *(["float32"] if f32 else []))
+    path = os.path.join(cache_dir, f"{name}_{key}.npy")
+    if os.path.exists(path):
+        return np.load(path)
+    val = kernel_sum(XY_src, w_src, XY_dst, lam, kind, **kw)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, val)
+    os.replace(tmp, path)
+    return val
+
+# compute_components() depends only on these; reweight() only on WEIGHT_PARAMS
+LAMBDA_PARAMS = ("kernel_kind", "lambda_D", "lambda_S", "lambda_C", "lambda_M", "lambda_B")
+WEIGHT_PARAMS = ("w_D", "w_S", "w_A", "beta_MRT", "beta_BUS")
+COMPONENTS = ("Dem", "Sup", "Acc_MRT", "Acc_BUS")
+
+def compute_components(
     eval_units_gdf, demand_gdf, supply_gdf, mrt_gdf=None, bus_gdf=None,
     *, pop_col="population", cap_col="capacity",
     mrt_w_col=None, bus_w_col=None,
     kernel_kind="exp",
     lambda_D=700, lambda_S=700, lambda_C=700, lambda_M=900, lambda_B=500,
-    w_D=0.5, w_S=0.3, w_A=0.2, beta_MRT=1.0, beta_BUS=1.0
+    engine="dense", cutoff=None, max_bytes=None, workers=None, dtype=None, cache_dir=None, network=None
 ):
-    # evaluation points = centroids if polygons
-    eval_pts = (eval_units_gdf.geometry.centroid
-                if eval_units_gdf.geom_type.isin(["Polygon","MultiPolygon"]).any()
-                else eval_units_gdf.geometry)
-    XY_i = xy_from_gdf(gpd.GeoDataFrame(geometry=eval_pts, crs=eval_units_gdf.crs))
+    """Component cube: the raw per-unit vectors {Dem, Sup, Acc_MRT, Acc_BUS}.
+
+    These are all the kernel work for one lambda set; reweight() turns them
+    into H_score for any weights/betas in O(N). A missing MRT or bus layer
+    gives a zero vector.
+    """
+    # engine="sparse" truncates the Dem/Sup/Acc kernels at cutoff*lambda (see
+    # kernel_sum); denom_j stays exact. With the SPARSE_CUTOFF defaults H_score
+    # agrees with the dense engine on the Singapore layers to within 0.05 for
+    # exp (spread ~5.6; ranks shift by at most 12, same top 20; cutoff=8 gives
+    # 1.4e-3) and 1e-5 for gauss.
+    # max_bytes bounds the per-block scratch memory: evaluation points are
+    # streamed in blocks and only the raw vectors are kept.
+    # workers=N spreads the blocks over N threads; the scores are
+    # bit-identical to workers=1 with the same engine.
+    # cache_dir persists the demand kernel sums Dem_i and the 2SFCA
+    # denominators denom_j, keyed by content hash, so sweeps over the
+    # supply/accessibility lambdas skip the O(U*I + U*J) work.
+    # dtype=np.float32 runs the dense kernels in float32 (see kernel_sum).
+    # network=network.NetworkDistances(...) replaces the engine: every kernel
+    # runs on cached walking-distance matrices instead (cache_dir is unused).
+    engine_kw = dict(engine=engine, cutoff=cutoff, max_bytes=max_bytes, workers=workers, dtype=dtype)
+    # the 2SFCA denominators are never truncated (see SPARSE_CUTOFF)
+    denom_kw = dict(engine_kw, engine="dense", cutoff=None)
+    ksum = lambda XY_src, w, XY_dst, lam: kernel_sum(XY_src, w, XY_dst, lam, kernel_kind, **engine_kw)
+    if network is not None:
+        engine = "network"  # span label
+        ksum = lambda XY_src, w, XY_dst, lam: network.kernel_sum(XY_src, w, XY_dst, lam, kernel_kind)
+
+    XY_i = eval_points_xy(eval_units_gdf)
 
     # coords
     XY_u = xy_from_gdf(demand_gdf)
@@ -58,204 +318,263 @@ def compute_hawker_opportunity(
     C_j = supply_gdf[cap_col].to_numpy(float)
 
     # Demand
-    D_ui = pairwise_dist(XY_u, XY_i)
-    Dem_i = (P_u[:,None] * kernel(D_ui, lambda_D, kind=kernel_kind)).sum(axis=0)
+    with span("kernel.dem", src=XY_u.shape, dst=XY_i.shape, engine=engine):
+        Dem_i = (ksum(XY_u, P_u, XY_i, lambda_D) if network is not None else
+                 cached_kernel_sum(cache_dir, "dem", XY_u, P_u, XY_i, lambda_D, kernel_kind, **engine_kw))
 
     # Supply (competing adjusted)
-    D_uj = pairwise_dist(XY_u, XY_j)
-    denom_j = (P_u[:,None] * kernel(D_uj, lambda_C, kind=kernel_kind)).sum(axis=0)
+    with span("kernel.denom", src=XY_u.shape, dst=XY_j.shape, engine=engine):
+        denom_j = (ksum(XY_u, P_u, XY_j, lambda_C) if network is not None else
+                   cached_kernel_sum(cache_dir, "denom", XY_u, P_u, XY_j, lambda_C, kernel_kind, **denom_kw))
     denom_j = np.where(denom_j<=0, 1.0, denom_j)
 
-    D_ji = pairwise_dist(XY_j, XY_i)
-    Sup_eff_i = ((C_j/denom_j)[:,None] * kernel(D_ji, lambda_S, kind=kernel_kind)).sum(axis=0)
+    with span("kernel.sup", src=XY_j.shape, dst=XY_i.shape, engine=engine):
+        Sup_eff_i = ksum(XY_j, C_j/denom_j, XY_i, lambda_S)
 
-    # Accessibility
-    Acc_i = np.zeros_like(Dem_i)
+    # Accessibility, per mode (betas are applied in reweight)
+    Acc_M = np.zeros_like(Dem_i)
+    Acc_B = np.zeros_like(Dem_i)
     if mrt_gdf is not None and len(mrt_gdf):
         XY_m = xy_from_gdf(mrt_gdf)
         w_m = mrt_gdf[mrt_w_col].to_numpy(float) if mrt_w_col and mrt_w_col in mrt_gdf.columns else np.ones(len(mrt_gdf))
-        D_mi = pairwise_dist(XY_m, XY_i)
-        Acc_i += beta_MRT * (w_m[:,None] * kernel(D_mi, lambda_M, kind=kernel_kind)).sum(axis=0)
+        with span("kernel.acc_mrt", src=XY_m.shape, dst=XY_i.shape, engine=engine):
+            Acc_M = ksum(XY_m, w_m, XY_i, lambda_M)
     if bus_gdf is not None and len(bus_gdf):
         XY_b = xy_from_gdf(bus_gdf)
         w_b = bus_gdf[bus_w_col].to_numpy(float) if bus_w_col and bus_w_col in bus_gdf.columns else np.ones(len(bus_gdf))
-        D_bi = pairwise_dist(XY_b, XY_i)
-        Acc_i += beta_BUS * (w_b[:,None] * kernel(D_bi, lambda_B, kind=kernel_kind)).sum(axis=0)
-
-    Z_D, Z_S, Z_A = robust_z(Dem_i), robust_z(Sup_eff_i), robust_z(Acc_i)
-    H_i = w_D*Z_D - w_S*Z_S + w_A*Z_A
-
-    out = eval_units_gdf.copy()
-    out["Dem"]   = Dem_i
-    out["Sup"]   = Sup_eff_i
-    out["Acc"]   = Acc_i
-    out["Z_Dem"] = Z_D
-    out["Z_Sup"] = Z_S
-    out["Z_Acc"] = Z_A
-    out["H_score"] = H_i
-    return out
-
-subzones = gpd.read_file(PATH_SUBZONES)
-if subzones.crs is None:  # just in case
-    subzones.set_crs(4326, inplace=True)
-subzones = subzones.to_crs(TARGET_CRS)
-
-# Identify the subzone name column to show later
-subzone_name_col = next((c for c in subzones.columns if re.search("subzone", c, re.I)), subzones.columns[0])
-
-print(subzones.crs)
-print(subzones.shape)
-subzones.head(2)
-
-hawker = gpd.read_file(PATH_HAWKER)
-if hawker.crs is None:
-    hawker.set_crs(4326, inplace=True)  # NEA geojson typically WGS84
-hawker = hawker.to_crs(TARGET_CRS)
+        with span("kernel.acc_bus", src=XY_b.shape, dst=XY_i.shape, engine=engine):
+            Acc_B = ksum(XY_b, w_b, XY_i, lambda_B)
 
-# Parse 'Description' HTML to get NAME/STATUS if present (optional)
-if "Description" in hawker.columns:
-    def parse_field(html, key):
-        m = re.search(fr"<th[^>]*>{key}</th>\s*<td[^>]*>(.*?)</td>", str(html), flags=re.I|re.S)
-        return re.sub("<.*?>","",m.group(1)).strip() if m else None
-    hawker["NAME_EXTRACT"] = hawker["Description"].apply(lambda h: parse_field(h, "NAME") or parse_field(h, "NAME OF HAWKER CENTRE"))
-    hawker["STATUS"] = hawker["Description"].apply(lambda h: parse_field(h, "STATUS"))
+    return {"Dem": Dem_i, "Sup": Sup_eff_i, "Acc_MRT": Acc_M, "Acc_BUS": Acc_B}
 
-# capacity proxy
-if "capacity" not in hawker.columns:
-    hawker["capacity"] = 1.0
+def reweight(cube, w_D=0.5, w_S=0.3, w_A=0.2, beta_MRT=1.0, beta_BUS=1.0):
+    """Scores from a component cube: {Dem, Sup, Acc, Z_Dem, Z_Sup, Z_Acc, H_score}.
 
-print(hawker.crs, hawker.shape)
-hawker.head(2)
+    O(N) in the number of evaluation units; no distances are touched.
+    """
+    with span("normalise", n=len(cube["Dem"])):
+        Acc_i = beta_MRT * cube["Acc_MRT"] + beta_BUS * cube["Acc_BUS"]
+        Z_D, Z_S, Z_A = robust_z(cube["Dem"]), robust_z(cube["Sup"]), robust_z(Acc_i)
+    return {
+        "Dem": cube["Dem"], "Sup": cube["Sup"], "Acc": Acc_i,
+        "Z_Dem": Z_D, "Z_Sup": Z_S, "Z_Acc": Z_A,
+        "H_score": w_D*Z_D - w_S*Z_S + w_A*Z_A,
+    }
 
-mrt = gpd.read_file(PATH_MRT)
-if mrt.crs is None:
-    mrt.set_crs(4326, inplace=True)
-mrt = mrt.to_crs(TARGET_CRS)
-
-print(mrt.crs, mrt.shape)
-mrt.head(2)
-
-
-
-# --- Bus Stops via LTA DataMall API (geocoded points) ---
-# NOTE: Keep your key secret. For Colab, consider using an env var instead of hardcoding.
-# e.g., in a cell:  import os; os.environ["LTA_ACCOUNT_KEY"] = "xxxxx"
-# then here: ACCOUNT_KEY = os.environ["LTA_ACCOUNT_KEY"]
-
-import os, requests, pandas as pd, geopandas as gpd
-from shapely.geometry import Point
-
-
-# Load into `bus` for the scorer
-try:
-    if BUS_LAYER:
-        bus = gpd.read_file(BUS_GPKG, layer=BUS_LAYER).to_crs(TARGET_CRS)
-    else:
-        bus = gpd.read_file(BUS_GPKG).to_crs(TARGET_CRS)
-    print("Bus stops loaded:", bus.shape)
-except Exception as e:
-    print("Bus load failed, proceeding without bus:", e)
-    bus = None
-
-import pandas as pd, re
-pop_df = pd.read_csv(PATH_POP)
-
-# 1) Normalize name column
-df = pop_df.rename(columns={"Number":"name"}).copy()
-df["name"] = df["name"].str.strip()
-
-# 2) Identify row types
-is_grand_total = df["name"].str.fullmatch(r"Total", case=False, na=False)
-is_pa_total    = df["name"].str.contains(r"\s-\sTotal$", na=False)  # e.g., "Ang Mo Kio - Total"
-
-# 3) Extract planning area from "PA - Total" rows and forward-fill
-df["pa_marker"] = df["name"].where(is_pa_total).str.replace(r"\s-\sTotal$","", regex=True)
-df["planning_area"] = df["pa_marker"].ffill()
-
-# 4) Keep only **subzone** rows (exclude grand total + "PA - Total")
-sub_df = df[~is_grand_total & ~is_pa_total].copy()
-
-# 5) Rename to standard keys + clean numeric
-sub_df["subzone"] = sub_df["name"]
-
-# clean "Total_Total": remove commas/spaces, turn '-' to NaN, then to 0, then int
-pop_clean = (
-    sub_df["Total_Total"]
-      .astype(str)
-      .str.replace(",", "", regex=False)
-      .str.strip()
-      .replace({"-": np.nan, "": np.nan})
-)
-
-sub_df["population"] = pd.to_numeric(pop_clean, errors="coerce").fillna(0).astype("int64")
-
-pop_tot = sub_df[["planning_area", "subzone", "population"]].reset_index(drop=True)
-
-print(pop_tot.head(8))
-print("Rows kept (subzones):", len(pop_tot))
-print("Zero-pop rows (check if expected):", (pop_tot["population"]==0).sum())
-
-# --- Join population to URA subzone polygons ---
-poly_cols_lower = {c.lower(): c for c in subzones.columns}
-subzone_name_col = next((c for c in subzones.columns if re.search("subzone", c, re.I)), subzones.columns[0])
-
-if "planning_area" in poly_cols_lower:
-    subzones_joinkey = subzones.rename(columns={
-        poly_cols_lower["planning_area"]: "planning_area",
-        subzone_name_col: "subzone"
-    })
-    join_on = ["planning_area","subzone"]
-else:
-    subzones_joinkey = subzones.rename(columns={subzone_name_col:"subzone"})
-    join_on = ["subzone"]
-
-sub_pop = subzones_joinkey.merge(pop_tot, on=join_on, how="left", validate="one_to_one")
-sub_pop["population"] = sub_pop["population"].fillna(0)
-
-# Check for unmatched subzones (optional)
-unmatched = subzones_joinkey.loc[~subzones_joinkey["subzone"].isin(pop_tot["subzone"])]
-print("Unmatched polygons:", len(unmatched))
-print(unmatched.head(10))
-
-# --- Create demand points (centroids) ---
-demand_pts = sub_pop.copy()
-demand_pts["geometry"] = demand_pts.geometry.centroid
-demand_pts = demand_pts.set_geometry("geometry").to_crs(TARGET_CRS)
-demand_pts = demand_pts[["population","geometry"]]
-
-print("Demand points ready:", demand_pts.shape)
-demand_pts.head(3)
-
-result = compute_hawker_opportunity(
-    eval_units_gdf=subzones,
-    demand_gdf=demand_pts,
-    supply_gdf=hawker,
-    mrt_gdf=mrt,
-    bus_gdf=bus,   # None if bus not loaded
-    pop_col="population",
-    cap_col="capacity",
+def compute_hawker_opportunity(
+    eval_units_gdf, demand_gdf, supply_gdf, mrt_gdf=None, bus_gdf=None,
+    *, pop_col="population", cap_col="capacity",
+    mrt_w_col=None, bus_w_col=None,
     kernel_kind="exp",
     lambda_D=700, lambda_S=700, lambda_C=700, lambda_M=900, lambda_B=500,
-    w_D=0.5, w_S=0.3, w_A=0.2,
-    beta_MRT=1.0, beta_BUS=1.0
-)
-
-print("Scoring done:", len(result))
-result[[subzone_name_col, "H_score","Z_Dem","Z_Sup","Z_Acc"]].sort_values("H_score", ascending=False).head(10)
-
-# Save results in both GPKG and GeoJSON
-try:
-    result.to_file("content/out/hawker_opportunity.gpkg", layer="score", driver="GPKG")
-    print("Saved GeoPackage → content/out/hawker_opportunity.gpkg")
-except Exception as e:
-    print("⚠️ GPKG save failed:", e)
-
-result.to_file("content/out/hawker_opportunity.geojson", driver="GeoJSON")
-print("Saved GeoJSON → content/out/hawker_opportunity.geojson")
-
-ax = result.plot(column="H_score", legend=True, figsize=(7,7), linewidth=0.2, edgecolor="gray")
-ax.set_title("Hawker Opportunity Score (higher = better candidate)")
-ax.set_axis_off()
-import matplotlib.pyplot as plt
-plt.show()
+    w_D=0.5, w_S=0.3, w_A=0.2, beta_MRT=1.0, beta_BUS=1.0,
+    engine="dense", cutoff=None, max_bytes=None, workers=None, dtype=None, cache_dir=None, network=None
+):
+    # compute_components() + reweight(); see there for the engine options
+    cube = compute_components(
+        eval_units_gdf, demand_gdf, supply_gdf, mrt_gdf, bus_gdf,
+        pop_col=pop_col, cap_col=cap_col, mrt_w_col=mrt_w_col, bus_w_col=bus_w_col,
+        kernel_kind=kernel_kind,
+        lambda_D=lambda_D, lambda_S=lambda_S, lambda_C=lambda_C, lambda_M=lambda_M, lambda_B=lambda_B,
+        engine=engine, cutoff=cutoff, max_bytes=max_bytes, workers=workers, dtype=dtype, cache_dir=cache_dir,
+        network=network,
+    )
+    out = eval_units_gdf.copy()
+    for col, val in reweight(cube, w_D, w_S, w_A, beta_MRT, beta_BUS).items():
+        out[col] = val
+    return out
 
+def read_projected(path, label, default_crs=4326, **kw):
+    """gpd.read_file(path) in TARGET_CRS (default_crs assumed when the file has none)."""
+    with span(f"load.{label}.read"):
+        gdf = gpd.read_file(path, **kw)
+    if gdf.crs is None and default_crs is not None:
+        gdf.set_crs(default_crs, inplace=True)
+    with span(f"load.{label}.to_crs", rows=len(gdf)):
+        return gdf.to_crs(TARGET_CRS)
+
+def load_subzones(path=PATH_SUBZONES):
+    subzones = read_projected(path, "subzones")
+
+    # URA KML export: the names only live in the Description table
+    if "Description" in subzones.columns:
+        with span("load.subzones.parse_desc", rows=len(subzones)):
+            info = subzones["Description"].map(lambda h: parse_desc_table(h, ("SUBZONE_N", "PLN_AREA_N")))
+        for key in ("SUBZONE_N", "PLN_AREA_N"):
+            if key not in subzones.columns:
+                subzones[key] = info.map(lambda kv: (kv.get(key) or "").upper())
+    return subzones
+
+def load_hawker(path=PATH_HAWKER):
+    hawker = read_projected(path, "hawker")  # NEA geojson typically WGS84
+
+    # Parse 'Description' HTML to get NAME/STATUS if present (optional)
+    if "Description" in hawker.columns:
+        with span("load.hawker.parse_desc", rows=len(hawker)):
+            info = hawker["Description"].map(lambda h: parse_desc_table(h, ("NAME", "NAME OF HAWKER CENTRE", "STATUS")))
+        hawker["NAME_EXTRACT"] = info.map(lambda kv: kv.get("NAME") or kv.get("NAME OF HAWKER CENTRE"))
+        hawker["STATUS"] = info.map(lambda kv: kv.get("STATUS"))
+
+    # capacity proxy
+    if "capacity" not in hawker.columns:
+        hawker["capacity"] = 1.0
+    return hawker
+
+def load_mrt(path=PATH_MRT):
+    return read_projected(path, "mrt")
+
+def load_bus(path=BUS_GPKG, layer=BUS_LAYER):
+    # Bus stops were geocoded from the LTA DataMall API into a local file.
+    if layer:
+        return read_projected(path, "bus", default_crs=None, layer=layer)
+    return read_projected(path, "bus", default_crs=None)
+
+def load_population(path=PATH_POP):
+    with span("load.population.read"):
+        pop_df = pd.read_csv(path)
+
+    # 1) Normalize name column
+    df = pop_df.rename(columns={"Number":"name"}).copy()
+    df["name"] = df["name"].str.strip()
+
+    # 2) Identify row types
+    is_grand_total = df["name"].str.fullmatch(r"Total", case=False, na=False)
+    is_pa_total    = df["name"].str.contains(r"\s-\sTotal$", na=False)  # e.g., "Ang Mo Kio - Total"
+
+    # 3) Extract planning area from "PA - Total" rows and forward-fill
+    df["pa_marker"] = df["name"].where(is_pa_total).str.replace(r"\s-\sTotal$","", regex=True)
+    df["planning_area"] = df["pa_marker"].ffill()
+
+    # 4) Keep only **subzone** rows (exclude grand total + "PA - Total")
+    sub_df = df[~is_grand_total & ~is_pa_total].copy()
+
+    # 5) Rename to standard keys (upper case, like SUBZONE_N) + clean numeric.
+    #    build_demand_points joins on these; with the CSV's title case no
+    #    subzone matched and Dem was 0 everywhere.
+    sub_df["subzone"] = sub_df["name"].str.upper()
+
+    # clean "Total_Total": remove commas/spaces, turn '-' to NaN, then to 0, then int
+    pop_clean = (
+        sub_df["Total_Total"]
+          .astype(str)
+          .str.replace(",", "", regex=False)
+          .str.strip()
+          .replace({"-": np.nan, "": np.nan})
+    )
+
+    sub_df["population"] = pd.to_numeric(pop_clean, errors="coerce").fillna(0).astype("int64")
+
+    return sub_df[["planning_area", "subzone", "population"]].reset_index(drop=True)
+
+def subzone_name_column(subzones):
+    # Identify the subzone name column to show later
+    return next((c for c in subzones.columns if re.search("subzone", c, re.I)), subzones.columns[0])
+
+def build_demand_points(subzones, pop_tot):
+    # --- Join population to URA subzone polygons ---
+    poly_cols_lower = {c.lower(): c for c in subzones.columns}
+    subzone_name_col = subzone_name_column(subzones)
+
+    if "planning_area" in poly_cols_lower:
+        subzones_joinkey = subzones.rename(columns={
+            poly_cols_lower["planning_area"]: "planning_area",
+            subzone_name_col: "subzone"
+        })
+        join_on = ["planning_area","subzone"]
+    else:
+        subzones_joinkey = subzones.rename(columns={subzone_name_col:"subzone"})
+        join_on = ["subzone"]
+
+    sub_pop = subzones_joinkey.merge(pop_tot, on=join_on, how="left", validate="one_to_one")
+    sub_pop["population"] = sub_pop["population"].fillna(0)
+
+    # Check for unmatched subzones (optional)
+    unmatched = subzones_joinkey.loc[~subzones_joinkey["subzone"].isin(pop_tot["subzone"])]
+    print("Unmatched polygons:", len(unmatched))
+
+    # --- Create demand points (centroids) ---
+    demand_pts = sub_pop.copy()
+    with span("demand.centroid", rows=len(demand_pts)):
+        demand_pts["geometry"] = demand_pts.geometry.centroid
+        demand_pts = demand_pts.set_geometry("geometry").to_crs(TARGET_CRS)
+    return demand_pts[["population","geometry"]]
+
+def load_layers(cache_dir=LAYER_CACHE_DIR):
+    """Every input layer the scorer needs, projected to TARGET_CRS.
+
+    Parsed layers are kept in the columnar layer cache under cache_dir and
+    re-parsed only when a source file changes; cache_dir=None always parses.
+    """
+    layer = lambda name, path, load: cached_layer(name, [path], lambda: load(path),
+                                                  cache_dir=cache_dir, version=LAYER_VERSION)
+    subzones = layer("subzones", PATH_SUBZONES, load_subzones)
+    pop_tot = layer("population", PATH_POP, load_population)
+    try:
+        bus = layer("bus", BUS_GPKG, load_bus)
+        print("Bus stops loaded:", bus.shape)
+    except Exception as e:
+        print("Bus load failed, proceeding without bus:", e)
+        bus = None
+    return {
+        "subzones": subzones,
+        "demand": build_demand_points(subzones, pop_tot),
+        "hawker": layer("hawker", PATH_HAWKER, load_hawker),
+        "mrt": layer("mrt", PATH_MRT, load_mrt),
+        "bus": bus,  # None if bus not loaded
+    }
+
+
+if __name__ == "__main__":
+    os.makedirs(OUT_DIR, exist_ok=True)
+    out_gpkg = os.path.join(OUT_DIR, "hawker_opportunity.gpkg")
+    out_geojson = os.path.join(OUT_DIR, "hawker_opportunity.geojson")
+    layers = load_layers()
+    subzones = layers["subzones"]
+    subzone_name_col = subzone_name_column(subzones)
+    print(subzones.crs, subzones.shape)
+    print(layers["hawker"].crs, layers["hawker"].shape)
+    print(layers["mrt"].crs, layers["mrt"].shape)
+    print("Demand points ready:", layers["demand"].shape)
+
+    network = None
+    if os.path.exists(PATH_WALK_NETWORK):
+        from network import NetworkDistances, load_graph
+        network = NetworkDistances(load_graph(PATH_WALK_NETWORK, cache_dir=NETWORK_CACHE_DIR),
+                                   cache_dir=NETWORK_CACHE_DIR)
+        print("Walking distances from", PATH_WALK_NETWORK, len(network.graph.xy), "nodes")
+
+    result = compute_hawker_opportunity(
+        eval_units_gdf=subzones,
+        demand_gdf=layers["demand"],
+        supply_gdf=layers["hawker"],
+        mrt_gdf=layers["mrt"],
+        bus_gdf=layers["bus"],
+        pop_col="population",
+        cap_col="capacity",
+        kernel_kind="exp",
+        lambda_D=700, lambda_S=700, lambda_C=700, lambda_M=900, lambda_B=500,
+        w_D=0.5, w_S=0.3, w_A=0.2,
+        beta_MRT=1.0, beta_BUS=1.0,
+        cache_dir=CACHE_DIR, network=network,
+    )
+
+    print("Scoring done:", len(result))
+    print(result[[subzone_name_col, "H_score","Z_Dem","Z_Sup","Z_Acc"]].sort_values("H_score", ascending=False).head(10))
+
+    # Save results in both GPKG and GeoJSON
+    try:
+        with span("write.gpkg", rows=len(result)):
+            result.to_file(out_gpkg, layer="score", driver="GPKG")
+        print("Saved GeoPackage →", out_gpkg)
+    except Exception as e:
+        print("⚠️ GPKG save failed:", e)
+
+    with span("write.geojson", rows=len(result)):
+        write_geojson(out_geojson, result, name="hawker_opportunity")
+    print("Saved GeoJSON →", out_geojson)
+
+    import matplotlib.pyplot as plt
+    ax = result.plot(column="H_score", legend=True, figsize=(7,7), linewidth=0.2, edgecolor="gray")
+    ax.set_title("Hawker Opportunity Score (higher = better candidate)")
+    ax.set_axis_off()
+    plt.show()
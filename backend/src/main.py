@@ -1,14 +1,25 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from .services.data_service import OUT_GEOJSON, reload_dataset
+from .services import scoring_service, spatial_service
+from .services.layers_service import instrument
+
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
-CONTENT_DIR = BASE_DIR / "content"
-OUT_PATH = CONTENT_DIR / "out" / "hawker_opportunities_ver2.geojson"
 
-app = FastAPI(title="Hawker Opportunity API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm the in-memory dataset; later changes to the file are picked up lazily
+    reload_dataset(OUT_GEOJSON)
+    spatial_service.warm_async()  # STRtree/KD-tree indexes for /subzones/at, /bbox, /points
+    yield
+    scoring_service.shutdown()
+
+app = FastAPI(title="Hawker Opportunity API", lifespan=lifespan)
 
 # CORS (dev): allow Vite default ports explicitly
 app.add_middleware(
@@ -19,10 +30,31 @@ app.add_middleware(
     ],
     allow_origin_regex=r"^http://(127\.0\.0\.1|localhost):\d+$",
     allow_credentials=False,
-    allow_methods=["GET", "OPTIONS"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
 
+profiler = instrument()
+
+def _route_template(request: Request) -> str:
+    # route template, not the raw path, so every tile is one /tiles/{z}/{x}/{y}.mvt series;
+    # the matched route may only carry the path below its router's prefix
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    prefix = request.url.path.rsplit("/", route.path.count("/"))[0]
+    return prefix + route.path
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    if not profiler.enabled():
+        return await call_next(request)
+    with profiler.span("http " + request.method) as s:
+        response = await call_next(request)
+        s.name = f"http {request.method} {_route_template(request)}"
+        s.set(status=response.status_code)
+    return response
+
 # Optional: mount built frontend if you choose to build into backend/static later
 STATIC_DIR = BASE_DIR / "backend" / "static"
 if STATIC_DIR.exists():
@@ -39,12 +71,6 @@ def root():
 def healthz():
     return {"ok": True}
 
-@app.get("/data/opportunity.geojson")
-def get_geojson():
-    if not OUT_PATH.exists():
-        raise HTTPException(status_code=404, detail="GeoJSON not found in content/out/")
-    return FileResponse(str(OUT_PATH), media_type="application/geo+json")
-
 # Routers
 from .routers.api_router import api_router  # noqa: E402
 app.include_router(api_router)
@@ -1,16 +1,16 @@
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, Field
 
 class KernelConfig(BaseModel):
-    kernel_kind: str = "exp"
-    lambda_D: float = 700.0
-    lambda_S: float = 700.0
-    lambda_C: float = 700.0
-    lambda_M: float = 900.0
-    lambda_B: float = 500.0
+    kernel_kind: Literal["exp", "gauss"] = "exp"
+    lambda_D: float = Field(700.0, gt=0)   # metres
+    lambda_S: float = Field(700.0, gt=0)
+    lambda_C: float = Field(700.0, gt=0)
+    lambda_M: float = Field(900.0, gt=0)
+    lambda_B: float = Field(500.0, gt=0)
     w_D: float = 0.5
     w_S: float = 0.3
     w_A: float = 0.2
     beta_MRT: float = 1.0
     beta_BUS: float = 1.0
-
-
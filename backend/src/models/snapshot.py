@@ -1,8 +1,18 @@
+from typing import Dict, List
 from pydantic import BaseModel
 
+class SnapshotColumn(BaseModel):
+    name: str
+    kind: str                                   # float | int | bool | str
+
 class Snapshot(BaseModel):
-    id: str
+    id: str                                     # content hash of scores, geometry and config
     created_at: str
     notes: str | None = None
-
-
+    config: dict | None = None                  # KernelConfig dump of the run, if known
+    config_key: str | None = None
+    inputs: Dict[str, str] = {}                 # input file name -> sha1
+    geometry: str = ""                          # shared geometry set (sha1)
+    rows: int = 0
+    columns: List[SnapshotColumn] = []
+    source_etag: str | None = None              # etag of the GeoJSON it was taken from
@@ -1,17 +1,88 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from .config_router import get_config
+from ..services.data_service import get_dataset
+from ..services.diff_service import MAX_PAGE, diff_page, resolve
+from ..services.scoring_service import get_job, list_jobs, submit_refresh
+from ..services.snapshot_service import (current_snapshot_id, delete_snapshot, get_snapshot, list_snapshots,
+                                         restore_snapshot, save_snapshot)
 
 router = APIRouter()
 
-@router.post("/refresh")
+@router.post("/refresh", status_code=202)
 def refresh():
-    raise HTTPException(status_code=501, detail="Not implemented yet")
+    # scores with the KernelConfig current at submit time; repeated calls for
+    # the same config while a run is pending join that run
+    job, coalesced = submit_refresh(get_config().model_dump())
+    return {"coalesced": coalesced, **job.to_dict()}
+
+@router.get("/jobs")
+def jobs():
+    return {"jobs": [j.to_dict() for j in list_jobs()]}
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
 
 @router.get("/snapshots")
-def list_snapshots():
-    return {"snapshots": []}
+def snapshots():
+    return {"current": current_snapshot_id(), "snapshots": [s.model_dump() for s in list_snapshots()]}
 
-@router.post("/snapshots/{snapshot_id}/restore")
-def restore_snapshot(snapshot_id: str):
-    raise HTTPException(status_code=501, detail="Not implemented yet")
+@router.post("/snapshots", status_code=201)
+def take_snapshot(notes: str | None = None):
+    # the dataset being served, tagged with the KernelConfig currently set
+    ds = get_dataset()
+    if ds is None:
+        raise HTTPException(status_code=404, detail="GeoJSON not found in content/out/")
+    return save_snapshot(ds, get_config().model_dump(), notes=notes).model_dump()
 
+@router.get("/snapshots/{snapshot_id}")
+def snapshot(snapshot_id: str):
+    snap = get_snapshot(snapshot_id)
+    if snap is None:
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot: {snapshot_id}")
+    return snap.model_dump()
+
+@router.get("/snapshots/{base_id}/diff/{other_id}")
+def snapshot_diff(
+    base_id: str,
+    other_id: str,
+    sort: str = "abs_rank_change",
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    status: str | None = Query(None, pattern="^(common|added|removed)$"),
+    columns: str | None = None,                 # comma-separated score columns (default: all shared)
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_PAGE),
+    top: int = Query(10, ge=0, le=100),
+):
+    # either id may be "current" (the snapshot being served)
+    base, other = resolve(base_id), resolve(other_id)
+    for snap_id, snap in ((base_id, base), (other_id, other)):
+        if snap is None:
+            raise HTTPException(status_code=404, detail=f"Unknown snapshot: {snap_id}")
+    cols = tuple(c.strip() for c in columns.split(",") if c.strip()) if columns else None
+    try:
+        return diff_page(base, other, columns=cols, sort=sort, descending=order == "desc",
+                         status=status, offset=offset, limit=limit, top=top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/snapshots/{snapshot_id}/restore")
+def restore(snapshot_id: str):
+    try:
+        snap = restore_snapshot(snapshot_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot: {snapshot_id}")
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"restored": True, **snap.model_dump()}
 
+@router.delete("/snapshots/{snapshot_id}")
+def remove_snapshot(snapshot_id: str):
+    if snapshot_id == current_snapshot_id():
+        raise HTTPException(status_code=409, detail="Cannot delete the snapshot being served")
+    if not delete_snapshot(snapshot_id):
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot: {snapshot_id}")
+    return {"deleted": snapshot_id}
@@ -5,13 +5,21 @@ from .config_router import router as config_router
 from .auth_router import router as auth_router
 from .subzones_router import router as subzones_router
 from .export_router import router as export_router
+from .tiles_router import router as tiles_router
+from .score_router import router as score_router
+from .metrics_router import router as metrics_router
+from .points_router import router as points_router
 
 api_router = APIRouter()
 api_router.include_router(data_router, prefix="/data", tags=["data"])
 api_router.include_router(subzones_router, prefix="/subzones", tags=["subzones"])
+api_router.include_router(points_router, prefix="/points", tags=["points"])
+api_router.include_router(tiles_router, prefix="/tiles", tags=["tiles"])
 api_router.include_router(config_router, prefix="/config", tags=["config"])
+api_router.include_router(score_router, prefix="/score", tags=["score"])
 api_router.include_router(admin_router, prefix="/admin", tags=["admin"])
 api_router.include_router(auth_router, prefix="/auth", tags=["auth"])
 api_router.include_router(export_router, prefix="/export", tags=["export"])
+api_router.include_router(metrics_router, tags=["metrics"])
 
 
@@ -1,16 +1,28 @@
-from pathlib import Path
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from ..services.data_service import get_dataset
+from ..services.encoding_service import http_date, is_not_modified, negotiate, variant_etag
 
 router = APIRouter()
 
-BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
-OUT_PATH = BASE_DIR / "content" / "out" / "hawker_opportunities_ver2.geojson"
-
 @router.get("/opportunity.geojson")
-def opportunity_geojson():
-    if not OUT_PATH.exists():
+def opportunity_geojson(request: Request):
+    ds = get_dataset()
+    if ds is None:
         raise HTTPException(status_code=404, detail="GeoJSON not found in content/out/")
-    return FileResponse(str(OUT_PATH), media_type="application/geo+json")
-
-
+    variants = dict(ds.variants)  # snapshot: filled by a background thread
+    enc = negotiate(request.headers.get("accept-encoding"), variants)
+    headers = {
+        "ETag": variant_etag(ds.etag, enc),
+        "Last-Modified": http_date(ds.mtime_ns),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    known = [variant_etag(ds.etag, e) for e in (None, *variants)]
+    if is_not_modified(request.headers.get("if-none-match"),
+                       request.headers.get("if-modified-since"), known, ds.mtime_ns):
+        return Response(status_code=304, headers=headers)
+    if enc:
+        headers["Content-Encoding"] = enc
+    return Response(content=variants[enc] if enc else ds.raw,
+                    media_type="application/geo+json", headers=headers)
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from ..services.layers_service import instrument
+
+router = APIRouter()
+
+@router.get("/metrics")
+def metrics():
+    # Prometheus text format; span series stay empty unless HAWKER_PROFILE is set
+    return Response(content=instrument().prometheus_text(), media_type="text/plain; version=0.0.4")
+
+@router.get("/metrics/profile")
+def profile():
+    return instrument().report()
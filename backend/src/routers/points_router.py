@@ -0,0 +1,22 @@
+from fastapi import APIRouter, HTTPException, Query
+from ..services.spatial_service import MAX_K, POINT_LAYERS, available, point_index
+
+router = APIRouter()
+
+@router.get("/{layer}/nearest")
+def nearest(
+    layer: str,
+    lat: float = Query(ge=-90, le=90),
+    lon: float = Query(ge=-180, le=180),
+    k: int = Query(5, ge=1, le=MAX_K),
+    max_distance: float | None = Query(None, gt=0),   # metres
+):
+    if layer not in POINT_LAYERS:
+        raise HTTPException(status_code=404, detail=f"Unknown layer: {layer} (expected one of {', '.join(POINT_LAYERS)})")
+    if not available():
+        raise HTTPException(status_code=503, detail="Spatial queries need numpy, shapely, pyproj and scipy")
+    idx = point_index(layer)
+    if idx is None:
+        raise HTTPException(status_code=404, detail=f"Layer not loaded: {layer}")
+    hits = idx.nearest(lon, lat, k, max_distance)
+    return {"layer": layer, "count": len(hits), "points": hits}
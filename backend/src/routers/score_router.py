@@ -0,0 +1,19 @@
+import json
+from fastapi import APIRouter
+from fastapi.responses import Response
+from ..models.kernel_config import KernelConfig
+from ..services.score_service import cache, score, score_records
+
+router = APIRouter()
+
+@router.post("/")
+def score_config(cfg: KernelConfig):
+    key, cols, cached = score(cfg.model_dump())
+    records = score_records(cols)
+    # plain floats/str only: json.dumps skips FastAPI's per-value encoder walk
+    body = {"key": key, "cached": cached, "config": cfg.model_dump(), "count": len(records), "subzones": records}
+    return Response(content=json.dumps(body), media_type="application/json")
+
+@router.get("/stats")
+def score_stats():
+    return cache.stats()
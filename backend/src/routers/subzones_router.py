@@ -1,24 +1,82 @@
-from pathlib import Path
-from fastapi import APIRouter
-import json
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response
+from ..services.data_service import get_dataset
+from ..services.encoding_service import http_date, is_not_modified
+from ..services.ranking_service import MAX_K, SORT_COLUMNS, ranking_index, top_body
+from ..services.spatial_service import subzone_index
 
 router = APIRouter()
 
-BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
-OUT_PATH = BASE_DIR / "content"/"out"/ "hawker_opportunities_ver2.geojson"
-
 @router.get("/")
-def list_subzones():
-    try:
-        data = json.loads(OUT_PATH.read_text(encoding="utf-8"))
-        names = []
-        for f in data.get("features", []):
-            p = f.get("properties", {})
-            name = p.get("SUBZONE_N") or p.get("subzone")
-            if name:
-                names.append(name)
-        return {"count": len(names), "subzones": sorted(set(names))}
-    except Exception:
+def list_subzones(planning_area: Optional[str] = None):
+    ds = get_dataset()
+    if ds is None:
         return {"count": 0, "subzones": []}
+    if planning_area is None:
+        names = ds.names
+    else:
+        idx = ds.by_area.get(planning_area.upper(), [])
+        names = sorted({ds.properties(i).get("SUBZONE_N") for i in idx} - {None})
+    return {"count": len(names), "subzones": names}
+
+def _index():
+    idx = subzone_index()
+    if idx is None:
+        raise HTTPException(status_code=503, detail="No scored dataset or spatial index available")
+    return idx
+
+@router.get("/at")
+def subzone_at(lat: float = Query(ge=-90, le=90), lon: float = Query(ge=-180, le=180)):
+    idx = _index()
+    i = idx.at(lon, lat)
+    if i is None:
+        raise HTTPException(status_code=404, detail=f"No subzone at {lat},{lon}")
+    return {"rank": idx.ds.rank[i], "count": len(idx.ds.ranked), **idx.ds.properties(i)}
 
+@router.get("/bbox")
+def subzones_in_bbox(bbox: str, within: bool = False):
+    # bbox=min_lon,min_lat,max_lon,max_lat (WGS84); within=true drops partly covered subzones
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="bbox minimum exceeds maximum")
+    idx = _index()
+    hits = idx.in_bbox(min_lon, min_lat, max_lon, max_lat, within)
+    return {"count": len(hits), "subzones": [idx.summary(i) for i in hits]}
+
+@router.get("/top")
+def top_subzones(
+    request: Request,
+    k: int = Query(10, ge=1, le=MAX_K),
+    planning_area: Optional[str] = None,
+    min_population: Optional[float] = Query(None, ge=0),
+    max_mrt_km: Optional[float] = Query(None, gt=0),
+    by: str = "H_score",
+    order: Literal["desc", "asc"] = "desc",
+):
+    if by not in SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Cannot rank by {by} (expected one of {', '.join(SORT_COLUMNS)})")
+    idx = ranking_index()
+    if idx is None:
+        raise HTTPException(status_code=404, detail="GeoJSON not found in content/out/")
+    etag = f'"{idx.etag}-top"'  # the body depends only on the dataset and the URL
+    headers = {"ETag": etag, "Last-Modified": http_date(idx.ds.mtime_ns), "Cache-Control": "no-cache"}
+    if is_not_modified(request.headers.get("if-none-match"),
+                       request.headers.get("if-modified-since"), [etag], idx.ds.mtime_ns):
+        return Response(status_code=304, headers=headers)
+    try:
+        body = top_body(idx, k, by, order == "desc", planning_area, min_population, max_mrt_km)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown planning area: {planning_area}")
+    return Response(content=body, media_type="application/json", headers=headers)
 
+@router.get("/{name}")
+def get_subzone(name: str):
+    ds = get_dataset()
+    i = ds.by_name.get(name.upper()) if ds is not None else None
+    if i is None:
+        raise HTTPException(status_code=404, detail=f"Unknown subzone: {name}")
+    return {"rank": ds.rank[i], "count": len(ds.ranked), **ds.properties(i)}
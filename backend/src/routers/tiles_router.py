@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from ..services.data_service import get_dataset
+from ..services.encoding_service import http_date, is_not_modified
+from ..services.tile_service import MAX_ZOOM, MIN_ZOOM, available, tileset_for
+
+router = APIRouter()
+
+@router.get("/{z}/{x}/{y}.mvt")
+def subzone_tile(z: int, x: int, y: int, request: Request):
+    if not available():
+        raise HTTPException(status_code=503, detail="Vector tiles need shapely and mapbox-vector-tile")
+    if not MIN_ZOOM <= z <= MAX_ZOOM or not (0 <= x < 2**z and 0 <= y < 2**z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    ds = get_dataset()
+    if ds is None:
+        raise HTTPException(status_code=404, detail="GeoJSON not found in content/out/")
+    etag = f'"{ds.etag}-{z}-{x}-{y}"'
+    headers = {"ETag": etag, "Last-Modified": http_date(ds.mtime_ns), "Cache-Control": "no-cache"}
+    if is_not_modified(request.headers.get("if-none-match"),
+                       request.headers.get("if-modified-since"), [etag], ds.mtime_ns):
+        return Response(status_code=304, headers=headers)
+    return Response(content=tileset_for(ds).get(z, x, y),
+                    media_type="application/vnd.mapbox-vector-tile", headers=headers)
@@ -1,9 +1,131 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, List, Optional
+
+from .encoding_service import content_etag, precompress_async
+from .tile_service import pregenerate_async
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
 CONTENT_DIR = BASE_DIR / "content"
 OUT_GEOJSON = CONTENT_DIR / "out" / "hawker_opportunities_ver2.geojson"
 
-__all__ = ["CONTENT_DIR", "OUT_GEOJSON"]
+# How often (seconds) a request may stat() the output file to pick up a rerun.
+RELOAD_CHECK_INTERVAL = 1.0
+
+__all__ = ["CONTENT_DIR", "OUT_GEOJSON", "ScoredDataset", "get_dataset", "reload_dataset", "swap_dataset"]
+
+
+def _score(props: dict) -> float:
+    v = props.get("H_score", props.get("h_score"))
+    return float(v) if isinstance(v, (int, float)) else float("-inf")
+
+
+@dataclass(frozen=True)
+class ScoredDataset:
+    """One immutable, indexed load of the scored GeoJSON.
+
+    Handlers grab the current instance once and only read from it, so a
+    reload swapping in a new instance never shows them a half-built index.
+    """
+    path: Path
+    mtime_ns: int
+    size: int
+    raw: bytes                                  # file bytes, served as-is
+    etag: str                                   # sha1 of raw
+    features: List[dict]
+    by_name: Dict[str, int]                     # SUBZONE_N -> feature index
+    by_area: Dict[str, List[int]]               # PLN_AREA_N -> indices, best H first
+    ranked: List[int]                           # all indices, best H first
+    rank: List[int]                             # feature index -> 1-based rank
+    names: List[str] = field(default_factory=list)  # sorted unique SUBZONE_N
+    variants: Dict[str, bytes] = field(default_factory=dict)  # encoding -> body, filled async
+
+    @classmethod
+    def load(cls, path: Path) -> "ScoredDataset":
+        st = path.stat()
+        raw = path.read_bytes()
+        features = json.loads(raw).get("features", [])
+        props = [f.get("properties") or {} for f in features]
+        ranked = sorted(range(len(features)), key=lambda i: _score(props[i]), reverse=True)
+        rank = [0] * len(features)
+        for r, i in enumerate(ranked, 1):
+            rank[i] = r
+        by_name: Dict[str, int] = {}
+        by_area: Dict[str, List[int]] = {}
+        for i in ranked:
+            p = props[i]
+            name = p.get("SUBZONE_N") or p.get("subzone")
+            if name:
+                by_name.setdefault(name, i)
+            area = p.get("PLN_AREA_N")
+            if area:
+                by_area.setdefault(area, []).append(i)
+        return cls(path=path, mtime_ns=st.st_mtime_ns, size=st.st_size, raw=raw,
+                   etag=content_etag(raw), features=features, by_name=by_name, by_area=by_area,
+                   ranked=ranked, rank=rank, names=sorted(by_name))
+
+    def properties(self, i: int) -> dict:
+        return self.features[i].get("properties") or {}
+
+
+_lock = threading.Lock()
+_current: Optional[ScoredDataset] = None
+_checked_at = 0.0
+
+
+def reload_dataset(path: Path = OUT_GEOJSON) -> Optional[ScoredDataset]:
+    """Load path now and swap it in; keeps the old dataset if the file is unreadable."""
+    global _current, _checked_at
+    with _lock:
+        try:
+            ds = ScoredDataset.load(path)
+        except (OSError, ValueError):
+            ds = _current if _current is not None and _current.path == path else None
+        else:
+            precompress_async(ds.raw, ds.etag, ds.variants)
+            pregenerate_async(ds)
+        _current, _checked_at = ds, time.monotonic()
+        return ds
+
+
+def swap_dataset(ds: ScoredDataset) -> ScoredDataset:
+    """Serve an already loaded dataset (e.g. a restored snapshot) without re-reading its file.
+
+    A dataset served before keeps its indexes, compressed variants and tile
+    set (tiles are keyed by etag); a fresh one gets them started as in
+    reload_dataset. ds.mtime_ns/size must match ds.path on disk, or the next
+    check reloads it.
+    """
+    global _current, _checked_at
+    with _lock:
+        if not ds.variants:
+            precompress_async(ds.raw, ds.etag, ds.variants)
+            pregenerate_async(ds)
+        _current, _checked_at = ds, time.monotonic()
+        return ds
+
 
+def get_dataset(path: Path = OUT_GEOJSON) -> Optional[ScoredDataset]:
+    """Current dataset, reloaded when the file on disk changed.
 
+    The stat() is throttled to RELOAD_CHECK_INTERVAL, so the common path is
+    a clock read and an attribute lookup. Returns None if nothing is loaded.
+    """
+    global _checked_at
+    ds = _current
+    if ds is not None and ds.path == path and time.monotonic() - _checked_at < RELOAD_CHECK_INTERVAL:
+        return ds
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ds if ds is not None and ds.path == path else None
+    if ds is not None and ds.path == path and (st.st_mtime_ns, st.st_size) == (ds.mtime_ns, ds.size):
+        _checked_at = time.monotonic()
+        return ds
+    if ds is not None and ds.path == path and _lock.locked():
+        return ds  # a reload is already underway: keep serving the old data meanwhile
+    return reload_dataset(path)
@@ -0,0 +1,102 @@
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..models.snapshot import Snapshot
+from .layers_service import scorer
+from .snapshot_service import current_snapshot_id, get_snapshot, load_columns
+
+# Computed diffs kept in memory; snapshots are content-addressed and never
+# change, so an entry stays valid until evicted.
+KEEP_DIFFS = 16
+MAX_PAGE = 500
+
+__all__ = ["diff_page", "resolve"]
+
+_lock = threading.Lock()
+_diffs: "OrderedDict[tuple, dict]" = OrderedDict()
+
+
+def resolve(snap_id: str) -> Optional[Snapshot]:
+    """Snapshot by id; "current" is the one being served."""
+    if snap_id == "current":
+        snap_id = current_snapshot_id() or ""
+    return get_snapshot(snap_id) if snap_id else None
+
+
+def _frame(snap: Snapshot):
+    cols = {}
+    for name, arr in load_columns(snap).items():
+        cols[name] = np.where(arr.mask, None, arr.data.astype(object)) if isinstance(arr, np.ma.MaskedArray) else arr
+    return pd.DataFrame(cols)
+
+
+def _json_value(v):
+    if isinstance(v, float):
+        return v if math.isfinite(v) else None
+    return None if v is None or v is pd.NA else v
+
+
+def _records(frame) -> List[dict]:
+    # column-wise tolist() gives plain Python values; NaN/NA -> None for JSON
+    cols = {c: [_json_value(v) for v in frame[c].tolist()] for c in frame.columns}
+    return [dict(zip(cols, row)) for row in zip(*cols.values())]
+
+
+def _entry(a: Snapshot, b: Snapshot, columns: Optional[Tuple[str, ...]]) -> dict:
+    key = (a.id, b.id, columns)
+    with _lock:
+        entry = _diffs.get(key)
+        if entry is not None:
+            _diffs.move_to_end(key)
+            return entry
+    scorer()  # repo root on sys.path
+    from score_diff import diff_scores, summary
+
+    d = diff_scores(_frame(a), _frame(b), columns=list(columns) if columns else None)
+    if "rank_change" in d:
+        d["abs_rank_change"] = d["rank_change"].abs()
+    entry = {"diff": d, "summary": summary(d), "orders": {}, "movers": {}}
+    with _lock:
+        _diffs[key] = entry
+        while len(_diffs) > KEEP_DIFFS:
+            _diffs.popitem(last=False)
+    return entry
+
+
+def diff_page(a: Snapshot, b: Snapshot, *, columns: Optional[Tuple[str, ...]] = None,
+              sort: str = "abs_rank_change", descending: bool = True, status: Optional[str] = None,
+              offset: int = 0, limit: int = 50, top: int = 10) -> Dict:
+    """One page of the a -> b diff plus its summary and top movers.
+
+    Raises ValueError for a sort column the diff does not have.
+    """
+    entry = _entry(a, b, columns)
+    d = entry["diff"]
+    if sort not in d.columns:
+        raise ValueError(f"cannot sort by {sort!r}; columns: {list(d.columns)}")
+    order_key = (sort, descending, status)
+    order = entry["orders"].get(order_key)
+    if order is None:
+        view = d if status is None else d[d["status"] == status]
+        # NaN (added/removed units) last either way
+        order = view.sort_values(sort, ascending=not descending, na_position="last", kind="stable").index.to_numpy()
+        entry["orders"][order_key] = order
+    limit = max(0, min(limit, MAX_PAGE))
+    page = d.loc[order[offset:offset + limit]]
+
+    movers = entry["movers"].get(top)
+    if movers is None:
+        from score_diff import top_movers
+        up, down = top_movers(d, top) if "rank_change" in d else (d.iloc[:0], d.iloc[:0])
+        brief = [c for c in ("SUBZONE_N", "rank_a", "rank_b", "rank_change", "H_score_delta") if c in d]
+        movers = entry["movers"][top] = (_records(up[brief]), _records(down[brief]))
+    return {
+        "base": a.id, "other": b.id, "summary": entry["summary"],
+        "top_up": movers[0], "top_down": movers[1],
+        "total": len(order), "offset": offset, "limit": limit, "rows": _records(page),
+    }
@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import os
+import threading
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
+CONTENT_DIR = BASE_DIR / "content"
+
+# Compressed variants persist here as <sha1>.<ext>, so a restart or a second
+# worker reuses them instead of recompressing an unchanged scoring output.
+VARIANT_DIR = CONTENT_DIR / "cache" / "http"
+KEEP_VARIANTS = 16  # files kept in VARIANT_DIR (oldest pruned)
+
+_EXT = {"br": "br", "gzip": "gz"}
+_PREFERENCE = ("br", "gzip")
+
+
+def _encode(encoding: str, raw: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(raw, quality=11)
+    return gzip.compress(raw, compresslevel=9, mtime=0)
+
+
+def available_encodings():
+    return tuple(e for e in _PREFERENCE if e != "br" or brotli is not None)
+
+
+def content_etag(raw: bytes) -> str:
+    return hashlib.sha1(raw).hexdigest()
+
+
+def precompress(raw: bytes, etag: str, variants: Dict[str, bytes]) -> None:
+    """Fill variants with every available encoding of raw (disk-cached by etag)."""
+    VARIANT_DIR.mkdir(parents=True, exist_ok=True)
+    for enc in sorted(available_encodings(), key=lambda e: e == "br"):  # cheap gzip first
+        path = VARIANT_DIR / f"{etag}.{_EXT[enc]}"
+        try:
+            data = path.read_bytes()
+        except OSError:
+            data = _encode(enc, raw)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        variants[enc] = data
+    files = sorted(VARIANT_DIR.glob("*.*"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[KEEP_VARIANTS:]:
+        old.unlink(missing_ok=True)
+
+
+def precompress_async(raw: bytes, etag: str, variants: Dict[str, bytes]) -> threading.Thread:
+    # brotli at quality 11 takes seconds on the full output; until it lands
+    # the identity (and then gzip) representation is served
+    t = threading.Thread(target=precompress, args=(raw, etag, variants), daemon=True)
+    t.start()
+    return t
+
+
+def negotiate(accept_encoding: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """Best of available allowed by an Accept-Encoding header (None = identity)."""
+    if not accept_encoding:
+        return None
+    q: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[token.strip().lower()] = weight
+    available = set(available)
+    for enc in _PREFERENCE:
+        if enc in available and q.get(enc, q.get("*", 0.0)) > 0:
+            return enc
+    return None
+
+
+def variant_etag(etag: str, encoding: Optional[str]) -> str:
+    # strong validators must differ per representation
+    return f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+
+
+def http_date(ts_ns: int) -> str:
+    return format_datetime(datetime.fromtimestamp(ts_ns / 1e9, tz=timezone.utc), usegmt=True)
+
+
+def is_not_modified(if_none_match: Optional[str], if_modified_since: Optional[str],
+                    etags: Iterable[str], mtime_ns: int) -> bool:
+    """RFC 9110 conditional GET: If-None-Match wins over If-Modified-Since."""
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or bool(tags & set(etags))
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(mtime_ns // 1_000_000_000) <= int(since.timestamp())
+    return False
@@ -0,0 +1,53 @@
+import sys
+import threading
+from typing import Optional
+
+from .data_service import BASE_DIR
+
+__all__ = ["get_layers", "instrument", "layers_fingerprint", "scorer"]
+
+# layer_cache names of the inputs ScoreDemo.load_layers() reads
+LAYER_NAMES = ("subzones", "population", "bus", "hawker", "mrt")
+
+_lock = threading.Lock()
+_layers: Optional[dict] = None
+_fingerprint: Optional[str] = None
+
+
+def _repo_path() -> None:
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+
+
+def scorer():
+    """The ScoreDemo module (kernels, loaders) from the repo root."""
+    _repo_path()
+    import ScoreDemo
+    return ScoreDemo
+
+
+def instrument():
+    """The repo-root span instrumentation module (off unless HAWKER_PROFILE is set)."""
+    _repo_path()
+    import instrument
+    return instrument
+
+
+def get_layers() -> dict:
+    """ScoreDemo input layers, parsed (or read from the layer cache) once per process."""
+    global _layers, _fingerprint
+    if _layers is None:
+        with _lock:
+            if _layers is None:
+                sd = scorer()
+                layers = sd.load_layers()
+                from layer_cache import sources_digest
+                _fingerprint = sources_digest(LAYER_NAMES, sd.LAYER_CACHE_DIR)
+                _layers = layers
+    return _layers
+
+
+def layers_fingerprint() -> str:
+    """Digest of the input files behind get_layers(), for keys of results computed from them."""
+    get_layers()
+    return _fingerprint
@@ -0,0 +1,116 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .data_service import ScoredDataset, get_dataset
+
+# Columns /subzones/top can rank by; Z_Sup is usually wanted ascending (least supplied first).
+SORT_COLUMNS = ("H_score", "Z_Dem", "Z_Sup", "Z_Acc", "population", "supply_count", "nearest_mrt_km")
+# Properties returned per row (geometry never is).
+ROW_PROPS = ("SUBZONE_N", "PLN_AREA_N", "population", "supply_count", "nearest_mrt_km",
+             "Z_Dem", "Z_Sup", "Z_Acc", "H_score")
+MAX_K = 500
+KEEP_RESPONSES = 256  # encoded bodies kept per dataset
+
+__all__ = ["MAX_K", "SORT_COLUMNS", "RankingIndex", "ranking_index", "top_body"]
+
+
+def _json_value(v):
+    return None if isinstance(v, float) and not np.isfinite(v) else v
+
+
+def _column(props: List[dict], name: str) -> np.ndarray:
+    return np.array([v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+                     for v in (p.get(name) for p in props)], dtype=np.float64)
+
+
+class RankingIndex:
+    """Presorted feature orders per (column, direction), overall and per planning area.
+
+    A top-k query is a slice of one precomputed order, after dropping the
+    rows a filter mask rejects; nothing is sorted per request. NaN sorts last
+    both ways, ties keep file order (matching ds.ranked for H_score).
+    """
+
+    def __init__(self, ds: ScoredDataset):
+        self.etag = ds.etag
+        self.ds = ds
+        props = [ds.properties(i) for i in range(len(ds.features))]
+        self.values = {c: _column(props, c) for c in SORT_COLUMNS}
+        areas = [p.get("PLN_AREA_N") or "" for p in props]
+        self.areas = sorted(set(areas) - {""})
+        codes = np.array([self.areas.index(a) if a else -1 for a in areas], dtype=np.intp)
+        self.orders: Dict[Tuple[str, bool], np.ndarray] = {}
+        self.area_orders: Dict[Tuple[str, bool], Dict[str, np.ndarray]] = {}
+        for c, v in self.values.items():
+            for descending in (True, False):
+                key = np.nan_to_num(-v if descending else v, nan=np.inf)
+                order = np.argsort(key, kind="stable")
+                self.orders[c, descending] = order
+                self.area_orders[c, descending] = {a: order[codes[order] == n] for n, a in enumerate(self.areas)}
+        self.rows = [{k: _json_value(p[k]) for k in ROW_PROPS if k in p} for p in props]
+
+    def top(self, k: int, by: str = "H_score", descending: bool = True, planning_area: Optional[str] = None,
+            min_population: Optional[float] = None, max_mrt_km: Optional[float] = None) -> np.ndarray:
+        """Feature indices of the best k matching rows. Raises KeyError for an unknown column or area."""
+        order = self.orders[by, descending] if planning_area is None else \
+            self.area_orders[by, descending][planning_area.upper()]
+        if min_population is not None or max_mrt_km is not None:
+            keep = np.ones(len(self.rows), dtype=bool)
+            if min_population is not None:
+                keep &= self.values["population"] >= min_population
+            if max_mrt_km is not None:
+                keep &= self.values["nearest_mrt_km"] <= max_mrt_km
+            order = order[keep[order]]
+        return order[:k]
+
+
+_lock = threading.Lock()
+_index: Optional[RankingIndex] = None
+_bodies: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+
+def ranking_index() -> Optional[RankingIndex]:
+    """Index of the dataset being served (rebuilt when it changes); None if nothing is loaded."""
+    global _index
+    ds = get_dataset()
+    if ds is None:
+        return None
+    idx = _index
+    if idx is None or idx.etag != ds.etag:
+        with _lock:
+            if _index is None or _index.etag != ds.etag:
+                _index = RankingIndex(ds)
+                _bodies.clear()
+            idx = _index
+    return idx
+
+
+def top_body(idx: RankingIndex, k: int, by: str = "H_score", descending: bool = True,
+             planning_area: Optional[str] = None, min_population: Optional[float] = None,
+             max_mrt_km: Optional[float] = None) -> bytes:
+    """Compact JSON for one top-k query, cached per dataset and parameters.
+
+    Raises KeyError for an unknown column or planning area.
+    """
+    key = (idx.etag, k, by, descending, planning_area and planning_area.upper(), min_population, max_mrt_km)
+    with _lock:
+        body = _bodies.get(key)
+        if body is not None:
+            _bodies.move_to_end(key)
+            return body
+    hits = idx.top(k, by, descending, planning_area, min_population, max_mrt_km)
+    rank, total = idx.ds.rank, len(idx.ds.ranked)
+    body = json.dumps({
+        "by": by, "order": "desc" if descending else "asc", "count": len(hits), "total": total,
+        "subzones": [{"rank": rank[i], **idx.rows[i]} for i in hits.tolist()],
+    }, separators=(",", ":"), allow_nan=False).encode()
+    with _lock:
+        if _index is idx:  # not a dataset swapped out meanwhile
+            _bodies[key] = body
+            while len(_bodies) > KEEP_RESPONSES:
+                _bodies.popitem(last=False)
+    return body
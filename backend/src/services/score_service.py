@@ -0,0 +1,151 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .data_service import CONTENT_DIR
+from .layers_service import get_layers, layers_fingerprint, scorer
+from .scoring_service import config_key
+
+# Component cubes kept in memory, one per lambda set (least recently used
+# evicted first).
+SCORE_CACHE_SIZE = 64
+# Evicted cubes are spilled here as <key>.npz and read back on a later miss;
+# None keeps the cache memory-only.
+SPILL_DIR: Optional[Path] = CONTENT_DIR / "cache" / "score"
+SPILL_KEEP = 512
+
+SCORE_COLUMNS = ("H_score", "Z_Dem", "Z_Sup", "Z_Acc", "Dem", "Sup", "Acc")
+
+__all__ = ["ScoreCache", "cache", "score", "score_records"]
+
+
+class ScoreCache:
+    """LRU of named-vector dicts keyed by config_key, with optional .npz spill."""
+
+    def __init__(self, capacity: int = SCORE_CACHE_SIZE, spill_dir: Optional[Path] = SPILL_DIR):
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        self._items: "OrderedDict[str, Dict[str, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+
+    def get(self, key: str, record: bool = True) -> Optional[Dict[str, np.ndarray]]:
+        with self._lock:
+            cols = self._items.get(key)
+            if cols is not None:
+                self._items.move_to_end(key)
+                self.hits += record
+                return cols
+        cols = self._read_spill(key)
+        with self._lock:
+            if cols is None:
+                self.misses += record
+                return None
+            self.disk_hits += record
+        self.put(key, cols)
+        return cols
+
+    def put(self, key: str, cols: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            self._items[key] = cols
+            self._items.move_to_end(key)
+            evicted = []
+            while len(self._items) > self.capacity:
+                evicted.append(self._items.popitem(last=False))
+        for k, v in evicted:
+            self._spill(k, v)
+
+    def _spill(self, key: str, cols: Dict[str, np.ndarray]) -> None:
+        if self.spill_dir is None:
+            return
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        path = self.spill_dir / f"{key}.npz"
+        tmp = self.spill_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp, **cols)
+        os.replace(tmp, path)
+        files = sorted(self.spill_dir.glob("*.npz"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in files[SPILL_KEEP:]:
+            old.unlink(missing_ok=True)
+
+    def _read_spill(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        if self.spill_dir is None:
+            return None
+        try:
+            with np.load(self.spill_dir / f"{key}.npz") as z:
+                return {k: z[k] for k in z.files}
+        except (OSError, ValueError):
+            return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._items), "capacity": self.capacity,
+            "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else None,
+            "spill": self.spill_dir is not None,
+        }
+
+
+cache = ScoreCache()
+_compute_lock = threading.Lock()
+
+
+def _cube(params: dict) -> Tuple[Dict[str, np.ndarray], bool]:
+    # the input layers are part of the key: spilled cubes outlive the process
+    key = config_key({**params, "layers": layers_fingerprint()})
+    cube = cache.get(key)
+    if cube is not None:
+        return cube, True
+    # one kernel run at a time; a request that waited here for the same
+    # lambdas finds the cube cached
+    with _compute_lock:
+        cube = cache.get(key, record=False)
+        if cube is None:
+            sd, layers = scorer(), get_layers()
+            cube = sd.compute_components(
+                layers["subzones"], layers["demand"], layers["hawker"], layers["mrt"], layers["bus"],
+                pop_col="population", cap_col="capacity", cache_dir=sd.CACHE_DIR, **params,
+            )
+            cache.put(key, cube)
+            return cube, False
+    return cube, True
+
+
+def score(config: dict) -> Tuple[str, Dict[str, np.ndarray], bool]:
+    """(key, score columns, cached) for a KernelConfig dump.
+
+    Only the kernel part (the component cube for the config's lambdas) is
+    cached; weights and betas are applied per call with reweight(), which is
+    O(N), so slider moves never reach the kernels or the disk.
+    """
+    sd = scorer()
+    cube, cached = _cube({k: config[k] for k in sd.LAMBDA_PARAMS})
+    cols = sd.reweight(cube, **{k: config[k] for k in sd.WEIGHT_PARAMS})
+    return config_key(config), cols, cached
+
+
+def _num(v: float) -> Optional[float]:
+    return v if math.isfinite(v) else None
+
+
+def score_records(cols: Dict[str, np.ndarray]) -> list:
+    """Per-subzone rows (layer order) with the 1-based H_score rank."""
+    subzones = get_layers()["subzones"]
+    h = np.nan_to_num(cols["H_score"], nan=-np.inf)
+    rank = np.empty(len(h), dtype=int)
+    rank[np.argsort(-h, kind="stable")] = np.arange(1, len(h) + 1)
+    values = {c: cols[c].tolist() for c in SCORE_COLUMNS}
+    return [
+        {"SUBZONE_N": name, "PLN_AREA_N": area, "rank": int(rank[i]),
+         **{c: _num(values[c][i]) for c in SCORE_COLUMNS}}
+        for i, (name, area) in enumerate(zip(subzones["SUBZONE_N"], subzones["PLN_AREA_N"]))
+    ]
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .data_service import OUT_GEOJSON, reload_dataset
+from .layers_service import instrument, scorer
+
+# Finished jobs remembered for GET /admin/jobs (oldest dropped first).
+KEEP_JOBS = 50
+# The served file's schema (solve.py's output columns), plus the raw kernel sums.
+# A refresh must keep it: the frontend colours by H_score in [0, 1] and
+# /subzones/top filters and sorts on supply_count / nearest_mrt_km.
+OUTPUT_COLUMNS = ("Name", "SUBZONE_N", "PLN_AREA_N", "population", "supply_count", "nearest_mrt_km",
+                  "Z_Dem", "Z_Sup", "Z_Acc", "H_score", "Dem", "Sup", "Acc")
+
+__all__ = ["ScoringJob", "config_key", "get_job", "list_jobs", "run_scoring", "shutdown", "submit_refresh"]
+
+
+def config_key(config: dict) -> str:
+    """Stable hash of a KernelConfig dump (identical configs share a key)."""
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def run_scoring(config: dict, out_path: str) -> dict:
+    """Score every subzone with config and atomically replace out_path (worker process)."""
+    sd, prof = scorer(), instrument()
+    from geojson_writer import write_geojson
+    prof.reset()  # the worker is reused: report only this job's spans
+    t0 = time.perf_counter()
+    layers = sd.load_layers()
+    result = sd.compute_hawker_opportunity(
+        layers["subzones"], layers["demand"], layers["hawker"], layers["mrt"], layers["bus"],
+        pop_col="population", cap_col="capacity", cache_dir=sd.CACHE_DIR, **config,
+    )
+    result = _served_columns(result, layers)
+    write_geojson(out_path, result, columns=[c for c in OUTPUT_COLUMNS if c in result.columns])  # atomic
+    out = {"features": len(result), "seconds": round(time.perf_counter() - t0, 3)}
+    if prof.enabled():
+        out["profile"] = prof.report()["spans"]
+    return out
+
+
+def _served_columns(result, layers):
+    """ScoreDemo output in the served schema: solve.py's supply/MRT columns and H_score min-max scaled."""
+    import numpy as np
+    import shapely
+    from solve import count_points_in, nearest_km  # repo root, on sys.path via scorer()
+
+    result = result.copy()
+    result["population"] = layers["demand"]["population"].to_numpy()
+    hawker = layers["hawker"].geometry
+    result["supply_count"] = count_points_in(result.geometry.to_numpy(), hawker.x.to_numpy(), hawker.y.to_numpy())
+    # nearest MRT exit by haversine from the WGS84 centroid, as solve.py computes it
+    centroid = shapely.centroid(result.geometry.to_crs(4326).to_numpy())
+    mrt = layers["mrt"].geometry.to_crs(4326)
+    result["nearest_mrt_km"] = nearest_km(shapely.get_y(centroid), shapely.get_x(centroid),
+                                          mrt.y.to_numpy(), mrt.x.to_numpy())
+    h = result["H_score"].to_numpy(float)
+    lo, hi = np.nanmin(h), np.nanmax(h)
+    result["H_score"] = 0.5 if not np.isfinite(hi - lo) or hi == lo else (h - lo) / (hi - lo)
+    return result.astype({"supply_count": "Int64"})
+
+
+@dataclass
+class ScoringJob:
+    id: str
+    config: dict
+    key: str
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    requests: int = 1                           # refresh calls coalesced into this job
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return "failed" if self.error else "done"
+        f = self.future
+        return "running" if f is not None and (f.running() or f.done()) else "queued"
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "status": self.status, "config": self.config, "requests": self.requests,
+            "created_at": self.created_at, "finished_at": self.finished_at,
+            "result": self.result, "error": self.error,
+        }
+
+
+_lock = threading.Lock()
+_jobs: "OrderedDict[str, ScoringJob]" = OrderedDict()
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    # one worker: jobs run one after another, and the scorer's memory stays
+    # out of the serving process; spawn avoids forking uvicorn's threads
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def _finish(job: ScoringJob, out_path: Path, f: Future) -> None:
+    # finished_at is always set: a job left without it reads as "running"
+    # forever and every later refresh of its config would join it
+    try:
+        job.result = f.result()
+        spans = job.result.pop("profile", None)
+        if spans:  # worker spans count towards this process's /metrics
+            instrument().merge({"spans": spans})
+        st = os.stat(out_path)
+        ds = reload_dataset(out_path)  # swap in the new output before the job reports done
+        # reload_dataset keeps the old dataset when the file is unreadable:
+        # never snapshot that under this job's config
+        if ds is None or ds.path != Path(out_path) or (ds.mtime_ns, ds.size) != (st.st_mtime_ns, st.st_size):
+            raise OSError(f"{out_path} was written but could not be loaded")
+        from .snapshot_service import save_snapshot  # imports this module
+        job.result["snapshot"] = save_snapshot(ds, job.config, notes=f"refresh {job.id}").id
+    except Exception as e:  # surfaced through the job status
+        job.error = f"{type(e).__name__}: {e}"
+    finally:
+        job.finished_at = time.time()
+
+
+def submit_refresh(config: dict, out_path: Path = OUT_GEOJSON) -> Tuple[ScoringJob, bool]:
+    """Queue a scoring run for config; returns (job, coalesced).
+
+    A refresh with the same config as a job that is still queued or running
+    joins that job instead of scoring again.
+    """
+    key = config_key(config)
+    with _lock:
+        for job in reversed(_jobs.values()):
+            if job.key == key and job.status in ("queued", "running"):
+                job.requests += 1
+                return job, True
+        job = ScoringJob(id=uuid.uuid4().hex[:12], config=dict(config), key=key)
+        _jobs[job.id] = job
+        while len(_jobs) > KEEP_JOBS:
+            _jobs.popitem(last=False)
+        try:
+            job.future = _get_executor().submit(run_scoring, job.config, str(out_path))
+        except BrokenProcessPool:  # a worker died (OOM, kill): start a fresh pool
+            shutdown()
+            job.future = _get_executor().submit(run_scoring, job.config, str(out_path))
+    job.future.add_done_callback(lambda f: _finish(job, out_path, f))
+    return job, False
+
+
+def get_job(job_id: str) -> Optional[ScoringJob]:
+    return _jobs.get(job_id)
+
+
+def list_jobs():
+    return list(reversed(_jobs.values()))
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,8 +1,268 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List
-from ..models.snapshot import Snapshot
+from typing import Dict, List, Optional, Tuple
 
-def list_snapshots(out_dir: Path) -> List[Snapshot]:
-    return []
+import numpy as np
 
+from ..models.snapshot import Snapshot, SnapshotColumn
+from .data_service import CONTENT_DIR, OUT_GEOJSON, ScoredDataset, swap_dataset
+from .layers_service import scorer
+from .scoring_service import config_key
 
+# Layout under SNAPSHOT_DIR:
+#   <id>/meta.json          Snapshot (config, input hashes, column names/kinds)
+#   <id>/scores.npz         one array per property column (c0, c1, ...; m<i> = null mask)
+#   geometry/<sha1>.jsonl   one GeoJSON geometry per line, shared by every
+#                           snapshot of the same polygons in the same order
+#   CURRENT                 id of the snapshot being served
+SNAPSHOT_DIR = CONTENT_DIR / "snapshots"
+# Restored snapshots are materialised back to GeoJSON once and kept here.
+SERVED_DIR = CONTENT_DIR / "cache" / "snapshots"
+KEEP_SERVED = 4     # materialised GeoJSON files / loaded datasets kept
+
+__all__ = ["current_snapshot_id", "delete_snapshot", "get_snapshot", "list_snapshots", "load_columns",
+           "restore_snapshot", "save_snapshot"]
+
+_lock = threading.RLock()
+_input_hashes: Dict[Tuple[str, int, int], str] = {}
+# snapshot id -> its dataset as served (raw bytes == the materialised file)
+_loaded: "OrderedDict[str, ScoredDataset]" = OrderedDict()
+
+
+def _sha1_file(path: str) -> str:
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    if key not in _input_hashes:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _input_hashes[key] = h.hexdigest()
+    return _input_hashes[key]
+
+
+def input_hashes() -> Dict[str, str]:
+    """sha1 of every scorer input file that exists (file name -> hash)."""
+    sd = scorer()
+    paths = (sd.PATH_SUBZONES, sd.PATH_HAWKER, sd.PATH_MRT, sd.BUS_GPKG, sd.PATH_POP)
+    return {os.path.basename(p): _sha1_file(p) for p in paths if os.path.exists(p)}
+
+
+def _column(values: list) -> Tuple[str, np.ndarray, Optional[np.ndarray]]:
+    """(kind, values, null mask or None) for one property column."""
+    null = np.array([v is None for v in values])
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, bool) for v in present):
+        kind, arr = "bool", np.array([bool(v) for v in values])
+    elif all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        kind, arr = "int", np.array([v or 0 for v in values], dtype=np.int64)
+    elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        # JSON has no NaN, so NaN stands for null in float columns
+        kind, arr = "float", np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    else:
+        kind, arr = "str", np.array(["" if v is None else v if isinstance(v, str) else json.dumps(v)
+                                     for v in values], dtype=str)
+    return kind, arr, null if null.any() else None
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _read_meta(path: Path) -> Optional[Snapshot]:
+    try:
+        return Snapshot.model_validate_json(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save_snapshot(ds: ScoredDataset, config: Optional[dict] = None, notes: Optional[str] = None,
+                  make_current: bool = True) -> Snapshot:
+    """Store ds as columnar score vectors plus a (shared) geometry set.
+
+    Snapshot ids are content hashes: saving identical results again returns
+    the existing snapshot.
+    """
+    props = [f.get("properties") or {} for f in ds.features]
+    names: List[str] = []
+    for p in props:
+        names.extend(k for k in p if k not in names)
+
+    geoms = [json.dumps(f.get("geometry"), separators=(",", ":")) for f in ds.features]
+    geom_text = "\n".join(geoms).encode()
+    geometry = hashlib.sha1(geom_text).hexdigest()
+
+    h = hashlib.sha1(geometry.encode())
+    arrays, columns = {}, []
+    for i, name in enumerate(names):
+        kind, arr, null = _column([p.get(name) for p in props])
+        arrays[f"c{i}"] = arr
+        if null is not None:
+            arrays[f"m{i}"] = null
+        columns.append(SnapshotColumn(name=name, kind=kind))
+        h.update(json.dumps([name, kind]).encode())
+        h.update(np.ascontiguousarray(arr).tobytes())
+        h.update(b"" if null is None else null.tobytes())
+    h.update(json.dumps(config, sort_keys=True).encode())
+    snap_id = h.hexdigest()[:16]
+
+    with _lock:
+        snap_dir = SNAPSHOT_DIR / snap_id
+        existing = _read_meta(snap_dir / "meta.json")
+        if existing is None:
+            geom_dir = SNAPSHOT_DIR / "geometry"
+            geom_dir.mkdir(parents=True, exist_ok=True)
+            geom_path = geom_dir / f"{geometry}.jsonl"
+            if not geom_path.exists():
+                _write_atomic(geom_path, geom_text)
+            existing = Snapshot(
+                id=snap_id, created_at=datetime.now(timezone.utc).isoformat(timespec="milliseconds"), notes=notes,
+                config=config, config_key=config_key(config) if config is not None else None,
+                inputs=input_hashes(), geometry=geometry, rows=len(props), columns=columns,
+                source_etag=ds.etag,
+            )
+            tmp = SNAPSHOT_DIR / f".{snap_id}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir(parents=True)
+            with open(tmp / "scores.npz", "wb") as f:
+                np.savez(f, **arrays)
+            (tmp / "meta.json").write_text(existing.model_dump_json(indent=2), encoding="utf-8")
+            os.replace(tmp, snap_dir)
+        _remember(snap_id, ds)
+        if make_current:
+            _write_atomic(SNAPSHOT_DIR / "CURRENT", snap_id.encode())
+    return existing
+
+
+def _remember(snap_id: str, ds: ScoredDataset) -> None:
+    _loaded[snap_id] = ds
+    _loaded.move_to_end(snap_id)
+    while len(_loaded) > KEEP_SERVED:
+        _loaded.popitem(last=False)
+
+
+def list_snapshots() -> List[Snapshot]:
+    """Every snapshot, newest first; only the small meta.json files are read."""
+    if not SNAPSHOT_DIR.exists():
+        return []
+    dirs = [d for d in SNAPSHOT_DIR.iterdir() if d.is_dir() and not d.name.startswith(".")]
+    snaps = [s for s in (_read_meta(d / "meta.json") for d in dirs) if s]
+    return sorted(snaps, key=lambda s: s.created_at, reverse=True)
+
+
+def get_snapshot(snap_id: str) -> Optional[Snapshot]:
+    if not snap_id.isalnum():
+        return None
+    return _read_meta(SNAPSHOT_DIR / snap_id / "meta.json")
+
+
+def current_snapshot_id() -> Optional[str]:
+    try:
+        return (SNAPSHOT_DIR / "CURRENT").read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+def load_columns(snap: Snapshot) -> Dict[str, np.ndarray]:
+    """name -> column array; float nulls are NaN, other nulls come back as masked arrays."""
+    with np.load(SNAPSHOT_DIR / snap.id / "scores.npz") as z:
+        out = {}
+        for i, col in enumerate(snap.columns):
+            arr = z[f"c{i}"]
+            out[col.name] = np.ma.masked_array(arr, z[f"m{i}"]) if f"m{i}" in z and col.kind != "float" else arr
+        return out
+
+
+def _materialise(snap: Snapshot) -> Path:
+    """The snapshot as a GeoJSON file under SERVED_DIR (written once).
+
+    A dataset still in memory is written back byte for byte; otherwise the
+    file is rebuilt from the stored columns and geometry.
+    """
+    path = SERVED_DIR / f"{snap.id}.geojson"
+    if path.exists():
+        os.utime(path)
+        return path
+    ds = _loaded.get(snap.id)
+    if ds is not None:
+        SERVED_DIR.mkdir(parents=True, exist_ok=True)
+        _write_atomic(path, ds.raw)
+        _prune_served()
+        return path
+    import pandas as pd
+    from geojson_writer import write_geojson  # repo root, on sys.path via scorer()
+
+    geoms = (SNAPSHOT_DIR / "geometry" / f"{snap.geometry}.jsonl").read_text(encoding="utf-8").split("\n")
+    cols = {}
+    for name, arr in load_columns(snap).items():
+        if isinstance(arr, np.ma.MaskedArray):
+            arr = np.where(arr.mask, None, arr.data.astype(object))
+        cols[name] = arr
+    SERVED_DIR.mkdir(parents=True, exist_ok=True)
+    write_geojson(path, pd.DataFrame(cols), geometry_json=geoms)
+    _prune_served()
+    return path
+
+
+def _prune_served() -> None:
+    files = sorted(SERVED_DIR.glob("*.geojson"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[KEEP_SERVED:]:
+        old.unlink(missing_ok=True)
+
+
+def restore_snapshot(snap_id: str, out_path: Path = OUT_GEOJSON) -> Snapshot:
+    """Serve snapshot snap_id: its GeoJSON is copied over out_path and its dataset swapped in.
+
+    The copy goes to a temporary file first and is renamed into place, so
+    readers see the old or the new file, and out_path never shares an inode
+    with the materialised snapshot. A snapshot saved or restored earlier in
+    this process is swapped in as already loaded (only its path and stat
+    change), with its compressed variants and tiles; otherwise the copy is
+    parsed once. Raises KeyError for an unknown id and OSError if the
+    restored file cannot be loaded.
+    """
+    snap = get_snapshot(snap_id)
+    if snap is None:
+        raise KeyError(snap_id)
+    scorer()  # repo root on sys.path for the writer
+    with _lock:
+        src = _materialise(snap)
+        tmp = out_path.with_name(f"{out_path.name}.{os.getpid()}.tmp")
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, out_path)
+        st = out_path.stat()
+        ds = _loaded.get(snap.id)
+        if ds is not None and len(ds.raw) == st.st_size:  # raw is the file just copied
+            ds = replace(ds, path=out_path, mtime_ns=st.st_mtime_ns, size=st.st_size)
+        else:
+            try:
+                ds = ScoredDataset.load(out_path)
+            except ValueError as e:
+                raise OSError(f"restored snapshot {snap.id} could not be loaded from {out_path}: {e}")
+        _remember(snap.id, ds)
+        swap_dataset(ds)
+        _write_atomic(SNAPSHOT_DIR / "CURRENT", snap.id.encode())
+    return snap
+
+
+def delete_snapshot(snap_id: str) -> bool:
+    """Remove a snapshot (and geometry no other snapshot uses); False if unknown."""
+    snap = get_snapshot(snap_id)
+    if snap is None:
+        return False
+    with _lock:
+        shutil.rmtree(SNAPSHOT_DIR / snap.id, ignore_errors=True)
+        (SERVED_DIR / f"{snap.id}.geojson").unlink(missing_ok=True)
+        _loaded.pop(snap.id, None)
+        if all(s.geometry != snap.geometry for s in list_snapshots()):
+            (SNAPSHOT_DIR / "geometry" / f"{snap.geometry}.jsonl").unlink(missing_ok=True)
+    return True
@@ -0,0 +1,144 @@
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    import shapely
+    from pyproj import Transformer
+    from scipy.spatial import cKDTree
+except ImportError:  # optional: the spatial endpoints answer 503 without them
+    np = shapely = Transformer = cKDTree = None
+
+from .data_service import get_dataset
+from .layers_service import get_layers
+
+POINT_LAYERS = ("hawker", "mrt", "bus")
+MAX_K = 100
+SUMMARY_PROPS = ("SUBZONE_N", "PLN_AREA_N", "H_score")
+
+__all__ = ["POINT_LAYERS", "available", "point_index", "subzone_index", "warm_async"]
+
+
+def available() -> bool:
+    return cKDTree is not None
+
+
+class SubzoneIndex:
+    """STRtree over the served subzone polygons (WGS84), for one dataset etag."""
+
+    def __init__(self, ds):
+        self.etag = ds.etag
+        self.ds = ds
+        idx, geoms = [], []
+        for i, f in enumerate(ds.features):
+            g = f.get("geometry")
+            if g:
+                idx.append(i)
+                geoms.append(shapely.force_2d(shapely.geometry.shape(g)))
+        self.feature = np.array(idx, dtype=np.intp)   # tree position -> feature index
+        self.geoms = np.array(geoms, dtype=object)
+        self.tree = shapely.STRtree(self.geoms)
+        shapely.prepare(self.geoms)
+
+    def at(self, lon: float, lat: float) -> Optional[int]:
+        """Feature index of the subzone containing (lon, lat), or None."""
+        hits = self.tree.query(shapely.Point(lon, lat), predicate="intersects")
+        return int(self.feature[hits.min()]) if len(hits) else None
+
+    def in_bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                within: bool = False) -> List[int]:
+        """Feature indices intersecting (or within) the box, best rank first."""
+        hits = self.tree.query(shapely.box(min_lon, min_lat, max_lon, max_lat),
+                               predicate="contains" if within else "intersects")  # box contains subzone
+        return sorted((int(i) for i in self.feature[hits]), key=self.ds.rank.__getitem__)
+
+    def summary(self, i: int) -> dict:
+        p = self.ds.properties(i)
+        return {"rank": self.ds.rank[i], **{k: p.get(k) for k in SUMMARY_PROPS}}
+
+
+def _labels(layer: str, gdf) -> List[dict]:
+    if layer == "hawker":
+        cols = {"name": "NAME_EXTRACT", "status": "STATUS"}
+    elif layer == "bus":
+        cols = {"code": "BusStopCode", "name": "Description", "road": "RoadName"}
+    else:
+        from desc_table import parse_desc_table  # repo root, on sys.path via get_layers()
+        info = [parse_desc_table(d or "", ("STATION_NA", "EXIT_CODE")) for d in gdf["Description"]]
+        return [{"name": r.get("STATION_NA"), "exit": r.get("EXIT_CODE")} for r in info]
+    cols = {k: c for k, c in cols.items() if c in gdf.columns}
+    vals = {k: gdf[c].astype(object).where(gdf[c].notna(), None).tolist() for k, c in cols.items()}
+    return [dict(zip(vals, row)) for row in zip(*vals.values())]
+
+
+class PointIndex:
+    """KD-tree over one point layer in SVY21 metres; queries come in as WGS84."""
+
+    def __init__(self, layer: str, gdf):
+        self.layer = layer
+        self.xy = np.column_stack([gdf.geometry.x.to_numpy(), gdf.geometry.y.to_numpy()])
+        ll = gdf.geometry.to_crs(4326)
+        self.lonlat = np.column_stack([ll.x.to_numpy(), ll.y.to_numpy()])
+        self.labels = _labels(layer, gdf)
+        self.tree = cKDTree(self.xy)
+        self._to_xy = Transformer.from_crs(4326, gdf.crs, always_xy=True)
+
+    def nearest(self, lon: float, lat: float, k: int = 5, max_distance: Optional[float] = None) -> List[dict]:
+        x, y = self._to_xy.transform(lon, lat)
+        k = max(1, min(k, MAX_K, len(self.xy)))
+        dist, idx = self.tree.query([x, y], k=k, distance_upper_bound=np.inf if max_distance is None else max_distance)
+        dist, idx = np.atleast_1d(dist), np.atleast_1d(idx)
+        found = idx < len(self.xy)  # misses beyond max_distance come back as len(xy)
+        return [{"distance_m": round(float(d), 1), "lon": float(self.lonlat[i, 0]), "lat": float(self.lonlat[i, 1]),
+                 **self.labels[i]} for d, i in zip(dist[found], idx[found])]
+
+
+_lock = threading.Lock()
+_subzones: Optional[SubzoneIndex] = None
+_points: Dict[str, PointIndex] = {}
+
+
+def subzone_index() -> Optional[SubzoneIndex]:
+    """Index of the dataset being served (rebuilt when it changes); None if nothing is loaded."""
+    global _subzones
+    ds = get_dataset()
+    if ds is None or not available():
+        return None
+    idx = _subzones
+    if idx is None or idx.etag != ds.etag:
+        with _lock:
+            if _subzones is None or _subzones.etag != ds.etag:
+                _subzones = SubzoneIndex(ds)
+            idx = _subzones
+    return idx
+
+
+def point_index(layer: str) -> Optional[PointIndex]:
+    """Index over a ScoreDemo input layer (built once per process); None if the layer is missing."""
+    if layer not in POINT_LAYERS or not available():
+        return None
+    idx = _points.get(layer)
+    if idx is None:
+        gdf = get_layers().get(layer)
+        if gdf is None or not len(gdf):
+            return None
+        with _lock:
+            idx = _points.get(layer)
+            if idx is None:
+                idx = _points[layer] = PointIndex(layer, gdf)
+    return idx
+
+
+def warm_async() -> Optional[threading.Thread]:
+    """Build every index in the background, so the first queries do not pay for it."""
+    if not available():
+        return None
+
+    def run():
+        subzone_index()
+        for layer in POINT_LAYERS:
+            point_index(layer)
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t
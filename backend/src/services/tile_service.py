@@ -0,0 +1,167 @@
+import math
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import numpy as np
+    import shapely
+    import mapbox_vector_tile
+except ImportError:  # optional: /tiles answers 503 without them
+    np = shapely = mapbox_vector_tile = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
+CONTENT_DIR = BASE_DIR / "content"
+
+# Rendered tiles live under <TILE_DIR>/<dataset etag>/<z>/<x>/<y>.mvt, so a
+# new scoring output never serves stale tiles and old sets can be dropped.
+TILE_DIR = CONTENT_DIR / "cache" / "tiles"
+KEEP_TILESETS = 2
+
+LAYER_NAME = "subzones"
+EXTENT = 4096            # MVT integer grid per tile
+BUFFER = 64              # clip overlap in grid units, hides seams at tile edges
+MIN_ZOOM, MAX_ZOOM = 9, 17
+PREGEN_MAX_ZOOM = 14     # deeper zooms are rendered on first request
+TILE_PROPS = ("SUBZONE_N", "PLN_AREA_N", "H_score", "Z_Dem", "Z_Sup", "Z_Acc", "Dem", "Sup", "Acc")
+
+_R = 6378137.0
+_ORIGIN = math.pi * _R   # half the web-mercator world width in metres
+
+
+def available() -> bool:
+    return mapbox_vector_tile is not None
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Web-mercator (EPSG:3857) bounds of an XYZ tile."""
+    size = 2 * _ORIGIN / 2**z
+    minx = -_ORIGIN + x * size
+    maxy = _ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def _to_mercator(coords):
+    lon, lat = coords[:, 0], np.clip(coords[:, 1], -85.0511, 85.0511)
+    return np.column_stack([np.radians(lon) * _R, np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * _R])
+
+
+class TileSet:
+    """Vector tiles for one ScoredDataset (identified by its etag)."""
+
+    def __init__(self, ds):
+        self.etag = ds.etag
+        self.root = TILE_DIR / ds.etag
+        geoms, props = [], []
+        for f in ds.features:
+            g = f.get("geometry")
+            if not g:
+                continue
+            p = f.get("properties") or {}
+            geoms.append(shapely.force_2d(shapely.geometry.shape(g)))
+            props.append({k: p[k] for k in TILE_PROPS if p.get(k) is not None})
+        self.geoms = shapely.transform(np.array(geoms, dtype=object), _to_mercator)
+        self.props = props
+        self._levels: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _level(self, z: int):
+        # simplify once per zoom to the size of one tile grid unit: finer
+        # detail would be quantised away anyway
+        with self._lock:
+            if z not in self._levels:
+                tol = 2 * _ORIGIN / 2**z / EXTENT
+                simple = shapely.simplify(self.geoms, tol, preserve_topology=True)
+                self._levels[z] = (simple, shapely.STRtree(simple))
+            return self._levels[z]
+
+    def bounds(self):
+        return tuple(shapely.total_bounds(self.geoms))
+
+    def render(self, z: int, x: int, y: int) -> bytes:
+        simple, tree = self._level(z)
+        b = tile_bounds(z, x, y)
+        pad = (b[2] - b[0]) * BUFFER / EXTENT
+        clip = (b[0] - pad, b[1] - pad, b[2] + pad, b[3] + pad)
+        feats = []
+        for i in tree.query(shapely.box(*clip)):
+            g = shapely.clip_by_rect(simple[i], *clip)
+            if not g.is_empty:
+                feats.append({"geometry": g, "properties": self.props[i], "id": int(i)})
+        return mapbox_vector_tile.encode(
+            {"name": LAYER_NAME, "features": feats},
+            default_options={"quantize_bounds": b, "extents": EXTENT},
+        )
+
+    def tile_path(self, z: int, x: int, y: int) -> Path:
+        return self.root / str(z) / str(x) / f"{y}.mvt"
+
+    def get(self, z: int, x: int, y: int) -> bytes:
+        path = self.tile_path(z, x, y)
+        try:
+            return path.read_bytes()
+        except OSError:
+            pass
+        data = self.render(z, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return data
+
+    def tiles_covering(self, z: int):
+        minx, miny, maxx, maxy = self.bounds()
+        size = 2 * _ORIGIN / 2**z
+        x0, x1 = int((minx + _ORIGIN) // size), int((maxx + _ORIGIN) // size)
+        y0, y1 = int((_ORIGIN - maxy) // size), int((_ORIGIN - miny) // size)
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def pregenerate(self, max_zoom: int = PREGEN_MAX_ZOOM) -> int:
+        n = 0
+        for z in range(MIN_ZOOM, max_zoom + 1):
+            for x, y in self.tiles_covering(z):
+                self.get(z, x, y)
+                n += 1
+        return n
+
+
+_tilesets: Dict[str, TileSet] = {}
+_tilesets_lock = threading.Lock()
+
+
+def tileset_for(ds) -> Optional[TileSet]:
+    if not available() or ds is None:
+        return None
+    with _tilesets_lock:
+        ts = _tilesets.get(ds.etag)
+        if ts is None:
+            ts = _tilesets[ds.etag] = TileSet(ds)
+            for etag in list(_tilesets)[:-KEEP_TILESETS]:
+                del _tilesets[etag]
+        return ts
+
+
+def _prune_tile_dirs(keep: str) -> None:
+    if not TILE_DIR.exists():
+        return
+    dirs = sorted((d for d in TILE_DIR.iterdir() if d.is_dir() and d.name != keep),
+                  key=lambda d: d.stat().st_mtime, reverse=True)
+    for d in dirs[KEEP_TILESETS - 1:]:
+        shutil.rmtree(d, ignore_errors=True)
+
+
+def pregenerate_async(ds) -> Optional[threading.Thread]:
+    """Render MIN_ZOOM..PREGEN_MAX_ZOOM for ds into the tile cache in the background."""
+    ts = tileset_for(ds)
+    if ts is None:
+        return None
+
+    def run():
+        _prune_tile_dirs(keep=ts.etag)
+        ts.pregenerate()
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t
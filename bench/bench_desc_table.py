@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Micro-benchmark + correctness check for desc_table.parse_desc_table.
+
+Compares the single-pass extractor against the BeautifulSoup parser that
+solve.py used before (and ScoreDemo's old per-key regex for the hawker
+NAME/STATUS fields) over every feature of the MasterPlan subzone, hawker
+centre and MRT exit layers. Exits non-zero on any mismatch.
+
+    python bench/bench_desc_table.py [--repeat 5]
+"""
+import argparse, json, re, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from desc_table import parse_desc_table  # noqa: E402
+
+LAYERS = {
+    "subzones": ROOT / "content" / "MasterPlan2019SubzoneBoundaryNoSeaGEOJSON.geojson",
+    "hawkers": ROOT / "content" / "HawkerCentresGEOJSON.geojson",
+    "mrt": ROOT / "content" / "LTAMRTStationExitGEOJSON.geojson",
+}
+
+
+def bs4_parse(html):
+    # reference: solve._parse_desc_table before the switch
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html or "", "html.parser")
+    kv = {}
+    for tr in soup.find_all("tr"):
+        ths = tr.find_all("th")
+        tds = tr.find_all("td")
+        if len(ths) == 1 and len(tds) == 1:
+            kv[ths[0].get_text(strip=True)] = tds[0].get_text(strip=True)
+    return kv
+
+
+def regex_field(html, key):
+    # reference: ScoreDemo.parse_field before the switch
+    m = re.search(fr"<th[^>]*>{key}</th>\s*<td[^>]*>(.*?)</td>", str(html), flags=re.I|re.S)
+    return re.sub("<.*?>", "", m.group(1)).strip() if m else None
+
+
+def timed(fn, docs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for d in docs:
+            fn(d)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--repeat", type=int, default=5)
+    args = p.parse_args()
+
+    failures = 0
+    for name, path in LAYERS.items():
+        feats = json.loads(path.read_text(encoding="utf-8"))["features"]
+        docs = [(f.get("properties") or {}).get("Description", "") for f in feats]
+
+        bad = [i for i, d in enumerate(docs) if parse_desc_table(d) != bs4_parse(d)]
+        if name == "hawkers":
+            fields = ("NAME", "NAME OF HAWKER CENTRE", "STATUS")
+            bad += [i for i, d in enumerate(docs)
+                    if any(parse_desc_table(d, fields).get(k) != regex_field(d, k) for k in fields)]
+        failures += len(bad)
+
+        t_new = timed(parse_desc_table, docs, args.repeat)
+        t_bs4 = timed(bs4_parse, docs, max(1, args.repeat // 5))
+        print(f"{name:9s} n={len(docs):4d}  mismatches={len(bad):3d}  "
+              f"bs4={t_bs4*1e3:8.1f} ms  desc_table={t_new*1e3:6.1f} ms  x{t_bs4/t_new:5.1f}")
+        for i in bad[:5]:
+            print("  mismatch in feature", i, file=sys.stderr)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Stage timings and peak RSS of the scoring pipeline on synthetic scale-ups.
+
+For every scale factor s the layers are regenerated with s times the real
+Singapore counts (subzone evaluation points, demand points, hawker centres,
+MRT exits, bus stops). Points are drawn uniformly inside the MasterPlan 2019
+subzone polygons. Each scale runs in a fresh subprocess, so peak RSS is not
+inherited from a previous scale. Stages timed:
+
+    load       read the synthetic GeoJSON layers and project to SVY21
+    distance   ScoreDemo.pairwise_dist demand x evaluation points (skipped
+               above --max-dist-pairs)
+    kernel     ScoreDemo.compute_components (Dem, Sup, Acc_MRT, Acc_BUS)
+    normalise  ScoreDemo.reweight (robust_z + H_score)
+    write      scored evaluation points to GeoJSON (geojson_writer)
+    solve      solve.compute_scores_to_geojson with the synthetic hawkers/MRT
+
+Results go to --out as JSON. --baseline compares against an earlier file and
+--check exits non-zero when a stage got slower than --tolerance allows.
+Everything runs offline on the files in content/.
+
+    python bench/bench_pipeline.py --scales 1,2,5,10 --out bench/results/latest.json
+    python bench/bench_pipeline.py --baseline bench/results/baseline.json --check
+"""
+import argparse, json, os, platform, resource, subprocess, sys, tempfile, threading, time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+RESULTS_DIR = ROOT / "bench" / "results"
+STAGES = ("load", "distance", "kernel", "normalise", "write", "solve")
+# counts at scale 1 (the real layers)
+BASE_SIZES = {"eval": 332, "demand": 332, "hawker": 125, "mrt": 563, "bus": 5165}
+
+
+# ---------- synthetic layers ----------
+def synth_points(polys, n, rng):
+    """n points uniform over the union of polys (shapely array, metric CRS)."""
+    import shapely
+    area = shapely.area(polys)
+    bounds = shapely.bounds(polys)
+    xs, ys = [], []
+    need = n
+    while need > 0:
+        # pick polygons by area, sample their bounding boxes, keep hits
+        k = max(2 * need, 1024)
+        idx = rng.choice(len(polys), size=k, p=area / area.sum())
+        b = bounds[idx]
+        x = rng.uniform(b[:, 0], b[:, 2])
+        y = rng.uniform(b[:, 1], b[:, 3])
+        hit = shapely.contains_xy(polys[idx], x, y)
+        xs.append(x[hit][:need])
+        ys.append(y[hit][:need])
+        need -= len(xs[-1])
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+def make_layers(scale, out_dir, seed=0):
+    """Write the synthetic layers for one scale as WGS84 GeoJSON; returns paths and sizes."""
+    import geopandas as gpd
+    import ScoreDemo as sd
+    rng = np.random.default_rng(seed)
+    subzones = sd.load_subzones()
+    polys = subzones.geometry.to_numpy()
+    sizes = {k: int(round(v * scale)) for k, v in BASE_SIZES.items()}
+    paths = {}
+    for name, n in sizes.items():
+        x, y = synth_points(polys, n, rng)
+        gdf = gpd.GeoDataFrame({"Name": [f"{name}_{i}" for i in range(n)]},
+                               geometry=gpd.points_from_xy(x, y), crs=sd.TARGET_CRS)
+        if name == "demand":
+            gdf["population"] = rng.integers(0, 30000, n).astype(float)
+        if name == "hawker":
+            gdf["capacity"] = 1.0
+        gdf = gdf.to_crs(4326)
+        if name in ("hawker", "mrt"):  # what solve.load_points reads
+            gdf["Longitude"], gdf["Latitude"] = gdf.geometry.x, gdf.geometry.y
+        paths[name] = Path(out_dir) / f"{name}.geojson"
+        gdf.to_file(paths[name], driver="GeoJSON")
+    return paths, sizes
+
+
+# ---------- measurement ----------
+class PeakRSS:
+    """Samples this process's resident set size; peak() since the last reset()."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._peak = 0
+        self._stop = threading.Event()
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def current(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:  # no procfs: lifetime peak only
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, self.current())
+
+    def reset(self):
+        self._peak = self.current()
+
+    def peak(self):
+        return max(self._peak, self.current())
+
+    def close(self):
+        self._stop.set()
+
+
+def run_scale(scale, args):
+    """One scale in this process: {"scale", "sizes", "stages": {stage: {...}}}."""
+    import geopandas as gpd
+    import ScoreDemo as sd
+    import solve
+    from geojson_writer import write_geojson
+
+    rss = PeakRSS()
+    stages = {}
+
+    def timed(stage, fn, repeat=args.repeat):
+        best, out = float("inf"), None
+        rss.reset()
+        for _ in range(repeat):
+            t = time.perf_counter()
+            out = fn()
+            best = min(best, time.perf_counter() - t)
+        stages[stage] = {"seconds": best, "peak_rss_mb": rss.peak() / 2**20}
+        return out
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths, sizes = make_layers(scale, tmp, seed=args.seed)
+        read = lambda name: gpd.read_file(paths[name]).to_crs(sd.TARGET_CRS)
+        layers = timed("load", lambda: {name: read(name) for name in paths}, repeat=1)
+
+        XY_i, XY_u = sd.xy_from_gdf(layers["eval"]), sd.xy_from_gdf(layers["demand"])
+        if len(XY_i) * len(XY_u) <= args.max_dist_pairs:
+            timed("distance", lambda: sd.pairwise_dist(XY_u, XY_i))
+        else:
+            stages["distance"] = {"seconds": None, "peak_rss_mb": None, "skipped": "max_dist_pairs"}
+
+        engine_kw = dict(engine=args.engine, max_bytes=args.max_bytes,
+                         dtype=np.float32 if args.dtype == "float32" else None)
+        cube = timed("kernel", lambda: sd.compute_components(
+            layers["eval"], layers["demand"], layers["hawker"], layers["mrt"], layers["bus"], **engine_kw))
+        scores = timed("normalise", lambda: sd.reweight(cube))
+
+        out = layers["eval"].copy()
+        for col, val in scores.items():
+            out[col] = val
+        timed("write", lambda: write_geojson(Path(tmp) / "scored.geojson", out))
+
+        # solve writes debug_output.csv to the working directory
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            timed("solve", lambda: solve.compute_scores_to_geojson(
+                ROOT / solve.DEF_MP, ROOT / solve.DEF_POP,
+                paths["hawker"], paths["mrt"], Path(tmp) / "solve.geojson", cache_dir=None))
+        finally:
+            os.chdir(cwd)
+    rss.close()
+    return {"scale": scale, "sizes": sizes, "stages": stages,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+# ---------- reporting ----------
+def meta():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        rev = None
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "git": rev,
+            "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def compare(result, baseline, tolerance, min_delta=0.0):
+    """Print per stage/scale ratios to baseline; returns the regressed (scale, stage) pairs."""
+    base = {(r["scale"], s): v.get("seconds") for r in baseline["runs"] for s, v in r["stages"].items()}
+    slower = []
+    print(f"{'scale':>6} {'stage':10s} {'seconds':>10} {'baseline':>10} {'ratio':>7}")
+    for r in result["runs"]:
+        for stage in STAGES:
+            cur, ref = r["stages"].get(stage, {}).get("seconds"), base.get((r["scale"], stage))
+            if cur is None or not ref:
+                continue
+            ratio = cur / ref
+            flag = "  SLOWER" if ratio > 1 + tolerance and cur - ref > min_delta else ""
+            if flag:
+                slower.append((r["scale"], stage))
+            print(f"{r['scale']:>6g} {stage:10s} {cur:10.4f} {ref:10.4f} {ratio:7.2f}{flag}")
+    return slower
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--scales", default="1,2,5,10", help="comma-separated multiples of the real sizes (up to 100)")
+    p.add_argument("--repeat", type=int, default=3, help="timing repeats per stage (best is kept)")
+    p.add_argument("--engine", choices=("dense", "sparse"), default="dense")
+    p.add_argument("--dtype", choices=("float64", "float32"), default="float64")
+    p.add_argument("--max-bytes", type=int, default=256 * 2**20, help="kernel block budget (streaming)")
+    p.add_argument("--max-dist-pairs", type=float, default=5e7, help="skip the distance stage above this")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default=str(RESULTS_DIR / "latest.json"))
+    p.add_argument("--baseline", help="earlier results JSON to compare against")
+    p.add_argument("--save-baseline", action="store_true", help="also copy the results to bench/results/baseline.json")
+    p.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown ratio above 1 before flagging")
+    p.add_argument("--min-delta", type=float, default=0.01,
+                   help="ignore slowdowns smaller than this many seconds (timer noise)")
+    p.add_argument("--check", action="store_true", help="exit 1 if any stage is slower than the baseline allows")
+    p.add_argument("--worker", type=float, help=argparse.SUPPRESS)
+    p.add_argument("--worker-out", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.worker is not None:
+        with open(args.worker_out, "w") as f:
+            json.dump(run_scale(args.worker, args), f)
+        return
+
+    runs = []
+    for scale in [float(s) for s in args.scales.split(",")]:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            worker_out = f.name
+        cmd = [sys.executable, __file__, "--worker", str(scale), "--worker-out", worker_out,
+               "--repeat", str(args.repeat), "--engine", args.engine, "--dtype", args.dtype,
+               "--max-bytes", str(args.max_bytes), "--max-dist-pairs", str(args.max_dist_pairs),
+               "--seed", str(args.seed)]
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        with open(worker_out) as f:
+            run = json.load(f)
+        os.unlink(worker_out)
+        runs.append(run)
+        line = "  ".join(f"{s}={v['seconds']:.3f}s/{v['peak_rss_mb']:.0f}MB"
+                         for s, v in run["stages"].items() if v.get("seconds") is not None)
+        print(f"scale {scale:g}: {line}")
+
+    result = {"meta": meta(), "config": {k: getattr(args, k) for k in ("repeat", "engine", "dtype", "max_bytes", "seed")},
+              "runs": runs}
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print("Wrote", out)
+    if args.save_baseline:
+        (RESULTS_DIR / "baseline.json").write_text(json.dumps(result, indent=2))
+
+    if args.baseline:
+        slower = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance, args.min_delta)
+        if args.check and slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
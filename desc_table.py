@@ -0,0 +1,36 @@
+"""Key/value extraction from KML-style Description tables.
+
+The data.gov.sg KML→GeoJSON exports (MasterPlan subzones, hawker centres, MRT
+exits) keep their attributes as an HTML table in the Description property:
+
+    <tr bgcolor="..."> <th>SUBZONE_N</th> <td>DEPOT ROAD</td> </tr>
+
+parse_desc_table() reads every <th>/<td> pair in one regex pass instead of
+building a BeautifulSoup tree per feature. Cell text follows
+BeautifulSoup's get_text(strip=True): tags dropped, entities unescaped and
+each text fragment stripped before joining.
+"""
+import re
+from html import unescape
+
+# th/td cell contents may not open or close another table cell/row, so the
+# colspan'd "Attributes" header row never swallows the first real key
+_CELL = r"((?:(?!</?t[dhr]\b).)*?)"
+_PAIR = re.compile(rf"<th\b[^>]*>{_CELL}</th>\s*<td\b[^>]*>{_CELL}</td>", re.I | re.S)
+_TAG = re.compile(r"<[^>]*>")
+
+
+def cell_text(html):
+    return "".join(unescape(part).strip() for part in _TAG.split(html))
+
+
+def parse_desc_table(html, keys=None):
+    """{key: value} for every th/td row of html, optionally only for keys."""
+    kv = {}
+    if not html or not isinstance(html, str):
+        return kv
+    for m in _PAIR.finditer(html):
+        k = cell_text(m.group(1))
+        if keys is None or k in keys:
+            kv[k] = cell_text(m.group(2))
+    return kv
@@ -0,0 +1,112 @@
+"""Streaming GeoJSON writer for scored layers.
+
+write_geojson() encodes a (Geo)DataFrame CHUNK rows at a time and appends the
+features to disk, so memory stays bounded by one chunk whatever the number of
+units (fine grids included). Within a chunk nothing is built per row as a
+dict: each property column is turned into JSON text in one pass over the
+column, geometries go through shapely's vectorised rounding and GeoJSON
+encoder, and every feature is one string format of those pieces.
+
+    write_geojson("content/out/hawker_opportunity.geojson", result, precision=PRECISION, drop_z=True)
+
+Coordinates are written as they are unless asked otherwise: precision rounds
+them to that many decimals (PRECISION = 6 ~ 0.1 m in WGS84) and drop_z strips
+Z, which together roughly halve a subzone file. Missing and non-finite
+property values are written as null. The file is written next to
+path and moved into place when complete, so readers never see half a file.
+"""
+import json, os
+import numpy as np
+import shapely
+
+CHUNK = 4096   # features encoded per write
+PRECISION = 6  # suggested coordinate decimals (WGS84 degrees); not the default
+
+
+def _default(o):
+    return o.item() if isinstance(o, np.generic) else str(o)
+
+
+_encode = json.JSONEncoder(default=_default).encode
+
+
+def encode_column(s):
+    """JSON text of every value of a Series; missing and non-finite numbers become null."""
+    missing = s.isna().to_numpy()
+    kind = s.dtype.kind
+    if kind == "f":
+        arr = s.to_numpy(float, na_value=np.nan)
+        missing = missing | ~np.isfinite(arr)
+        out = list(map(float.__repr__, arr.tolist()))
+    elif kind in "iu":
+        out = list(map(str, s.tolist()))
+    elif kind == "b":
+        out = ["true" if v is True else "false" for v in s.tolist()]
+    else:
+        out = [None] * len(s)
+        for i in np.flatnonzero(~missing).tolist():
+            out[i] = _encode(s.iat[i])
+    for i in np.flatnonzero(missing).tolist():
+        out[i] = "null"
+    return out
+
+
+def encode_geometry(geoms, precision=None, drop_z=False):
+    """GeoJSON text of an array of shapely geometries (None -> null)."""
+    geoms = np.asarray(geoms, dtype=object)
+    if precision is not None:
+        geoms = shapely.transform(geoms, lambda c: np.round(c, precision), include_z=not drop_z)
+    elif drop_z:
+        geoms = shapely.force_2d(geoms)
+    return ["null" if g is None else g for g in shapely.to_geojson(geoms).tolist()]
+
+
+def write_geojson(path, df, *, columns=None, geometry="geometry", precision=None,
+                  drop_z=False, skip_null_geometry=False, name=None, chunk=CHUNK, geometry_json=None):
+    """Write df as a FeatureCollection to path; returns the number of features.
+
+    columns selects the properties (default: every column but the geometry).
+    A GeoDataFrame in another CRS is reprojected to WGS84 first.
+    geometry_json, one GeoJSON geometry text per row, is written verbatim
+    instead of encoding df[geometry] (precision and drop_z do not apply);
+    skip_null_geometry then drops the rows whose text is null.
+    """
+    crs = getattr(df, "crs", None)
+    if crs is not None and crs.to_epsg() != 4326:
+        df = df.to_crs(4326)
+    if skip_null_geometry:
+        if geometry_json is not None:
+            keep = np.array([g is not None and g != "null" for g in geometry_json], dtype=bool)
+            geometry_json = [g for g, k in zip(geometry_json, keep) if k]
+        else:
+            keep = df[geometry].notna().to_numpy()
+        df = df[keep]
+    props = [c for c in (df.columns if columns is None else columns) if c != geometry]
+    # one %-template per feature: "key":%s for each property, then the geometry
+    fields = ",".join(json.dumps(str(c)).replace("%", "%%") + ":%s" for c in props)
+    feature = '{"type":"Feature","properties":{' + fields + '},"geometry":%s}'
+
+    head = {"type": "FeatureCollection"}
+    if name is not None:
+        head["name"] = name
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(head)[:-1] + ', "features": [\n')
+            for a in range(0, len(df), chunk):
+                part = df.iloc[a:a + chunk]
+                cols = [encode_column(part[c]) for c in props]
+                if geometry_json is not None:
+                    cols.append(geometry_json[a:a + chunk])
+                else:
+                    cols.append(encode_geometry(part[geometry].to_numpy(), precision, drop_z))
+                if a:
+                    f.write(",\n")
+                f.write(",\n".join(feature % row for row in zip(*cols)))
+            f.write("\n]}\n")
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return len(df)
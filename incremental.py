@@ -0,0 +1,148 @@
+"""What-if rescoring that keeps the scored state resident.
+
+IncrementalScorer computes the raw Dem/Sup/Acc vectors once (same model as
+ScoreDemo.compute_hawker_opportunity) and then applies single-point deltas:
+adding, removing or moving a hawker centre, MRT exit or bus stop only touches
+the evaluation points within the kernel's effective radius (SPARSE_CUTOFF
+multiples of lambda), after which the Z-scores and H_score are recomputed.
+With engine="dense" the state is exact instead: every delta updates every
+evaluation point, so it stays equal to a dense rescore.
+
+    layers = load_layers()
+    state = IncrementalScorer.from_layers(layers)
+    hid = state.add("supply", 30100.0, 31500.0)   # SVY21 metres
+    top = state.result().sort_values("H_score", ascending=False)
+    state.remove("supply", hid)
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+from ScoreDemo import SPARSE_CUTOFF, eval_points_xy, kernel, kernel_sum, reweight, xy_from_gdf
+
+LAYERS = ("supply", "mrt", "bus")
+
+
+class IncrementalScorer:
+    def __init__(
+        self, eval_units_gdf, demand_gdf, supply_gdf, mrt_gdf=None, bus_gdf=None,
+        *, pop_col="population", cap_col="capacity",
+        mrt_w_col=None, bus_w_col=None,
+        kernel_kind="exp",
+        lambda_D=700, lambda_S=700, lambda_C=700, lambda_M=900, lambda_B=500,
+        w_D=0.5, w_S=0.3, w_A=0.2, beta_MRT=1.0, beta_BUS=1.0,
+        engine="sparse", cutoff=None, max_bytes=None, workers=None,
+    ):
+        self.eval_units = eval_units_gdf
+        self.kernel_kind = kernel_kind
+        self.lambda_C = lambda_C
+        self.lam = {"supply": lambda_S, "mrt": lambda_M, "bus": lambda_B}
+        self.weights = dict(w_D=w_D, w_S=w_S, w_A=w_A, beta_MRT=beta_MRT, beta_BUS=beta_BUS)
+        self.engine = engine
+        self.cutoff = cutoff or SPARSE_CUTOFF["exp" if kernel_kind == "exp" else "gauss"]
+        engine_kw = dict(engine=engine, cutoff=cutoff, max_bytes=max_bytes, workers=workers)
+
+        self.XY_i = eval_points_xy(eval_units_gdf)
+        self.XY_u = xy_from_gdf(demand_gdf)
+        self.P_u = demand_gdf[pop_col].to_numpy(float)
+        self._tree_i = cKDTree(self.XY_i)
+
+        self.Dem = kernel_sum(self.XY_u, self.P_u, self.XY_i, lambda_D, kernel_kind, **engine_kw)
+
+        # layer -> {point id: (x, y, effective kernel weight, base weight)};
+        # for supply the base weight is the capacity and the effective one
+        # the competition-adjusted C_j / denom_j.
+        self.points = {layer: {} for layer in LAYERS}
+        self.raw = {}
+        sources = {
+            "supply": (supply_gdf, cap_col),
+            "mrt": (mrt_gdf, mrt_w_col),
+            "bus": (bus_gdf, bus_w_col),
+        }
+        for layer, (gdf, w_col) in sources.items():
+            if gdf is None or not len(gdf):
+                self.raw[layer] = np.zeros(len(self.XY_i))
+                continue
+            XY = xy_from_gdf(gdf)
+            base = gdf[w_col].to_numpy(float) if w_col and w_col in gdf.columns else np.ones(len(gdf))
+            w = base
+            if layer == "supply":
+                denom = kernel_sum(self.XY_u, self.P_u, XY, lambda_C, kernel_kind,
+                                   **dict(engine_kw, engine="dense", cutoff=None))  # exact, as compute_components
+                w = base / np.where(denom <= 0, 1.0, denom)
+            self.raw[layer] = kernel_sum(XY, w, self.XY_i, self.lam[layer], kernel_kind, **engine_kw)
+            self.points[layer] = {k: (x, y, we, b) for k, (x, y, we, b) in enumerate(zip(XY[:, 0], XY[:, 1], w, base))}
+        self._next_id = {layer: len(self.points[layer]) for layer in LAYERS}
+
+    @classmethod
+    def from_layers(cls, layers, **params):
+        """Build from ScoreDemo.load_layers() output."""
+        return cls(layers["subzones"], layers["demand"], layers["hawker"],
+                   layers.get("mrt"), layers.get("bus"), **params)
+
+    # ---------- deltas ----------
+    def add(self, layer, x, y, weight=1.0, point_id=None):
+        """Add a point (SVY21 metres); weight is the capacity for supply. Returns its id."""
+        self._check_layer(layer)
+        if point_id is None:
+            point_id = self._next_id[layer]
+            self._next_id[layer] += 1
+        elif point_id in self.points[layer]:
+            raise KeyError(f"{layer} point {point_id} already exists")
+        w = weight / self._denom(x, y) if layer == "supply" else weight
+        self.points[layer][point_id] = (x, y, w, weight)
+        self._apply(layer, x, y, w)
+        return point_id
+
+    def remove(self, layer, point_id):
+        self._check_layer(layer)
+        x, y, w, _ = self.points[layer].pop(point_id)
+        self._apply(layer, x, y, -w)
+
+    def move(self, layer, point_id, x, y):
+        self._check_layer(layer)
+        base = self.points[layer][point_id][3]
+        self.remove(layer, point_id)
+        self.add(layer, x, y, base, point_id=point_id)
+
+    def _check_layer(self, layer):
+        if layer not in LAYERS:
+            raise ValueError(f"unknown layer: {layer!r} (expected one of {LAYERS})")
+
+    def _near(self, tree, XY, x, y, lam):
+        # the dense engine's sums are untruncated, so its deltas are too
+        if self.engine == "dense":
+            idx = np.arange(len(XY))
+        else:
+            idx = np.asarray(tree.query_ball_point([x, y], self.cutoff * lam), dtype=np.intp)
+        d = np.hypot(XY[idx, 0] - x, XY[idx, 1] - y)
+        return idx, kernel(d, lam, kind=self.kernel_kind)
+
+    def _denom(self, x, y):
+        # over every demand point: the 2SFCA denominators are never truncated
+        k = kernel(np.hypot(self.XY_u[:, 0] - x, self.XY_u[:, 1] - y), self.lambda_C, kind=self.kernel_kind)
+        denom = float((self.P_u * k).sum())
+        return denom if denom > 0 else 1.0
+
+    def _apply(self, layer, x, y, w):
+        idx, k = self._near(self._tree_i, self.XY_i, x, y, self.lam[layer])
+        self.raw[layer][idx] += w * k
+
+    # ---------- scores ----------
+    def set_weights(self, **weights):
+        """Update any of w_D, w_S, w_A, beta_MRT, beta_BUS."""
+        unknown = set(weights) - set(self.weights)
+        if unknown:
+            raise TypeError(f"unknown weights: {sorted(unknown)}")
+        self.weights.update(weights)
+
+    def scores(self):
+        cube = {"Dem": self.Dem, "Sup": self.raw["supply"].copy(),
+                "Acc_MRT": self.raw["mrt"], "Acc_BUS": self.raw["bus"]}
+        return reweight(cube, **self.weights)
+
+    def result(self):
+        """Same columns as compute_hawker_opportunity, for the current state."""
+        out = self.eval_units.copy()
+        for col, val in self.scores().items():
+            out[col] = val
+        return out
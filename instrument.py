@@ -0,0 +1,208 @@
+"""Opt-in stage instrumentation for the scoring pipeline and the backend.
+
+    from instrument import span
+
+    with span("load.subzones.to_crs", rows=len(gdf)):
+        gdf = gdf.to_crs(TARGET_CRS)
+
+Each span records wall and CPU (thread) time and, with memory tracing on,
+bytes allocated (net) and the peak above its start; keyword attributes such
+as array shapes are kept with the span. Spans nest per thread and asyncio task; a child's
+name is reported under its own name, its parent is kept in the record.
+
+Off by default: span() then returns a shared no-op context manager, so an
+instrumented call costs one function call and a global lookup. Turn it on
+with enable() or the HAWKER_PROFILE environment variable:
+
+    HAWKER_PROFILE=1              aggregate + log each span (logger "hawker.profile")
+    HAWKER_PROFILE=report.json    same, and write report() there at exit (main process only)
+    HAWKER_PROFILE_MEMORY=1       also trace allocations (tracemalloc; slow)
+
+report() is a JSON-ready dict (per-name aggregates and the most recent
+spans); prometheus_text() renders the aggregates in Prometheus text format.
+"""
+import atexit, json, logging, multiprocessing, os, threading, time, tracemalloc
+from contextvars import ContextVar
+from collections import deque
+
+log = logging.getLogger("hawker.profile")
+
+RECENT = 1000  # span records kept for report()
+
+_enabled = False
+_memory = False
+_lock = threading.Lock()
+_current = ContextVar("hawker_span", default=None)  # innermost open span (per thread / asyncio task)
+_stats = {}  # name -> {"calls", "wall_s", "cpu_s", "max_wall_s", "alloc_bytes", "max_peak_bytes"}
+_recent = deque(maxlen=RECENT)
+
+
+class _Noop:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _Noop()
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "parent", "token", "t0", "c0", "m0", "peak")
+
+    def __init__(self, name, attrs):
+        self.name, self.attrs = name, attrs
+
+    def set(self, **attrs):
+        """Attach attributes known only inside the span (e.g. result shapes)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = _current.get()
+        if _memory and tracemalloc.is_tracing():
+            cur, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, peak)
+            tracemalloc.reset_peak()
+            self.m0, self.peak = cur, cur
+        else:
+            self.m0 = None
+        self.token = _current.set(self)
+        self.c0 = time.thread_time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        wall = time.perf_counter() - self.t0
+        cpu = time.thread_time() - self.c0
+        _current.reset(self.token)
+        rec = {"name": self.name, "parent": self.parent.name if self.parent else None,
+               "wall_s": wall, "cpu_s": cpu, **self.attrs}
+        if exc_type is not None:
+            rec["error"] = exc_type.__name__
+        alloc = peak = 0
+        if self.m0 is not None and tracemalloc.is_tracing():
+            cur, pk = tracemalloc.get_traced_memory()
+            self.peak = max(self.peak, pk)
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, self.peak)
+            alloc, peak = cur - self.m0, self.peak - self.m0
+            rec["alloc_bytes"], rec["peak_bytes"] = alloc, peak
+        _record(self.name, wall, cpu, alloc, peak, rec)
+        return False
+
+
+def _record(name, wall, cpu, alloc, peak, rec):
+    with _lock:
+        st = _stats.get(name)
+        if st is None:
+            st = _stats[name] = {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_wall_s": 0.0,
+                                 "alloc_bytes": 0, "max_peak_bytes": 0}
+        st["calls"] += 1
+        st["wall_s"] += wall
+        st["cpu_s"] += cpu
+        st["max_wall_s"] = max(st["max_wall_s"], wall)
+        st["alloc_bytes"] += alloc
+        st["max_peak_bytes"] = max(st["max_peak_bytes"], peak)
+        _recent.append(rec)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(json.dumps(rec, default=str))
+
+
+def span(name, **attrs):
+    """Context manager timing one stage; a no-op unless instrumentation is enabled."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def enabled():
+    return _enabled
+
+
+def enable(memory=False):
+    """Start recording spans; memory=True also traces allocations."""
+    global _enabled, _memory
+    _enabled, _memory = True, memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _recent.clear()
+
+
+def report():
+    """{"enabled", "memory", "spans": {name: aggregates}, "recent": [records]}."""
+    with _lock:
+        return {"enabled": _enabled, "memory": _memory,
+                "spans": {k: dict(v) for k, v in _stats.items()}, "recent": list(_recent)}
+
+
+def write_report(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report(), f, indent=2, default=str)
+
+
+def merge(other):
+    """Add the aggregates of another process's report() (e.g. a worker) to ours."""
+    with _lock:
+        for name, o in other.get("spans", {}).items():
+            st = _stats.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_wall_s": 0.0,
+                                          "alloc_bytes": 0, "max_peak_bytes": 0})
+            for k in ("calls", "wall_s", "cpu_s", "alloc_bytes"):
+                st[k] += o.get(k, 0)
+            st["max_wall_s"] = max(st["max_wall_s"], o.get("max_wall_s", 0.0))
+            st["max_peak_bytes"] = max(st["max_peak_bytes"], o.get("max_peak_bytes", 0))
+
+
+_PROM = (
+    ("calls", "hawker_span_calls_total", "counter", "Completed spans."),
+    ("wall_s", "hawker_span_seconds_total", "counter", "Wall-clock seconds spent in spans."),
+    ("cpu_s", "hawker_span_cpu_seconds_total", "counter", "Thread CPU seconds spent in spans."),
+    ("max_wall_s", "hawker_span_max_seconds", "gauge", "Slowest single span."),
+    ("alloc_bytes", "hawker_span_alloc_bytes_total", "counter", "Net bytes allocated in spans (memory tracing)."),
+    ("max_peak_bytes", "hawker_span_peak_bytes", "gauge", "Largest allocation peak of a single span (memory tracing)."),
+)
+
+
+def _label(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def prometheus_text():
+    """Aggregates in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        stats = {k: dict(v) for k, v in _stats.items()}
+    lines = ["# HELP hawker_profile_enabled Whether span instrumentation is on.",
+             "# TYPE hawker_profile_enabled gauge", f"hawker_profile_enabled {int(_enabled)}"]
+    for key, metric, kind, help_ in _PROM:
+        lines += [f"# HELP {metric} {help_}", f"# TYPE {metric} {kind}"]
+        lines += [f'{metric}{{span="{_label(name)}"}} {st[key]}' for name, st in sorted(stats.items())]
+    return "\n".join(lines) + "\n"
+
+
+def _from_env():
+    value = os.environ.get("HAWKER_PROFILE", "")
+    if value in ("", "0"):
+        return
+    enable(memory=os.environ.get("HAWKER_PROFILE_MEMORY", "") not in ("", "0"))
+    # worker processes inherit the variable; their spans go back to the parent via merge()
+    if value.endswith(".json") and multiprocessing.parent_process() is None:
+        atexit.register(write_report, value)
+
+
+_from_env()
@@ -0,0 +1,194 @@
+"""Columnar on-disk cache of parsed input layers.
+
+Parsing the raw GeoJSON/CSV inputs (HTML Description tables, reprojection,
+population cleaning) dominates cold start. cached_layer() runs the parser once
+and stores the resulting (Geo)DataFrame column by column under
+<cache_dir>/<name>/:
+
+    meta.json              column kinds, CRS, source fingerprints
+    <col>.npy              numeric/bool columns, memory-mapped on load
+    <col>.bytes.npy        strings (utf-8) and geometries (WKB) packed into
+    <col>.offsets.npy      one uint8 buffer with int64 offsets and a null
+    <col>.null.npy         mask, also memory-mapped
+    <col>.npy + .null.npy  nullable (Int64/Float64/boolean) columns: values
+                           with NA filled by 0, plus the NA mask
+
+A layer is rebuilt when any source file's size/mtime changed and its sha1 no
+longer matches, or when the caller bumps `version`.
+"""
+import hashlib, json, os, shutil
+import numpy as np
+import pandas as pd
+
+from instrument import span
+
+# anchored to the repo root, like ScoreDemo.CONTENT, so every working directory shares one cache
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content", "cache", "layers")
+FORMAT = 2  # bump when the on-disk layout changes
+
+
+def _fingerprint(path, with_hash=True):
+    st = os.stat(path)
+    fp = {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if with_hash:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        fp["sha1"] = h.hexdigest()
+    return fp
+
+
+def _is_fresh(meta, sources, version):
+    """True if meta still describes sources; refreshes mtimes of touched files."""
+    if meta.get("format") != FORMAT or meta.get("version") != version:
+        return False
+    old = meta.get("sources", [])
+    if [o["path"] for o in old] != [os.path.abspath(p) for p in sources]:
+        return False
+    for o, p in zip(old, sources):
+        cur = _fingerprint(p, with_hash=False)
+        if (cur["size"], cur["mtime_ns"]) == (o["size"], o["mtime_ns"]):
+            continue
+        # touched (checkout, copy) but maybe unchanged: fall back to the hash
+        if cur["size"] != o["size"] or _fingerprint(p)["sha1"] != o["sha1"]:
+            return False
+        o["mtime_ns"] = cur["mtime_ns"]
+    return True
+
+
+def _write_varlen(d, col, items):
+    null = np.array([v is None for v in items], dtype=bool)
+    lens = np.array([0 if v is None else len(v) for v in items], dtype=np.int64)
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    np.cumsum(lens, out=offsets[1:])
+    buf = np.frombuffer(b"".join(v for v in items if v is not None), dtype=np.uint8)
+    np.save(os.path.join(d, f"{col}.bytes.npy"), buf)
+    np.save(os.path.join(d, f"{col}.offsets.npy"), offsets)
+    np.save(os.path.join(d, f"{col}.null.npy"), null)
+
+
+def _read_varlen(d, col):
+    # one read of the mapped buffer, then plain bytes slicing per value
+    buf = np.load(os.path.join(d, f"{col}.bytes.npy"), mmap_mode="r").tobytes()
+    offsets = np.load(os.path.join(d, f"{col}.offsets.npy")).tolist()
+    null = np.load(os.path.join(d, f"{col}.null.npy")).tolist()
+    return [None if n else buf[a:b] for a, b, n in zip(offsets[:-1], offsets[1:], null)]
+
+
+def _is_geometry_column(s):
+    import shapely
+    vals = s.to_numpy()
+    vals = vals[pd.notna(vals)] if s.dtype == object else vals
+    return s.dtype == object and len(vals) > 0 and bool(shapely.is_geometry(vals).all())
+
+
+def write_layer(df, path, sources=(), version=0):
+    """Store df (DataFrame or GeoDataFrame) as a columnar layer directory."""
+    import shapely
+    tmp = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    geom_col = getattr(df, "_geometry_column_name", None)
+    columns = []
+    for i, col in enumerate(df.columns):
+        fname = f"c{i}"
+        s = df[col]
+        if col == geom_col or _is_geometry_column(s):
+            kind = "geometry"
+            _write_varlen(tmp, fname, [None if g is None else shapely.to_wkb(g) for g in s.array])
+        elif isinstance(s.dtype, pd.api.extensions.ExtensionDtype) and s.dtype.kind in "biuf":
+            # to_numpy() would give an object array (pickled, not mappable)
+            kind = "nullable"
+            np.save(os.path.join(tmp, f"{fname}.npy"), s.to_numpy(dtype=s.dtype.numpy_dtype, na_value=0))
+            np.save(os.path.join(tmp, f"{fname}.null.npy"), s.isna().to_numpy())
+        elif s.dtype.kind in "biuf":
+            kind = "numeric"
+            np.save(os.path.join(tmp, f"{fname}.npy"), s.to_numpy())
+        else:
+            kind = "string"
+            _write_varlen(tmp, fname, [None if pd.isna(v) else str(v).encode("utf-8") for v in s])
+        columns.append({"name": col, "file": fname, "kind": kind, "dtype": str(s.dtype)})
+    meta = {
+        "format": FORMAT,
+        "version": version,
+        "sources": [_fingerprint(p) for p in sources],
+        "columns": columns,
+        "geometry": geom_col,
+        "crs": df.crs.to_string() if geom_col and df.crs is not None else None,
+        "rows": len(df),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+def read_layer(path):
+    """Load a layer written by write_layer; numeric columns stay memory-mapped."""
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    data = {}
+    for c in meta["columns"]:
+        if c["kind"] == "numeric":
+            data[c["name"]] = np.load(os.path.join(path, f"{c['file']}.npy"), mmap_mode="r")
+        elif c["kind"] == "nullable":
+            arr = pd.array(np.load(os.path.join(path, f"{c['file']}.npy")), dtype=c["dtype"])
+            arr[np.load(os.path.join(path, f"{c['file']}.null.npy"))] = pd.NA
+            data[c["name"]] = arr
+        elif c["kind"] == "geometry":
+            import shapely
+            data[c["name"]] = shapely.from_wkb(np.array(_read_varlen(path, c["file"]), dtype=object))
+        else:
+            data[c["name"]] = [None if v is None else v.decode("utf-8") for v in _read_varlen(path, c["file"])]
+    df = pd.DataFrame(data, index=pd.RangeIndex(meta["rows"]))
+    if meta["geometry"]:  # was a GeoDataFrame
+        import geopandas as gpd
+        df = gpd.GeoDataFrame(df, geometry=meta["geometry"], crs=meta["crs"])
+    return df
+
+
+def sources_digest(names, cache_dir=CACHE_DIR):
+    """sha1 over the source hashes and versions recorded for the cached layers names.
+
+    Changes whenever any of their input files does (once the layer has been
+    rebuilt); a layer that is not cached contributes a fixed marker.
+    """
+    h = hashlib.sha1()
+    for name in names:
+        try:
+            with open(os.path.join(cache_dir, name, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            h.update(json.dumps([name, meta["version"], [o["sha1"] for o in meta["sources"]]]).encode())
+        except (OSError, ValueError, KeyError):
+            h.update(json.dumps([name, None]).encode())
+    return h.hexdigest()
+
+
+def cached_layer(name, sources, build, cache_dir=CACHE_DIR, version=0):
+    """Return build() from the cache at <cache_dir>/<name>, rebuilding when stale.
+
+    sources are the input files build() reads; cache_dir=None disables caching.
+    """
+    if cache_dir is None:
+        return build()
+    path = os.path.join(cache_dir, name)
+    meta_path = os.path.join(path, "meta.json")
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        stamps = [o["mtime_ns"] for o in meta["sources"]]
+        if _is_fresh(meta, sources, version):
+            if stamps != [o["mtime_ns"] for o in meta["sources"]]:
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+            with span("layer_cache.read", layer=name):
+                return read_layer(path)
+    except (OSError, ValueError, KeyError):
+        pass
+    with span("layer_cache.build", layer=name):
+        df = build()
+    os.makedirs(cache_dir, exist_ok=True)
+    with span("layer_cache.write", layer=name, rows=len(df)):
+        write_layer(df, path, sources, version)
+    return df
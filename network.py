@@ -0,0 +1,242 @@
+"""Walking (network) distances for the kernels and the nearest-MRT distance.
+
+Straight-line distance ignores expressways, rivers and rail corridors. Given
+a local pedestrian graph -- any line layer GDAL reads, e.g. the footway/path/
+street lines of an offline OSM extract (.gpkg, .geojson, .shp, or .osm.pbf
+with layer="lines") -- distances become shortest paths along the lines:
+
+    net = NetworkDistances(load_graph("content/walk_network.gpkg"), cache_dir="content/cache/network")
+    cube = compute_components(..., network=net)   # every kernel on walking distance
+    m = net.nearest(XY_mrt, XY_units)             # metres to the nearest MRT exit
+
+Lines are joined wherever they cross or share a vertex (crossings on
+different OSM layers, i.e. bridges and tunnels, only at shared vertices).
+Points are snapped to the nearest node of the graph's largest connected
+component; a distance is snap + path + snap, or the straight line when both
+ends snap to the same node. Many-to-many distances come from a multi-source
+Dijkstra bounded by `cutoff` metres (scipy.sparse.csgraph), run from the
+side with fewer distinct nodes in batches of at most max_bytes of output,
+and are kept as a sparse (dst, src) matrix of the pairs within the cutoff,
+cached on disk by graph and coordinates. A kernel sum over a matrix is one
+gather and one bincount over its pairs, so re-scoring with other lambdas or
+weights costs about what the Euclidean path does. As with the sparse engine,
+dropping the pairs beyond the cutoff under-estimates each sum by at most
+exp(-cutoff/lam) * sum(w) for kind="exp" (< 2e-6 * sum(w) at lam = 900 m).
+"""
+import os
+import numpy as np
+import shapely
+
+from ScoreDemo import TARGET_CRS, content_hash, kernel, read_projected
+from instrument import span
+
+CUTOFF = 12_000.0       # metres kept per matrix; 13 lambdas at the largest default lambda
+MAX_BYTES = 256 * 2**20  # Dijkstra output per batch (float64, sources x graph nodes)
+SNAP_DECIMALS = 2        # line vertices closer than 1 cm are one node
+GRAPH_VERSION = 2        # bump when graph_from_lines changes (invalidates cached graphs)
+# OSM highway classes nobody walks along
+NOT_WALKABLE = ("motorway", "motorway_link", "trunk", "trunk_link", "construction", "proposed",
+                "raceway", "bus_guideway")
+
+
+class Graph:
+    """Undirected pedestrian graph in TARGET_CRS metres (edges u < v, one per node pair)."""
+
+    def __init__(self, xy, u, v, length):
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+        from scipy.spatial import cKDTree
+        self.xy, self.u, self.v, self.length = xy, u, v, length
+        n = len(xy)
+        self.csr = coo_matrix((length, (u, v)), shape=(n, n)).tocsr()
+        _, label = connected_components(self.csr, directed=False)
+        self.main = np.flatnonzero(label == np.bincount(label).argmax())  # snap targets
+        self.tree = cKDTree(xy[self.main])
+        self.key = content_hash(xy, u, v, length)
+
+    def snap(self, XY):
+        """(node, off-network distance) for each point."""
+        d, i = self.tree.query(np.asarray(XY, float).reshape(-1, 2))
+        return self.main[i], d
+
+
+def graph_from_lines(lines, levels=None):
+    """Graph whose nodes are the line vertices and crossings and whose edges are the segments between them.
+
+    Lines are noded first, so two lines that cross (or touch) without sharing
+    a vertex are still joined. levels (e.g. the OSM "layer" tag) keeps a
+    bridge from being joined to what it passes over: only lines on the same
+    level are noded against each other; shared vertices join any levels.
+    """
+    parts, line = shapely.get_parts(np.asarray(lines, dtype=object), return_index=True)
+    level = np.zeros(len(parts), dtype=np.intp) if levels is None else \
+        np.unique(np.asarray(levels), return_inverse=True)[1].ravel()[line]
+    if len(parts):
+        parts = np.concatenate([shapely.get_parts(shapely.node(shapely.multilinestrings(parts[level == k])))
+                                for k in np.unique(level)])
+    coords, part = shapely.get_coordinates(parts, return_index=True)
+    nodes, node = np.unique(np.round(coords, SNAP_DECIMALS), axis=0, return_inverse=True)
+    node = node.ravel()
+    seg = part[1:] == part[:-1]
+    u, v = node[:-1][seg], node[1:][seg]
+    length = np.hypot(*(coords[1:] - coords[:-1])[seg].T)
+    u, v = np.minimum(u, v), np.maximum(u, v)
+    keep = u != v
+    u, v, length = u[keep], v[keep], length[keep]
+    # parallel segments between the same two nodes: keep the shortest
+    order = np.lexsort((length, v, u))
+    u, v, length = u[order], v[order], length[order]
+    first = np.ones(len(u), dtype=bool)
+    first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+    return Graph(nodes, u[first], v[first], length[first])
+
+
+def load_graph(path, layer=None, cache_dir=None):
+    """Graph from a line layer; with cache_dir the built graph is kept as graph_<key>.npz."""
+    st = os.stat(path)
+    key = content_hash(os.path.abspath(path), st.st_size, st.st_mtime_ns, layer, NOT_WALKABLE, SNAP_DECIMALS, GRAPH_VERSION)
+    cached = os.path.join(cache_dir, f"graph_{key}.npz") if cache_dir else None
+    if cached and os.path.exists(cached):
+        with np.load(cached) as z:
+            return Graph(z["xy"], z["u"], z["v"], z["length"])
+    lines = read_projected(path, "network", **({"layer": layer} if layer else {}))
+    if "highway" in lines.columns:
+        lines = lines[~lines["highway"].isin(NOT_WALKABLE)]
+    lines = lines[lines.geom_type.isin(["LineString", "MultiLineString"])]
+    # OSM "layer": bridges and tunnels only join other levels where they share a vertex
+    levels = lines["layer"].fillna("0").astype(str).to_numpy() if "layer" in lines.columns else None
+    with span("network.graph", lines=len(lines)):
+        graph = graph_from_lines(lines.geometry.to_numpy(), levels)
+    if cached:
+        _save(cached, xy=graph.xy, u=graph.u, v=graph.v, length=graph.length)
+    return graph
+
+
+def _save(path, **arrays):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+class DistanceMatrix:
+    """Sparse (dst, src) distances in CSR layout, sources ascending within each destination."""
+
+    def __init__(self, indptr, indices, dist, shape):
+        self.indptr, self.indices, self.dist, self.shape = indptr, indices, dist, tuple(shape)
+        self.row = np.repeat(np.arange(self.shape[0]), np.diff(indptr))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z["indptr"], z["indices"], z["dist"], z["shape"])
+
+    def save(self, path):
+        _save(path, indptr=self.indptr, indices=self.indices, dist=self.dist, shape=np.asarray(self.shape))
+
+    def kernel_sum(self, w_src, lam, kind="exp"):
+        """sum_s w_s * K(d(s, d) / lam) over the stored pairs, for every destination d."""
+        contrib = np.asarray(w_src, float)[self.indices] * kernel(self.dist, lam, kind=kind)
+        return np.bincount(self.row, weights=contrib, minlength=self.shape[0])
+
+
+def distance_matrix(graph, XY_src, XY_dst, cutoff=CUTOFF, max_bytes=MAX_BYTES):
+    """Walking distances between every source and destination within cutoff metres."""
+    from scipy.sparse.csgraph import dijkstra
+    XY_src, XY_dst = np.asarray(XY_src, float).reshape(-1, 2), np.asarray(XY_dst, float).reshape(-1, 2)
+    n_src, n_dst = len(XY_src), len(XY_dst)
+    ns, off_s = graph.snap(XY_src)
+    nd, off_d = graph.snap(XY_dst)
+    # the graph is undirected: search from the side with fewer distinct nodes
+    flip = len(np.unique(nd)) < len(np.unique(ns))
+    (na, off_a, XY_a), (nb, off_b, XY_b) = ((nd, off_d, XY_dst), (ns, off_s, XY_src)) if flip else \
+        ((ns, off_s, XY_src), (nd, off_d, XY_dst))
+    roots, root_of = np.unique(na, return_inverse=True)
+    batch = max(1, int(max_bytes // (8 * len(graph.xy))))
+    ia, ib, dist = [], [], []
+    for lo in range(0, len(roots), batch):
+        D = dijkstra(graph.csr, directed=False, indices=roots[lo:lo + batch], limit=cutoff)[:, nb]
+        a = np.flatnonzero((root_of >= lo) & (root_of < lo + batch))
+        d = D[root_of[a] - lo] + off_a[a, None] + off_b[None, :]
+        r, c = np.nonzero(na[a, None] == nb[None, :])
+        d[r, c] = np.hypot(*(XY_a[a[r]] - XY_b[c]).T)
+        r, c = np.nonzero(d <= cutoff)
+        ia.append(a[r])
+        ib.append(c)
+        dist.append(d[r, c])
+    ia, ib, dist = (np.concatenate(x) if x else np.zeros(0) for x in (ia, ib, dist))
+    i_src, i_dst = (ib, ia) if flip else (ia, ib)
+    order = np.lexsort((i_src, i_dst))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(i_dst.astype(np.intp), minlength=n_dst))])
+    return DistanceMatrix(indptr, i_src[order].astype(np.intp), dist[order], (n_dst, n_src))
+
+
+class NetworkDistances:
+    """Distance matrices over one graph, memoised per (sources, destinations) and on disk.
+
+    Pass as compute_components(network=...): it stands in for the distance
+    engine of every kernel.
+    """
+
+    def __init__(self, graph, cutoff=CUTOFF, cache_dir=None, max_bytes=MAX_BYTES):
+        self.graph, self.cutoff, self.cache_dir, self.max_bytes = graph, cutoff, cache_dir, max_bytes
+        self._matrices = {}
+
+    def matrix(self, XY_src, XY_dst):
+        XY_src, XY_dst = np.asarray(XY_src, float), np.asarray(XY_dst, float)
+        key = content_hash(self.graph.key, XY_src, XY_dst, float(self.cutoff))
+        m = self._matrices.get(key)
+        if m is None:
+            path = os.path.join(self.cache_dir, f"dist_{key}.npz") if self.cache_dir else None
+            if path and os.path.exists(path):
+                m = DistanceMatrix.load(path)
+            else:
+                with span("network.dijkstra", src=XY_src.shape, dst=XY_dst.shape):
+                    m = distance_matrix(self.graph, XY_src, XY_dst, self.cutoff, self.max_bytes)
+                if path:
+                    m.save(path)
+            self._matrices[key] = m
+        return m
+
+    def kernel_sum(self, XY_src, w_src, XY_dst, lam, kind="exp"):
+        return self.matrix(XY_src, XY_dst).kernel_sum(w_src, lam, kind)
+
+    def nearest(self, XY_src, XY_dst):
+        """Walking distance (m) from each destination to its nearest source; inf if unreachable.
+
+        One Dijkstra from a virtual node joined to every source node by its
+        snap distance, so no cutoff applies.
+        """
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import dijkstra
+        XY_src, XY_dst = np.asarray(XY_src, float).reshape(-1, 2), np.asarray(XY_dst, float).reshape(-1, 2)
+        out = np.full(len(XY_dst), np.inf)
+        if not len(XY_src) or not len(XY_dst):
+            return out
+        g = self.graph
+        n = len(g.xy)
+        ns, off_s = g.snap(XY_src)
+        nd, off_d = g.snap(XY_dst)
+        # one virtual edge per source node, from its closest source (coo -> csr would sum duplicates)
+        order = np.lexsort((off_s, ns))
+        first = np.ones(len(ns), dtype=bool)
+        first[1:] = ns[order][1:] != ns[order][:-1]
+        keep = order[first]
+        u = np.concatenate([g.u, np.full(len(keep), n)])
+        v = np.concatenate([g.v, ns[keep]])
+        w = np.concatenate([g.length, np.maximum(off_s[keep], 1e-9)])  # csgraph edges need a non-zero weight
+        csr = coo_matrix((w, (u, v)), shape=(n + 1, n + 1)).tocsr()
+        with span("network.nearest", src=len(ns), dst=len(nd)):
+            out = dijkstra(csr, directed=False, indices=n)[nd] + off_d
+        for i in np.flatnonzero(np.isin(nd, ns)):
+            out[i] = min(out[i], np.hypot(*(XY_src[ns == nd[i]] - XY_dst[i]).T).min())
+        return out
+
+
+def xy_from_lonlat(lon, lat):
+    """WGS84 lon/lat arrays as an (n, 2) TARGET_CRS array."""
+    from pyproj import Transformer
+    x, y = Transformer.from_crs(4326, TARGET_CRS, always_xy=True).transform(np.asarray(lon, float),
+                                                                           np.asarray(lat, float))
+    return np.column_stack([x, y])
@@ -0,0 +1,82 @@
+"""Compare two scoring results unit by unit.
+
+    d = diff_scores(before, after)            # DataFrames with SUBZONE_N + score columns
+    up, down = top_movers(d, 10)
+    summary(d)
+
+Rows are matched on the key column (SUBZONE_N by default) with one outer
+join; everything after that is column arithmetic. For every score column
+present in both results the diff has <col>_a, <col>_b and <col>_delta
+(b - a). Ranks are by H_score, best first, within each result (ties keep
+file order, as in the served dataset), and rank_change = rank_a - rank_b,
+so a positive change means the unit moved up. Units present in only one
+result have status "added" or "removed" and no deltas.
+"""
+import numpy as np
+import pandas as pd
+
+SCORE_COLUMNS = ("Dem", "Sup", "Acc", "Z_Dem", "Z_Sup", "Z_Acc", "H_score")
+KEY = "SUBZONE_N"
+RANK_BY = "H_score"
+
+
+def rank(scores):
+    """1-based rank, highest first; NaN ranks last, ties by position."""
+    s = np.asarray(scores, float)
+    out = np.empty(len(s), dtype=np.int64)
+    out[np.argsort(-np.nan_to_num(s, nan=-np.inf), kind="stable")] = np.arange(1, len(s) + 1)
+    return out
+
+
+def diff_scores(a, b, *, key=KEY, columns=None, rank_by=RANK_BY):
+    """Per-unit deltas and rank changes between results a and b (see module docstring)."""
+    a, b = pd.DataFrame(a), pd.DataFrame(b)
+    if columns is None:
+        columns = [c for c in SCORE_COLUMNS if c in a.columns and c in b.columns]
+    cols = [c for c in dict.fromkeys([*columns, rank_by]) if c in a.columns and c in b.columns]
+    a = a[[key, *cols]].drop_duplicates(key)
+    b = b[[key, *cols]].drop_duplicates(key)
+    if rank_by in cols:
+        a = a.assign(rank=rank(a[rank_by]))
+        b = b.assign(rank=rank(b[rank_by]))
+    d = a.merge(b, on=key, how="outer", suffixes=("_a", "_b"), indicator=True, sort=True)
+    d["status"] = d.pop("_merge").map({"both": "common", "left_only": "removed", "right_only": "added"}).astype(str)
+    for c in cols:
+        d[f"{c}_delta"] = d[f"{c}_b"].astype(float) - d[f"{c}_a"].astype(float)
+    if rank_by in cols:
+        d[["rank_a", "rank_b"]] = d[["rank_a", "rank_b"]].astype("Int64")  # NA for added/removed
+        d["rank_change"] = d["rank_a"] - d["rank_b"]
+    return d
+
+
+def top_movers(d, n=10):
+    """(n units that moved up most, n that moved down most) among the common ones."""
+    common = d[d["status"] == "common"]
+    up = common[common["rank_change"] > 0].sort_values(["rank_change", "rank_b"], ascending=[False, True])
+    down = common[common["rank_change"] < 0].sort_values(["rank_change", "rank_b"], ascending=[True, True])
+    return up.head(n), down.head(n)
+
+
+def summary(d, top_k=20):
+    """Counts and rank agreement (spearman, top-k overlap) over the common units."""
+    common = d[d["status"] == "common"]
+    n = len(common)
+    out = {
+        "common": n,
+        "added": int((d["status"] == "added").sum()),
+        "removed": int((d["status"] == "removed").sum()),
+    }
+    if "rank_change" in d and n:
+        # re-rank within the common units so added/removed ones do not shift everyone
+        ra, rb = rank(-common["rank_a"].to_numpy(float)), rank(-common["rank_b"].to_numpy(float))
+        diff = (ra - rb).astype(float)
+        k = min(top_k, n)
+        out.update({
+            "moved": int((common["rank_change"] != 0).sum()),
+            "mean_abs_rank_change": float(common["rank_change"].abs().mean()),
+            "max_abs_rank_change": int(common["rank_change"].abs().max()),
+            "spearman": 1 - 6 * float(diff @ diff) / (n * (n * n - 1)) if n > 1 else 1.0,
+            "top_k": k,
+            "top_k_overlap": len(set(np.flatnonzero(ra <= k)) & set(np.flatnonzero(rb <= k))) / k,
+        })
+    return out
@@ -5,8 +5,14 @@ import json, math
 from pathlib import Path
 import pandas as pd
 import numpy as np
-from bs4 import BeautifulSoup
-from shapely.geometry import shape, Point, mapping
+import shapely
+from shapely.geometry import shape
+
+import instrument
+from desc_table import parse_desc_table
+from geojson_writer import PRECISION, write_geojson
+from instrument import span
+from layer_cache import CACHE_DIR as LAYER_CACHE_DIR, cached_layer
 
 # ---------- Path handling (relative to this file) ----------
 BASE = "content/"
@@ -15,6 +21,7 @@ DEF_MP   = BASE + "MasterPlan2019SubzoneBoundaryNoSeaGEOJSON.geojson"
 DEF_POP  = BASE + "ResidentPopulationbyPlanningAreaSubzoneofResidenceAgeGroupandSexCensusofPopulation2020.csv"
 DEF_HAWK = BASE + "HawkerCentresGEOJSON.geojson"
 DEF_MRT  = BASE + "LTAMRTStationExitGEOJSON.geojson"
+DEF_BUS  = BASE + "bus_stops.geojson"
 DEF_OUT  = BASE + "hawker_oppertunities.geojson"   # keep user's spelling
 
 def _assert_exists(p: Path, label: str):
@@ -30,6 +37,63 @@ def haversine_km(lat1, lon1, lat2, lon2):
     a = math.sin(dphi/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dlmb/2)**2
     return 2*R*math.asin(math.sqrt(a))
 
+def count_points_in(geoms, lon, lat) -> np.ndarray:
+    """Points with geom.contains(pt) per geometry (NaN where geom is None).
+
+    One STRtree query over the points with the polygons as (prepared) inputs
+    instead of a polygon x point loop.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    counts = np.full(len(geoms), np.nan)
+    valid = np.array([g is not None for g in geoms], dtype=bool)
+    counts[valid] = 0
+    if len(lon) and valid.any():
+        tree = shapely.STRtree(shapely.points(np.asarray(lon, float), np.asarray(lat, float)))
+        poly_idx, _ = tree.query(geoms[valid], predicate="contains")
+        counts[valid] = np.bincount(poly_idx, minlength=int(valid.sum()))
+    return counts.astype(np.int64) if valid.all() else counts
+
+def nearest_km(lat, lon, pts_lat, pts_lon, block=2048) -> np.ndarray:
+    """Haversine distance (km) from each (lat, lon) to the nearest of pts_*.
+
+    The nearest point is picked with a vectorised haversine over blocks of
+    query points; the reported distance is recomputed with haversine_km so
+    values match the scalar implementation exactly.
+    """
+    lat = np.asarray(lat, float)
+    lon = np.asarray(lon, float)
+    out = np.full(len(lat), np.nan)
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    if not len(pts_lat) or not ok.any():
+        return out
+    pts_lat = np.asarray(pts_lat, float)
+    pts_lon = np.asarray(pts_lon, float)
+    p2 = np.radians(pts_lat)[None, :]
+    l2 = np.radians(pts_lon)[None, :]
+    q = np.flatnonzero(ok)
+    for lo in range(0, len(q), block):
+        qi = q[lo:lo + block]
+        p1 = np.radians(lat[qi])[:, None]
+        l1 = np.radians(lon[qi])[:, None]
+        # haversine is monotonic in a, so the argmin of a is the nearest point
+        a = np.sin((p2 - p1) / 2)**2 + np.cos(p1) * np.cos(p2) * np.sin((l2 - l1) / 2)**2
+        best = a.argmin(axis=1)
+        out[qi] = [haversine_km(lat[i], lon[i], pts_lat[j], pts_lon[j]) for i, j in zip(qi, best)]
+    return out
+
+def network_nearest_km(network, lat, lon, pts_lat, pts_lon) -> np.ndarray:
+    """nearest_km along the walking network (NaN where unreachable)."""
+    from network import xy_from_lonlat
+    lat = np.asarray(lat, float)
+    lon = np.asarray(lon, float)
+    out = np.full(len(lat), np.nan)
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    if not len(pts_lat) or not ok.any():
+        return out
+    m = network.nearest(xy_from_lonlat(pts_lon, pts_lat), xy_from_lonlat(lon[ok], lat[ok]))
+    out[ok] = np.where(np.isfinite(m), m / 1000, np.nan)
+    return out
+
 def zscore(series: pd.Series):
     s = pd.to_numeric(series, errors="coerce")
     mu, sd = s.mean(), s.std(ddof=0)
@@ -37,47 +101,39 @@ def zscore(series: pd.Series):
         return pd.Series(np.zeros(len(s)), index=series.index, dtype=float)
     return (s - mu)/sd
 
-def _parse_desc_table(html: str) -> dict:
-    soup = BeautifulSoup(html or "", "html.parser")
-    kv = {}
-    for tr in soup.find_all("tr"):
-        ths = tr.find_all("th")
-        tds = tr.find_all("td")
-        if len(ths) == 1 and len(tds) == 1:
-            kv[ths[0].get_text(strip=True)] = tds[0].get_text(strip=True)
-    return kv
-
 # ---------- Loaders ----------
 def load_masterplan(mp_path: Path) -> pd.DataFrame:
     _assert_exists(mp_path, "MasterPlan file")
-    gj = json.loads(mp_path.read_text(encoding="utf-8"))
+    with span("load.masterplan.read"):
+        gj = json.loads(mp_path.read_text(encoding="utf-8"))
     rows = []
-    for feat in gj.get("features", []):
-        props = feat.get("properties", {}) or {}
-        geom  = feat.get("geometry")
-        name  = props.get("Name")
-        info  = _parse_desc_table(props.get("Description", ""))
-        subzone = (info.get("SUBZONE_N") or "").upper().strip()
-        plan    = (info.get("PLN_AREA_N") or "").upper().strip()
-
-        geom_obj = None
-        lat = lon = None
-        try:
-            if geom:
-                geom_obj = shape(geom)
-                c = geom_obj.centroid
-                lat, lon = float(c.y), float(c.x)
-        except Exception:
+    with span("load.masterplan.parse", rows=len(gj.get("features", []))):
+        for feat in gj.get("features", []):
+            props = feat.get("properties", {}) or {}
+            geom  = feat.get("geometry")
+            name  = props.get("Name")
+            info  = parse_desc_table(props.get("Description", ""), ("SUBZONE_N", "PLN_AREA_N"))
+            subzone = (info.get("SUBZONE_N") or "").upper().strip()
+            plan    = (info.get("PLN_AREA_N") or "").upper().strip()
+
             geom_obj = None
+            lat = lon = None
+            try:
+                if geom:
+                    geom_obj = shape(geom)
+                    c = geom_obj.centroid
+                    lat, lon = float(c.y), float(c.x)
+            except Exception:
+                geom_obj = None
 
-        rows.append({
-            "Name": name,
-            "SUBZONE_N": subzone,
-            "PLN_AREA_N": plan,
-            "geometry": geom_obj,
-            "centroid_lat": lat,
-            "centroid_lon": lon,
-        })
+            rows.append({
+                "Name": name,
+                "SUBZONE_N": subzone,
+                "PLN_AREA_N": plan,
+                "geometry": geom_obj,
+                "centroid_lat": lat,
+                "centroid_lon": lon,
+            })
     return pd.DataFrame(rows)
 
 def load_population(pop_path: Path) -> pd.DataFrame:
@@ -91,7 +147,8 @@ def load_population(pop_path: Path) -> pd.DataFrame:
 
 def load_points(geojson_path: Path) -> pd.DataFrame:
     _assert_exists(geojson_path, "Points GeoJSON")
-    gj = json.loads(geojson_path.read_text(encoding="utf-8"))
+    with span("load.points.read", file=geojson_path.name):
+        gj = json.loads(geojson_path.read_text(encoding="utf-8"))
     rows = []
     for feat in gj.get("features", []):
         props = feat.get("properties", {}) or {}
@@ -108,6 +165,9 @@ def load_points(geojson_path: Path) -> pd.DataFrame:
                 p = coords[0]
                 if isinstance(p, (list, tuple)) and len(p) >= 2 and not isinstance(p[0], (list, tuple)):
                     lon, lat = p[0], p[1]
+        # projected layers (e.g. bus_stops.geojson in SVY21) carry WGS84 in props
+        if "Latitude" in props and "Longitude" in props:
+            lon, lat = props["Longitude"], props["Latitude"]
         if lon is not None and lat is not None:
             rows.append({"Name": props.get("Name") or props.get("NAME") or props.get("name"),
                          "lat": float(lat), "lon": float(lon)})
@@ -121,50 +181,51 @@ def compute_scores_to_geojson(
     mrt_path: Path,
     out_geojson: Path,
     w_dem=0.4, w_sup=0.3, w_acc=0.3,
+    bus_path: Path = None,
+    cache_dir=LAYER_CACHE_DIR,
+    precision=None,
+    drop_z=False,
+    network=None,
 ):
-    mp   = load_masterplan(mp_path)
-    pop  = load_population(pop_path)
-    hawk = load_points(hawker_path)
-    mrt  = load_points(mrt_path)
+    # parsed layers come from the columnar layer cache unless cache_dir=None
+    # network=network.NetworkDistances(...) makes nearest_mrt_km a walking distance
+    layer = lambda name, path, load: cached_layer(name, [path], lambda: load(path), cache_dir=cache_dir)
+    points = lambda path: layer(f"solve_points_{path.stem}", path, load_points)
+
+    mp   = layer("solve_masterplan", mp_path, load_masterplan)
+    pop  = layer("solve_population", pop_path, load_population)
+    hawk = points(hawker_path)
+    mrt  = points(mrt_path)
 
     df = mp.merge(pop, on="SUBZONE_N", how="left")
     df.rename(columns={"Total_Total": "population"}, inplace=True)
 
     # supply: hawkers within polygon
-    hawker_pts = [Point(xy) for xy in zip(hawk["lon"], hawk["lat"])]
-    supply_counts = []
-    for _, row in df.iterrows():
-        poly = row["geometry"]
-        if poly is None:
-            supply_counts.append(np.nan)
-            continue
-        cnt = 0
-        for pt in hawker_pts:
-            try:
-                if poly.contains(pt):
-                    cnt += 1
-            except Exception:
-                pass
-        supply_counts.append(cnt)
-    df["supply_count"] = supply_counts
+    with span("solve.supply_count", polygons=len(df), points=len(hawk)):
+        df["supply_count"] = count_points_in(df["geometry"], hawk.get("lon", []), hawk.get("lat", []))
 
     # accessibility: nearest MRT (km) from centroid
-    mrt_coords = list(zip(mrt["lat"], mrt["lon"]))
-    def nearest_mrt_km(lat, lon):
-        if pd.isna(lat) or pd.isna(lon) or not mrt_coords:
-            return np.nan
-        best = None
-        for (mlat, mlon) in mrt_coords:
-            d = haversine_km(lat, lon, mlat, mlon)
-            if (best is None) or (d < best):
-                best = d
-        return best
-    df["nearest_mrt_km"] = [nearest_mrt_km(la, lo) for la, lo in zip(df["centroid_lat"], df["centroid_lon"])]
+    with span("solve.nearest_mrt", queries=len(df), points=len(mrt)):
+        if network is None:
+            df["nearest_mrt_km"] = nearest_km(df["centroid_lat"], df["centroid_lon"],
+                                              mrt.get("lat", []), mrt.get("lon", []))
+        else:
+            df["nearest_mrt_km"] = network_nearest_km(network, df["centroid_lat"], df["centroid_lon"],
+                                                      mrt.get("lat", []), mrt.get("lon", []))
+
+    # optional bus layer: reported alongside, not part of the score
+    if bus_path is not None:
+        bus = points(bus_path)
+        with span("solve.bus", polygons=len(df), points=len(bus)):
+            df["bus_count"] = count_points_in(df["geometry"], bus.get("lon", []), bus.get("lat", []))
+            df["nearest_bus_km"] = nearest_km(df["centroid_lat"], df["centroid_lon"],
+                                              bus.get("lat", []), bus.get("lon", []))
 
     # z-scores
-    df["Z_Dem"] = zscore(df["population"])
-    df["Z_Sup"] = zscore(df["supply_count"])
-    df["Z_Acc"] = -zscore(df["nearest_mrt_km"])  # nearer is better
+    with span("solve.zscore"):
+        df["Z_Dem"] = zscore(df["population"])
+        df["Z_Sup"] = zscore(df["supply_count"])
+        df["Z_Acc"] = -zscore(df["nearest_mrt_km"])  # nearer is better
 
     # combined + min-max to [0,1]
     df["H_raw"] = w_dem*df["Z_Dem"] - w_sup*df["Z_Sup"] + w_acc*df["Z_Acc"]
@@ -173,30 +234,19 @@ def compute_scores_to_geojson(
     df["H_score"] = 0.5 if (pd.isna(hmin) or pd.isna(hmax) or hmin==hmax) else (h - hmin) / (hmax - hmin)
 
     # write GeoJSON
-    features = []
-    for _, r in df.iterrows():
-        geom = r["geometry"]
-        if geom is None:
-            continue
-        props = {
-            "Name": r["Name"],
-            "SUBZONE_N": r["SUBZONE_N"],
-            "PLN_AREA_N": r["PLN_AREA_N"],
-            "population": None if pd.isna(r["population"]) else float(r["population"]),
-            "supply_count": None if pd.isna(r["supply_count"]) else int(r["supply_count"]),
-            "nearest_mrt_km": None if pd.isna(r["nearest_mrt_km"]) else float(r["nearest_mrt_km"]),
-            "Z_Dem": None if pd.isna(r["Z_Dem"]) else float(r["Z_Dem"]),
-            "Z_Sup": None if pd.isna(r["Z_Sup"]) else float(r["Z_Sup"]),
-            "Z_Acc": None if pd.isna(r["Z_Acc"]) else float(r["Z_Acc"]),
-            "H_score": None if pd.isna(r["H_score"]) else float(r["H_score"]),
-        }
-        features.append({"type": "Feature", "properties": props, "geometry": mapping(geom)})
-
-    out_geojson.write_text(json.dumps({"type": "FeatureCollection", "features": features}), encoding="utf-8")
-    print(f"Wrote {out_geojson} with {len(features)} features.")
+    cols = ["Name", "SUBZONE_N", "PLN_AREA_N", "population", "supply_count", "nearest_mrt_km",
+            "Z_Dem", "Z_Sup", "Z_Acc", "H_score"]
+    if bus_path is not None:
+        cols += ["bus_count", "nearest_bus_km"]
+    out = df[cols + ["geometry"]].astype({c: "Int64" for c in ("supply_count", "bus_count") if c in cols})
+    with span("solve.write.geojson", rows=len(df)):
+        n = write_geojson(out_geojson, out, columns=cols, precision=precision,
+                          drop_z=drop_z, skip_null_geometry=True)
+    print(f"Wrote {out_geojson} with {n} features.")
 
     # Write pd.DataFrame to CSV for debugging (optional)
-    df.to_csv("debug_output.csv", index=False)
+    with span("solve.write.debug_csv"):
+        df.to_csv("debug_output.csv", index=False)
 
 
 # ---------- CLI ----------
@@ -207,11 +257,23 @@ if __name__ == "__main__":
     p.add_argument("--population", type=str, default=str(DEF_POP))
     p.add_argument("--hawkers", type=str, default=str(DEF_HAWK))
     p.add_argument("--mrt", type=str, default=str(DEF_MRT))
+    p.add_argument("--bus", type=str, nargs="?", const=str(DEF_BUS), default=None,
+                   help="also report bus_count/nearest_bus_km (default file: %(const)s)")
     p.add_argument("--out", type=str, default=str(DEF_OUT))
     p.add_argument("--w_dem", type=float, default=0.4)
     p.add_argument("--w_sup", type=float, default=0.3)
     p.add_argument("--w_acc", type=float, default=0.3)
+    p.add_argument("--no-cache", action="store_true", help="re-parse inputs instead of using the layer cache")
+    p.add_argument("--precision", type=int, default=None,
+                   help=f"round output coordinates to this many decimals (default: as read; {PRECISION} ~ 0.1 m)")
+    p.add_argument("--drop-z", action="store_true", help="write 2D coordinates only")
+    p.add_argument("--profile", metavar="REPORT.json", help="time each stage and write the span report here")
+    p.add_argument("--walk-graph", metavar="LINES", help="pedestrian line layer (e.g. an OSM extract): "
+                   "nearest_mrt_km becomes a walking distance")
+    p.add_argument("--walk-graph-layer", default=None, help="layer of --walk-graph to read (e.g. 'lines' for .osm.pbf)")
     args = p.parse_args()
+    if args.profile:
+        instrument.enable()
 
     mp   = Path(args.masterplan)
     pop  = Path(args.population)
@@ -219,4 +281,17 @@ if __name__ == "__main__":
     mrt  = Path(args.mrt)
     out  = Path(args.out)
 
-    compute_scores_to_geojson(mp, pop, hawk, mrt, out, w_dem=args.w_dem, w_sup=args.w_sup, w_acc=args.w_acc)
+    bus  = Path(args.bus) if args.bus else None
+
+    network = None
+    if args.walk_graph:
+        from network import NetworkDistances, load_graph
+        cache = None if args.no_cache else str(Path(LAYER_CACHE_DIR).parent / "network")
+        network = NetworkDistances(load_graph(args.walk_graph, args.walk_graph_layer, cache_dir=cache))
+
+    compute_scores_to_geojson(mp, pop, hawk, mrt, out, w_dem=args.w_dem, w_sup=args.w_sup, w_acc=args.w_acc,
+                              bus_path=bus, cache_dir=None if args.no_cache else LAYER_CACHE_DIR,
+                              precision=args.precision, drop_z=args.drop_z, network=network)
+    if args.profile:
+        instrument.write_report(args.profile)
+        print(f"Wrote {args.profile}")
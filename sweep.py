@@ -0,0 +1,237 @@
+"""Batched sensitivity sweeps over the kernel parameters.
+
+Every configuration of a sweep shares the same five distance matrices
+(demand->units, demand->hawkers, hawkers->units, MRT->units, bus->units), so
+SweepEngine computes each of them once and evaluates the kernel for all
+requested lambdas of a parameter in one broadcast pass. Per-parameter
+results are then reused across configurations: Dem only depends on
+(kernel_kind, lambda_D), the 2SFCA weights on lambda_C, Sup on
+(lambda_C, lambda_S), and so on. Each distinct lambda set becomes a
+component cube (ScoreDemo.compute_components) and weights/betas are applied
+with ScoreDemo.reweight.
+
+    layers = load_layers()
+    configs = grid(lambda_D=[500, 700, 900], lambda_S=[500, 700], w_D=[0.4, 0.5])
+    summary = run_sweep(layers, configs, "content/out/sweep")
+
+Results are streamed to <out_dir>/ as they are produced:
+
+    scores.csv      config_id, SUBZONE_N, H_score, rank   (one row per unit per config)
+    configs.csv     config_id, parameters, and rank stability against the
+                    baseline config: spearman, top_k_overlap, mean_abs_rank_shift
+    stability.csv   per unit: rank mean/std/min/max and share of configs in the top k
+
+Only the per-unit vectors of the distinct lambdas are held in memory; the
+kernel scratch per broadcast pass is bounded by max_bytes. The scores are
+bit-identical to compute_hawker_opportunity(engine="dense") with or without
+max_bytes/workers: distances come from the same coordinate differences and
+every (lambda, unit) sum is reduced along the contiguous source axis, in the
+order ScoreDemo._kernel_sum_block uses (tests/test_sweep.py).
+"""
+import csv, itertools, os
+import numpy as np
+
+from ScoreDemo import (LAMBDA_PARAMS, WEIGHT_PARAMS, compute_hawker_opportunity, eval_points_xy,
+                       reweight, subzone_name_column, xy_from_gdf)
+
+DEFAULTS = {k: v for k, v in compute_hawker_opportunity.__kwdefaults__.items()
+            if k in LAMBDA_PARAMS + WEIGHT_PARAMS}
+TOP_K = 20
+MAX_BYTES = 256 * 2**20  # kernel scratch per broadcast pass
+
+
+def grid(**axes):
+    """Cartesian product of parameter values as a list of full configs.
+
+    Scalars are fixed values; parameters not given take the
+    compute_hawker_opportunity defaults.
+    """
+    unknown = set(axes) - set(DEFAULTS)
+    if unknown:
+        raise TypeError(f"unknown sweep parameters: {sorted(unknown)}")
+    axes = {k: v if isinstance(v, (list, tuple, np.ndarray)) else [v] for k, v in axes.items()}
+    keys = list(axes)
+    return [{**DEFAULTS, **dict(zip(keys, vals))} for vals in itertools.product(*axes.values())]
+
+
+def _dist(XY_dst, XY_src):
+    # (dst, src) layout and coordinate differences, as ScoreDemo._kernel_sum_block
+    D = np.subtract.outer(XY_dst[:, 0], XY_src[:, 0])
+    D *= D
+    dy = np.subtract.outer(XY_dst[:, 1], XY_src[:, 1])
+    dy *= dy
+    D += dy
+    np.sqrt(D, out=D)
+    return D
+
+
+def batched_kernel_sums(D, W, lams, kind="exp", max_bytes=MAX_BYTES):
+    """sum_s W[w, s] * K(D[d, s] / lam) for every lam, weight row w and destination d.
+
+    D is a (dst, src) distance matrix, W a (n_w, src) weight matrix (or one
+    weight vector). Returns (len(lams), n_w, dst). Kernels are evaluated in
+    (lambda, destination row) blocks of at most max_bytes of scratch; a block
+    is never smaller than one row for one lambda (16 bytes per source).
+    """
+    W = np.atleast_2d(np.asarray(W, float))
+    lams = np.asarray(lams, float)
+    n_dst, n_src = D.shape
+    out = np.zeros((len(lams), len(W), n_dst))
+    if D.size == 0:
+        return out
+    # the kernel block plus one weighted temporary, float64 each
+    cells = max(1, int(max_bytes // (2 * 8 * n_src)))  # (lambda, row) pairs per block
+    rows = min(n_dst, cells)
+    per = max(1, cells // rows)
+    # each destination is reduced along its own contiguous source row, so the
+    # sums do not depend on how the rows or lambdas were blocked
+    for a in range(0, len(lams), per):
+        lam = lams[a:a + per, None, None]
+        for b in range(0, n_dst, rows):
+            K = D[b:b + rows] / lam
+            if kind == "exp":
+                K *= -1
+            else:
+                K *= K
+                K *= -0.5
+            np.exp(K, out=K)
+            for r, w in enumerate(W):
+                out[a:a + per, r, b:b + rows] = (K * w).sum(axis=2)
+            del K  # before the next block is allocated
+    return out
+
+
+class SweepEngine:
+    def __init__(
+        self, eval_units_gdf, demand_gdf, supply_gdf, mrt_gdf=None, bus_gdf=None,
+        *, pop_col="population", cap_col="capacity",
+        mrt_w_col=None, bus_w_col=None, max_bytes=MAX_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        name_col = "SUBZONE_N" if "SUBZONE_N" in eval_units_gdf.columns else subzone_name_column(eval_units_gdf)
+        self.names = eval_units_gdf[name_col].astype(str).tolist()
+
+        XY_i = eval_points_xy(eval_units_gdf)
+        XY_u = xy_from_gdf(demand_gdf)
+        XY_j = xy_from_gdf(supply_gdf)
+        self.P_u = demand_gdf[pop_col].to_numpy(float)
+        self.C_j = supply_gdf[cap_col].to_numpy(float)
+        self.n = len(XY_i)
+
+        # every distance matrix a sweep needs, computed once
+        self.D = {"dem": _dist(XY_i, XY_u), "denom": _dist(XY_j, XY_u), "sup": _dist(XY_i, XY_j)}
+        self.w = {}
+        for key, gdf, w_col in (("mrt", mrt_gdf, mrt_w_col), ("bus", bus_gdf, bus_w_col)):
+            if gdf is None or not len(gdf):
+                continue
+            self.D[key] = _dist(XY_i, xy_from_gdf(gdf))
+            self.w[key] = gdf[w_col].to_numpy(float) if w_col and w_col in gdf.columns else np.ones(len(gdf))
+
+    @classmethod
+    def from_layers(cls, layers, **kw):
+        """Build from ScoreDemo.load_layers() output."""
+        return cls(layers["subzones"], layers["demand"], layers["hawker"],
+                   layers.get("mrt"), layers.get("bus"), **kw)
+
+    def _sums(self, key, W, lams, kind):
+        return batched_kernel_sums(self.D[key], W, lams, kind, self.max_bytes)
+
+    def cubes(self, lambda_sets):
+        """{lambda set (tuple in LAMBDA_PARAMS order): component cube}."""
+        lambda_sets = sorted(set(lambda_sets), key=repr)
+        cubes = {}
+        for kind in sorted({ls[0] for ls in lambda_sets}):
+            sets = [dict(zip(LAMBDA_PARAMS, ls)) for ls in lambda_sets if ls[0] == kind]
+            uniq = {p: sorted({s[p] for s in sets}) for p in LAMBDA_PARAMS[1:]}
+
+            dem = dict(zip(uniq["lambda_D"], self._sums("dem", self.P_u, uniq["lambda_D"], kind)[:, 0]))
+            denom = self._sums("denom", self.P_u, uniq["lambda_C"], kind)[:, 0]
+            W_sup = self.C_j / np.where(denom <= 0, 1.0, denom)  # one weight row per lambda_C
+            sup = self._sums("sup", W_sup, uniq["lambda_S"], kind)
+            acc = {}
+            for key, p in (("mrt", "lambda_M"), ("bus", "lambda_B")):
+                if key in self.D:
+                    acc[key] = dict(zip(uniq[p], self._sums(key, self.w[key], uniq[p], kind)[:, 0]))
+                else:
+                    acc[key] = {lam: np.zeros(self.n) for lam in uniq[p]}
+
+            iS, iC = ({lam: i for i, lam in enumerate(uniq[p])} for p in ("lambda_S", "lambda_C"))
+            for s in sets:
+                cubes[tuple(s[p] for p in LAMBDA_PARAMS)] = {
+                    "Dem": dem[s["lambda_D"]],
+                    "Sup": sup[iS[s["lambda_S"]], iC[s["lambda_C"]]],
+                    "Acc_MRT": acc["mrt"][s["lambda_M"]],
+                    "Acc_BUS": acc["bus"][s["lambda_B"]],
+                }
+        return cubes
+
+    def run(self, configs, out_dir, *, baseline=0, top_k=TOP_K):
+        """Score every config, streaming the tables described in the module docstring."""
+        configs = [{**DEFAULTS, **c} for c in configs]
+        if not configs:
+            raise ValueError("empty sweep")
+        lam_key = lambda c: tuple(c[p] for p in LAMBDA_PARAMS)
+        cubes = self.cubes(lam_key(c) for c in configs)
+
+        # baseline first, so every other config can be compared as it streams
+        order = [baseline] + [i for i in range(len(configs)) if i != baseline]
+        n, k = self.n, min(top_k, self.n)
+        rank_sum, rank_sq = np.zeros(n), np.zeros(n)
+        rank_min, rank_max = np.full(n, n + 1), np.zeros(n, dtype=int)
+        in_top = np.zeros(n, dtype=int)
+        base_rank = base_top = None
+
+        os.makedirs(out_dir, exist_ok=True)
+        params = list(LAMBDA_PARAMS + WEIGHT_PARAMS)
+        with open(os.path.join(out_dir, "scores.csv"), "w", newline="") as fs, \
+             open(os.path.join(out_dir, "configs.csv"), "w", newline="") as fc:
+            scores_w, configs_w = csv.writer(fs), csv.writer(fc)
+            scores_w.writerow(["config_id", "SUBZONE_N", "H_score", "rank"])
+            configs_w.writerow(["config_id", *params, "spearman", "top_k_overlap", "mean_abs_rank_shift"])
+            for cid in order:
+                c = configs[cid]
+                H = reweight(cubes[lam_key(c)], **{p: c[p] for p in WEIGHT_PARAMS})["H_score"]
+                rank = np.empty(n, dtype=int)
+                rank[np.argsort(-np.nan_to_num(H, nan=-np.inf), kind="stable")] = np.arange(1, n + 1)
+                top = set(np.flatnonzero(rank <= k).tolist())
+                if base_rank is None:
+                    base_rank, base_top = rank, top
+                d = (rank - base_rank).astype(float)
+                spearman = 1 - 6 * float(d @ d) / (n * (n * n - 1)) if n > 1 else 1.0
+                configs_w.writerow([cid, *(c[p] for p in params), spearman,
+                                    len(top & base_top) / k, float(np.abs(d).mean())])
+                scores_w.writerows(zip(itertools.repeat(cid), self.names, H.tolist(), rank.tolist()))
+
+                rank_sum += rank
+                rank_sq += rank.astype(float) ** 2
+                np.minimum(rank_min, rank, out=rank_min)
+                np.maximum(rank_max, rank, out=rank_max)
+                in_top += rank <= k
+
+        m = len(configs)
+        mean = rank_sum / m
+        std = np.sqrt(np.clip(rank_sq / m - mean**2, 0, None))
+        with open(os.path.join(out_dir, "stability.csv"), "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["SUBZONE_N", "rank_mean", "rank_std", "rank_min", "rank_max", "top_k_share"])
+            w.writerows(zip(self.names, mean.tolist(), std.tolist(), rank_min.tolist(),
+                            rank_max.tolist(), (in_top / m).tolist()))
+        return {"configs": m, "lambda_sets": len(cubes), "top_k": k, "out_dir": out_dir}
+
+
+def run_sweep(layers, configs, out_dir, *, baseline=0, top_k=TOP_K, **engine_kw):
+    """SweepEngine.from_layers(layers, **engine_kw).run(configs, out_dir, ...)."""
+    return SweepEngine.from_layers(layers, **engine_kw).run(configs, out_dir, baseline=baseline, top_k=top_k)
+
+
+if __name__ == "__main__":
+    import argparse, json
+    from ScoreDemo import load_layers
+
+    p = argparse.ArgumentParser(description="Sensitivity sweep over kernel parameters")
+    p.add_argument("grid", help='JSON object of parameter -> value or list, e.g. {"lambda_D": [500, 700, 900]}')
+    p.add_argument("--out", default="content/out/sweep")
+    p.add_argument("--top-k", type=int, default=TOP_K)
+    args = p.parse_args()
+    spec = json.loads(open(args.grid).read() if os.path.exists(args.grid) else args.grid)
+    print(run_sweep(load_layers(), grid(**spec), args.out, top_k=args.top_k))
@@ -0,0 +1,23 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from ScoreDemo import TARGET_CRS
+
+# SVY21 bounding box of the synthetic layers (roughly mainland Singapore)
+BBOX = ([2000, 15000], [55000, 50000])
+
+
+@pytest.fixture(scope="session")
+def points():
+    """points(n, rng, **cols): n random points in the bounding box as a TARGET_CRS GeoDataFrame."""
+    def make(n, rng, **cols):
+        xy = rng.uniform(*BBOX, (n, 2))
+        return gpd.GeoDataFrame(cols, geometry=shapely.points(xy), crs=TARGET_CRS)
+    return make
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(11)
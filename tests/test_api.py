@@ -0,0 +1,306 @@
+import gzip
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+from backend.src.main import app  # noqa: E402
+from backend.src.services import data_service, score_service, snapshot_service  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as c:
+        if data_service.get_dataset() is None:
+            pytest.skip("no scored GeoJSON in content/out/")
+        yield c
+    # let background precompression/tile rendering finish, so it is not
+    # counted by the allocation tests that run after this module
+    for t in threading.enumerate():
+        if t.daemon:
+            t.join(timeout=120)
+
+
+@pytest.fixture
+def snapshot_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_service, "SNAPSHOT_DIR", tmp_path / "snapshots")
+    monkeypatch.setattr(snapshot_service, "SERVED_DIR", tmp_path / "served")
+    monkeypatch.setattr(snapshot_service, "_loaded", type(snapshot_service._loaded)())
+    return tmp_path
+
+
+@pytest.fixture
+def score_cache(tmp_path, monkeypatch):
+    cache = score_service.ScoreCache(spill_dir=tmp_path / "score")
+    monkeypatch.setattr(score_service, "cache", cache)
+    import backend.src.routers.score_router as score_router
+    monkeypatch.setattr(score_router, "cache", cache)
+    return cache
+
+
+def _wait_for(cond, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+# ---------- /subzones (dataset service) ----------
+def test_subzone_list_and_lookup(client):
+    names = client.get("/subzones/").json()
+    assert names["count"] == len(names["subzones"]) > 300
+    bedok = client.get("/subzones/", params={"planning_area": "bedok"}).json()
+    assert 0 < bedok["count"] < names["count"]
+    one = client.get(f"/subzones/{names['subzones'][0].lower()}").json()
+    assert one["SUBZONE_N"] == names["subzones"][0] and 1 <= one["rank"] <= one["count"]
+    assert client.get("/subzones/NOWHERE").status_code == 404
+
+
+# ---------- /data ----------
+def test_geojson_etag_and_304(client):
+    r = client.get("/data/opportunity.geojson", headers={"Accept-Encoding": "identity"})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/geo+json"
+    assert json.loads(r.content)["type"] == "FeatureCollection"
+    etag = r.headers["etag"]
+    r2 = client.get("/data/opportunity.geojson", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert r2.status_code == 304 and r2.content == b""
+
+
+def test_geojson_gzip_variant(client):
+    ds = data_service.get_dataset()
+    _wait_for(lambda: "gzip" in ds.variants)
+    r = client.get("/data/opportunity.geojson", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["etag"] != f'"{ds.etag}"'
+    assert gzip.decompress(ds.variants["gzip"]) == ds.raw == r.content  # httpx decodes the body
+
+
+# ---------- /tiles ----------
+def test_tiles(client):
+    from backend.src.services.tile_service import available
+    if not available():
+        pytest.skip("vector tiles need mapbox-vector-tile")
+    r = client.get("/tiles/11/1614/1016.mvt")  # central Singapore
+    assert r.status_code == 200 and r.content
+    assert client.get("/tiles/11/1614/1016.mvt", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+    assert client.get("/tiles/3/9/0.mvt").status_code == 404
+
+
+# ---------- /score and /config ----------
+def test_score_matches_the_scorer_and_is_cached(client, score_cache):
+    from backend.src.services.layers_service import get_layers, scorer
+    cfg = {"lambda_D": 600.0, "w_D": 0.6}
+    first = client.post("/score/", json=cfg).json()
+    again = client.post("/score/", json=cfg).json()
+    assert not first["cached"] and again["cached"] and first["key"] == again["key"]
+    assert first["subzones"] == again["subzones"]
+    L = get_layers()
+    ref = scorer().compute_hawker_opportunity(L["subzones"], L["demand"], L["hawker"], L.get("mrt"), L.get("bus"),
+                                              **first["config"])
+    got = [s["H_score"] for s in first["subzones"]]
+    assert np.allclose(got, ref["H_score"].to_numpy(), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize("body", [{"lambda_D": 0}, {"lambda_S": -5}, {"kernel_kind": "box"}])
+def test_score_rejects_bad_configs(client, body):
+    assert client.post("/score/", json=body).status_code == 422
+
+
+@pytest.mark.parametrize("method, path", [("POST", "/score"), ("DELETE", "/admin/snapshots/x")])
+def test_cors_preflight_allows_writes(client, method, path):
+    r = client.options(path, headers={"Origin": "http://localhost:5173", "Access-Control-Request-Method": method})
+    assert r.status_code == 200 and method in r.headers["access-control-allow-methods"]
+
+
+def test_config_roundtrip(client):
+    before = client.get("/config/").json()
+    try:
+        assert client.put("/config/", json={**before, "lambda_D": 800.0}).json() == {"ok": True}
+        assert client.get("/config/").json()["lambda_D"] == 800.0
+        assert client.put("/config/", json={**before, "lambda_C": -1}).status_code == 422
+    finally:
+        client.put("/config/", json=before)
+
+
+def test_reweighting_reuses_the_component_cube(client, score_cache):
+    base = client.post("/score/", json={"lambda_D": 650.0}).json()
+    stats = client.get("/score/stats").json()
+    other = client.post("/score/", json={"lambda_D": 650.0, "w_D": 0.1, "beta_BUS": 0.0}).json()
+    after = client.get("/score/stats").json()
+    assert other["cached"] and after["hits"] == stats["hits"] + 1 and after["misses"] == stats["misses"]
+    assert [s["Dem"] for s in other["subzones"]] == [s["Dem"] for s in base["subzones"]]
+    assert [s["H_score"] for s in other["subzones"]] != [s["H_score"] for s in base["subzones"]]
+
+
+# ---------- /metrics ----------
+def test_metrics(client):
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    assert isinstance(client.get("/metrics/profile").json(), dict)
+
+
+# ---------- spatial queries ----------
+def test_subzone_at_and_bbox(client):
+    r = client.get("/subzones/at", params={"lat": 1.3521, "lon": 103.8198})
+    assert r.status_code == 200 and r.json()["SUBZONE_N"]
+    assert client.get("/subzones/at", params={"lat": 0.0, "lon": 0.0}).status_code == 404
+    box = client.get("/subzones/bbox", params={"bbox": "103.80,1.28,103.86,1.32"}).json()
+    inside = client.get("/subzones/bbox", params={"bbox": "103.80,1.28,103.86,1.32", "within": True}).json()
+    assert 0 < inside["count"] < box["count"]
+    assert {s["SUBZONE_N"] for s in inside["subzones"]} <= {s["SUBZONE_N"] for s in box["subzones"]}
+    ranks = [s["rank"] for s in box["subzones"]]
+    assert ranks == sorted(ranks)
+    assert client.get("/subzones/bbox", params={"bbox": "1,2,3"}).status_code == 400
+    assert client.get("/subzones/bbox", params={"bbox": "104,1.3,103,1.4"}).status_code == 400
+
+
+@pytest.mark.parametrize("layer", ["hawker", "mrt", "bus"])
+def test_points_nearest(client, layer):
+    r = client.get(f"/points/{layer}/nearest", params={"lat": 1.3521, "lon": 103.8198, "k": 3})
+    pts = r.json()["points"]
+    assert r.status_code == 200 and len(pts) == 3
+    assert [p["distance_m"] for p in pts] == sorted(p["distance_m"] for p in pts)
+    far = client.get(f"/points/{layer}/nearest", params={"lat": 1.3521, "lon": 103.8198, "max_distance": 1}).json()
+    assert far["count"] <= 1
+
+
+def test_points_unknown_layer(client):
+    assert client.get("/points/school/nearest", params={"lat": 1.35, "lon": 103.8}).status_code == 404
+
+
+# ---------- /subzones/top ----------
+def test_subzone_top(client):
+    r = client.get("/subzones/top", params={"k": 5})
+    top = r.json()
+    assert [s["rank"] for s in top["subzones"]] == [1, 2, 3, 4, 5]
+    h = [s["H_score"] for s in top["subzones"]]
+    assert h == sorted(h, reverse=True)
+    assert client.get("/subzones/top", params={"k": 5}, headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+    asc = client.get("/subzones/top", params={"k": 3, "by": "Z_Sup", "order": "asc"}).json()
+    z = [s["Z_Sup"] for s in asc["subzones"]]
+    assert z == sorted(z)
+    area = client.get("/subzones/top", params={"k": 50, "planning_area": "bedok"}).json()
+    assert {s["PLN_AREA_N"] for s in area["subzones"]} == {"BEDOK"}
+    assert client.get("/subzones/top", params={"by": "geometry"}).status_code == 400
+    assert client.get("/subzones/top", params={"planning_area": "atlantis"}).status_code == 404
+    assert client.get("/subzones/top", params={"k": 0}).status_code == 422
+
+
+# ---------- /admin/refresh jobs ----------
+def _job(out_path, result=None, error=None):
+    from concurrent.futures import Future
+    from backend.src.services.scoring_service import ScoringJob
+    f = Future()
+    f.set_exception(error) if error else f.set_result(result or {"features": 1})
+    return ScoringJob(id="t", config={"lambda_D": 1.0}, key="k", future=f), f
+
+
+def test_finished_job_is_snapshotted(client, snapshot_dirs):
+    from backend.src.services.scoring_service import _finish
+    out = snapshot_dirs / "out.geojson"
+    out.write_bytes(data_service.get_dataset().raw)
+    job, f = _job(out)
+    try:
+        _finish(job, out, f)
+        assert job.status == "done" and job.error is None
+        snap = snapshot_service.get_snapshot(job.result["snapshot"])
+        assert snap.config == job.config
+    finally:
+        data_service.reload_dataset()
+
+
+@pytest.mark.parametrize("case", ["worker", "unreadable", "snapshot"])
+def test_failed_job_is_finished_and_not_snapshotted(client, snapshot_dirs, monkeypatch, case):
+    from backend.src.services import scoring_service
+    out = snapshot_dirs / "out.geojson"
+    out.write_bytes(data_service.get_dataset().raw)
+    data_service.reload_dataset(out)  # the old output is being served from out
+    job, f = _job(out, error=RuntimeError("boom") if case == "worker" else None)
+    if case == "unreadable":
+        time.sleep(0.01)
+        out.write_text("{not json")
+    if case == "snapshot":
+        monkeypatch.setattr(snapshot_service, "save_snapshot", lambda *a, **kw: 1 / 0)
+    try:
+        scoring_service._finish(job, out, f)
+        assert job.status == "failed" and job.finished_at is not None and job.error
+        assert snapshot_service.list_snapshots() == []
+        # so submit_refresh never joins a later refresh of this config to it
+        assert job.status not in ("queued", "running")
+    finally:
+        data_service.reload_dataset()
+
+
+def test_jobs(client):
+    assert isinstance(client.get("/admin/jobs").json()["jobs"], list)
+    assert client.get("/admin/jobs/nope").status_code == 404
+
+
+# ---------- /admin/snapshots ----------
+def test_snapshot_save_list_delete(client, snapshot_dirs):
+    ds = data_service.get_dataset()
+    snap = client.post("/admin/snapshots", params={"notes": "base"}).json()
+    assert client.post("/admin/snapshots").json()["id"] == snap["id"]  # content-addressed
+    listed = client.get("/admin/snapshots").json()
+    assert listed["current"] == snap["id"] and [s["id"] for s in listed["snapshots"]] == [snap["id"]]
+    assert client.get(f"/admin/snapshots/{snap['id']}").json()["rows"] == len(ds.features)
+
+    other = snapshot_service.save_snapshot(_changed(ds, snapshot_dirs), make_current=False)
+    assert client.delete(f"/admin/snapshots/{snap['id']}").status_code == 409  # being served
+    assert client.delete(f"/admin/snapshots/{other.id}").status_code == 200
+    assert client.get(f"/admin/snapshots/{other.id}").status_code == 404
+    assert client.post("/admin/snapshots/ffffffff/restore").status_code == 404
+
+
+def _changed(ds, tmp_path):
+    """ds with the first feature's H_score raised by 100, loaded from a file under tmp_path."""
+    doc = json.loads(ds.raw)
+    doc["features"][0]["properties"]["H_score"] += 100.0
+    path = tmp_path / "changed.geojson"
+    path.write_text(json.dumps(doc))
+    return data_service.ScoredDataset.load(path)
+
+
+@pytest.mark.parametrize("in_memory", [True, False])
+def test_restore_copies_and_swaps_in_the_dataset(client, snapshot_dirs, in_memory):
+    # restore into a copy of the served file, so content/out/ is left alone
+    out = snapshot_dirs / "out.geojson"
+    out.write_bytes(data_service.get_dataset().raw)
+    saved = data_service.reload_dataset(out)
+    snap = snapshot_service.save_snapshot(saved, make_current=False)
+    other = snapshot_service.save_snapshot(_changed(saved, snapshot_dirs), make_current=False)
+    if not in_memory:  # e.g. after a restart: rebuilt from the stored columns
+        snapshot_service._loaded.clear()
+    try:
+        snapshot_service.restore_snapshot(other.id, out)
+        snapshot_service.restore_snapshot(snap.id, out)
+        served = snapshot_service.SERVED_DIR / f"{snap.id}.geojson"
+        assert out.stat().st_ino != served.stat().st_ino
+        assert out.read_bytes() == served.read_bytes()
+        restored = data_service.get_dataset(out)
+        assert restored.path == out and (restored.mtime_ns, restored.size) == (out.stat().st_mtime_ns, out.stat().st_size)
+        # swapped in, not parsed again
+        assert (restored.features is saved.features) == in_memory
+        assert len(restored.features) == len(saved.features)
+        assert snapshot_service.current_snapshot_id() == snap.id
+    finally:
+        data_service.reload_dataset()
+
+
+def test_snapshot_diff(client, snapshot_dirs):
+    ds = data_service.get_dataset()
+    client.post("/admin/snapshots")
+    changed = _changed(ds, snapshot_dirs)
+    other = snapshot_service.save_snapshot(changed, make_current=False)
+    diff = client.get(f"/admin/snapshots/current/diff/{other.id}", params={"limit": 5}).json()
+    assert diff["rows"][0]["SUBZONE_N"] == changed.properties(0)["SUBZONE_N"]
+    assert diff["rows"][0]["rank_b"] == 1
+    assert client.get(f"/admin/snapshots/current/diff/{other.id}", params={"sort": "nope"}).status_code == 400
+    assert client.get("/admin/snapshots/current/diff/ffffffff").status_code == 404
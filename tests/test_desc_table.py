@@ -0,0 +1,60 @@
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from desc_table import parse_desc_table
+
+CONTENT = Path(__file__).resolve().parent.parent / "content"
+HAWKER_FIELDS = ("NAME", "NAME OF HAWKER CENTRE", "STATUS")
+
+
+def _descriptions(name):
+    feats = json.loads((CONTENT / name).read_text(encoding="utf-8"))["features"]
+    return [(f.get("properties") or {}).get("Description", "") for f in feats]
+
+
+def bs4_parse(html):
+    # the BeautifulSoup parser solve.py used before desc_table
+    bs4 = pytest.importorskip("bs4")
+    kv = {}
+    for tr in bs4.BeautifulSoup(html or "", "html.parser").find_all("tr"):
+        ths, tds = tr.find_all("th"), tr.find_all("td")
+        if len(ths) == 1 and len(tds) == 1:
+            kv[ths[0].get_text(strip=True)] = tds[0].get_text(strip=True)
+    return kv
+
+
+def regex_field(html, key):
+    # ScoreDemo's per-key regex before desc_table
+    m = re.search(fr"<th[^>]*>{key}</th>\s*<td[^>]*>(.*?)</td>", str(html), flags=re.I | re.S)
+    return re.sub("<.*?>", "", m.group(1)).strip() if m else None
+
+
+@pytest.mark.parametrize("layer, rows", [
+    ("MasterPlan2019SubzoneBoundaryNoSeaGEOJSON.geojson", 332),
+    ("HawkerCentresGEOJSON.geojson", None),
+    ("LTAMRTStationExitGEOJSON.geojson", None),
+])
+def test_matches_beautifulsoup(layer, rows):
+    docs = _descriptions(layer)
+    if rows is not None:
+        assert len(docs) == rows
+    assert [i for i, d in enumerate(docs) if parse_desc_table(d) != bs4_parse(d)] == []
+
+
+def test_hawker_fields_match_the_old_regex():
+    docs = _descriptions("HawkerCentresGEOJSON.geojson")
+    assert [i for i, d in enumerate(docs)
+            if any(parse_desc_table(d, HAWKER_FIELDS).get(k) != regex_field(d, k) for k in HAWKER_FIELDS)] == []
+
+
+@pytest.mark.parametrize("html, expected", [
+    ("", {}),
+    (None, {}),
+    ("<tr><th colspan='2'>Attributes</th></tr><tr><th>A</th><td>x</td></tr>", {"A": "x"}),
+    ("<tr><th>A &amp; B</th> <td> <b>one</b> two </td></tr>", {"A & B": "onetwo"}),
+])
+def test_edge_cases(html, expected):
+    assert parse_desc_table(html) == expected
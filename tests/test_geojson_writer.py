@@ -0,0 +1,95 @@
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from ScoreDemo import TARGET_CRS
+from geojson_writer import PRECISION, encode_geometry, write_geojson
+
+
+@pytest.fixture
+def frame(points, rng):
+    gdf = points(7, rng, name=[f"SZ{i}" for i in range(7)], H_score=rng.uniform(0, 1, 7),
+                 count=pd.array([1, 2, None, 4, 5, 6, 7], dtype="Int64"), flag=[True, False] * 3 + [True])
+    gdf.loc[1, "H_score"], gdf.loc[2, "H_score"] = np.nan, np.inf
+    gdf.loc[3, "name"] = None
+    gdf["tag"] = [{"a": 1}, "x", None, 3, 4.5, "ünï", "q\"uote"]
+    gdf.loc[5, "geometry"] = None
+    return gdf
+
+
+def _features(path):
+    doc = json.loads(path.read_text(encoding="utf-8"))
+    assert doc["type"] == "FeatureCollection"
+    return doc["features"]
+
+
+def test_round_trip(tmp_path, frame):
+    path = tmp_path / "out.geojson"
+    assert write_geojson(path, frame, name="layer") == len(frame)
+    back = gpd.read_file(path)
+    wgs = frame.to_crs(4326)
+    assert back["name"].tolist()[:3] == ["SZ0", "SZ1", "SZ2"]
+    ok = wgs.geometry.notna().to_numpy()
+    assert back.geometry.isna().tolist() == (~ok).tolist()
+    # coordinates are written as they are by default
+    assert shapely.equals_exact(back.geometry[ok].to_numpy(), wgs.geometry[ok].to_numpy(), 0).all()
+    assert json.loads(path.read_text(encoding="utf-8"))["name"] == "layer"
+
+
+def test_missing_and_non_finite_properties_are_null(tmp_path, frame):
+    path = tmp_path / "out.geojson"
+    write_geojson(path, frame)
+    props = [f["properties"] for f in _features(path)]
+    assert [p["H_score"] for p in props[:3]] == [frame["H_score"][0], None, None]
+    assert props[2]["count"] is None and props[3]["count"] == 4
+    assert props[3]["name"] is None
+    assert [p["flag"] for p in props[:2]] == [True, False]
+    assert [p["tag"] for p in props] == [{"a": 1}, "x", None, 3, 4.5, "ünï", "q\"uote"]
+
+
+def test_null_geometry(tmp_path, frame):
+    path = tmp_path / "out.geojson"
+    assert write_geojson(path, frame) == 7
+    assert _features(path)[5]["geometry"] is None
+    assert write_geojson(path, frame, skip_null_geometry=True) == 6
+    assert [f["properties"]["tag"] for f in _features(path)] == [{"a": 1}, "x", None, 3, 4.5, "q\"uote"]
+
+
+def test_null_geometry_skipped_with_geometry_json(tmp_path, frame):
+    geoms = encode_geometry(frame.to_crs(4326).geometry.to_numpy())
+    props = pd.DataFrame(frame.drop(columns="geometry"))
+    path = tmp_path / "out.geojson"
+    assert write_geojson(path, props, geometry_json=geoms, skip_null_geometry=True) == 6
+    feats = _features(path)
+    # each row keeps its own geometry
+    assert [f["properties"]["tag"] for f in feats][-1] == "q\"uote"
+    assert [json.dumps(f["geometry"], separators=(",", ":")) for f in feats] == [g for g in geoms if g != "null"]
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 6, 7, 100])
+def test_chunk_boundaries(tmp_path, frame, chunk):
+    whole, split = tmp_path / "whole.geojson", tmp_path / "split.geojson"
+    write_geojson(whole, frame, chunk=len(frame))
+    write_geojson(split, frame, chunk=chunk)
+    assert split.read_bytes() == whole.read_bytes()
+    empty = tmp_path / "empty.geojson"
+    assert write_geojson(empty, frame.iloc[:0], chunk=chunk) == 0
+    assert _features(empty) == []
+
+
+def test_rounding_and_z_are_opt_in():
+    g = np.array([shapely.Point(103.123456789, 1.3456789012, 7.0)], dtype=object)
+    assert json.loads(encode_geometry(g)[0])["coordinates"] == [103.123456789, 1.3456789012, 7.0]
+    assert json.loads(encode_geometry(g, PRECISION, drop_z=True)[0])["coordinates"] == [103.123457, 1.345679]
+
+
+def test_projected_frame_is_written_in_wgs84(tmp_path, frame):
+    path = tmp_path / "out.geojson"
+    assert frame.crs == TARGET_CRS
+    write_geojson(path, frame)
+    lon, lat = _features(path)[0]["geometry"]["coordinates"]
+    assert 103 < lon < 105 and 1 < lat < 2
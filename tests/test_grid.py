@@ -0,0 +1,86 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from ScoreDemo import TARGET_CRS, compute_hawker_opportunity
+from grid import GridScorer, aggregate, make_grid, spread_population
+
+
+@pytest.fixture(scope="module")
+def subzones():
+    # a 3 x 2 block of uneven quadrilaterals, so cells straddle slanted shared edges
+    xs, ys = [20000, 21130, 22470, 23600], [30000, 31210, 32350]
+    jitter = {(1, 1): (170, -130), (2, 1): (-90, 110)}
+    pt = lambda i, j: np.add((xs[i], ys[j]), jitter.get((i, j), (0, 0)))
+    polys = [shapely.Polygon([pt(i, j), pt(i + 1, j), pt(i + 1, j + 1), pt(i, j + 1)])
+             for j in range(2) for i in range(3)]
+    return gpd.GeoDataFrame({"SUBZONE_N": [f"SZ{k}" for k in range(6)],
+                             "PLN_AREA_N": ["WEST", "WEST", "EAST", "WEST", "EAST", "EAST"]},
+                            geometry=polys, crs=TARGET_CRS)
+
+
+@pytest.fixture(scope="module")
+def layers(subzones):
+    rng = np.random.default_rng(7)
+    lo, hi = subzones.total_bounds[:2] - 500, subzones.total_bounds[2:] + 500
+
+    def near(n, **cols):
+        return gpd.GeoDataFrame(cols, geometry=shapely.points(rng.uniform(lo, hi, (n, 2))), crs=TARGET_CRS)
+
+    return {
+        "subzones": subzones,
+        "demand": gpd.GeoDataFrame({"population": rng.uniform(100, 5000, len(subzones))},
+                                   geometry=subzones.representative_point(), crs=TARGET_CRS),
+        "hawker": near(12, capacity=rng.integers(20, 200, 12).astype(float)),
+        "mrt": near(4),
+        "bus": near(30),
+    }
+
+
+@pytest.mark.parametrize("shape", ["hex", "square"])
+def test_pieces_tile_each_subzone(subzones, shape):
+    grid = make_grid(subzones, cell=250, shape=shape, min_frac=0)
+    area = grid.groupby("zone")["area_m2"].sum().reindex(range(len(subzones)))
+    np.testing.assert_allclose(area, subzones.area, rtol=1e-9)
+    pieces = shapely.area(grid.geometry.to_numpy())
+    np.testing.assert_allclose(pieces, grid["area_m2"])
+    # no piece leaves its subzone or overlaps another piece of it
+    assert shapely.covers(subzones.geometry.to_numpy()[grid["zone"]], shapely.buffer(grid.geometry.to_numpy(), -1e-6)).all()
+    assert (grid["SUBZONE_N"].to_numpy() == subzones["SUBZONE_N"].to_numpy()[grid["zone"]]).all()
+
+
+def test_slivers_are_dropped(subzones):
+    grid = make_grid(subzones, cell=250, shape="hex", min_frac=0.2)
+    full = 3 * np.sqrt(3) / 2 * (250 / np.sqrt(3)) ** 2
+    assert grid["area_m2"].min() >= 0.2 * full
+
+
+@pytest.mark.parametrize("by", ["SUBZONE_N", "PLN_AREA_N"])
+def test_aggregate_conserves_population(subzones, layers, by):
+    grid = make_grid(subzones, cell=250, shape="hex")
+    grid["population"] = spread_population(grid, layers["demand"]["population"])
+    grid["H_score"] = np.random.default_rng(1).uniform(0, 1, len(grid))
+    agg = aggregate(grid, by)
+    assert agg["population"].sum() == pytest.approx(layers["demand"]["population"].sum(), rel=1e-12)
+    if by == "SUBZONE_N":
+        np.testing.assert_allclose(agg["population"], layers["demand"]["population"], rtol=1e-12)
+    assert (agg["H_score_max"] >= agg["H_score_mean"]).all()
+    assert agg["cells"].sum() == len(grid)
+
+
+def test_grid_scorer_matches_compute_hawker_opportunity(layers):
+    scorer = GridScorer(layers, cell=250, shape="hex", cache_dir=None, dtype=np.float64)
+    params = dict(lambda_D=600, lambda_C=800, w_D=0.6, w_S=0.2, w_A=0.2)
+    cells, agg = scorer.score(**params)
+    L = layers
+    ref = compute_hawker_opportunity(scorer.grid, L["demand"], L["hawker"], L["mrt"], L["bus"], **params)
+    for col in ("Dem", "Sup", "Acc", "H_score"):
+        np.testing.assert_allclose(cells[col], ref[col], rtol=1e-12, atol=1e-15)
+    assert set(agg) == {"subzone", "planning_area"}
+    assert len(agg["subzone"]) == len(layers["subzones"])
+    # a weights-only change reuses the component cube
+    scorer.score(**{**params, "w_D": 0.4})
+    assert len(scorer._cubes) == 1
+    with pytest.raises(TypeError):
+        scorer.score(w_X=1.0)
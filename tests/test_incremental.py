@@ -0,0 +1,104 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from ScoreDemo import TARGET_CRS, compute_hawker_opportunity
+from incremental import IncrementalScorer
+
+SCORES = ("Dem", "Sup", "Acc", "H_score")
+ENGINES = pytest.mark.parametrize("engine", ["sparse", "dense"])
+
+
+@pytest.fixture(scope="module")
+def layers(points):
+    rng = np.random.default_rng(5)
+    return {
+        "units": points(80, rng),
+        "demand": points(400, rng, population=rng.uniform(0, 5000, 400)),
+        "hawker": points(30, rng, capacity=rng.integers(20, 200, 30).astype(float)),
+        "mrt": points(20, rng),
+        "bus": points(150, rng),
+    }
+
+
+def _append(gdf, x, y, **cols):
+    row = gpd.GeoDataFrame({k: [v] for k, v in cols.items()}, geometry=[shapely.Point(x, y)], crs=TARGET_CRS)
+    return pd.concat([gdf, row], ignore_index=True)
+
+
+def _scorer(L, **kw):
+    return IncrementalScorer(L["units"], L["demand"], L["hawker"], L["mrt"], L["bus"], **kw)
+
+
+def _reference(L, engine="sparse", **kw):
+    layers = {k: kw.pop(k, L[k]) for k in ("hawker", "mrt", "bus")}
+    return compute_hawker_opportunity(L["units"], L["demand"], layers["hawker"], layers["mrt"], layers["bus"],
+                                      engine=engine, **kw)
+
+
+def _assert_close(state, ref):
+    got = state.result()
+    for col in SCORES:
+        np.testing.assert_allclose(got[col], ref[col], rtol=1e-12, atol=1e-12 * np.abs(ref[col]).max())
+
+
+@ENGINES
+@pytest.mark.parametrize("kind", ["exp", "gauss"])
+def test_initial_state_matches_the_engine(layers, engine, kind):
+    got = _scorer(layers, engine=engine, kernel_kind=kind).result()
+    ref = _reference(layers, engine, kernel_kind=kind)
+    for col in SCORES:
+        assert np.array_equal(got[col], ref[col]), col
+
+
+@ENGINES
+def test_add_supply_matches_a_full_rescore(layers, engine):
+    state = _scorer(layers, engine=engine)
+    hid = state.add("supply", 30100.0, 31500.0, weight=120.0)
+    assert hid == len(layers["hawker"])
+    _assert_close(state, _reference(layers, engine, hawker=_append(layers["hawker"], 30100.0, 31500.0, capacity=120.0)))
+
+
+@ENGINES
+@pytest.mark.parametrize("layer", ["mrt", "bus"])
+def test_add_access_point_matches_a_full_rescore(layers, engine, layer):
+    state = _scorer(layers, engine=engine)
+    state.add(layer, 25000.0, 40000.0)
+    _assert_close(state, _reference(layers, engine, **{layer: _append(layers[layer], 25000.0, 40000.0)}))
+
+
+@ENGINES
+def test_remove_undoes_add(layers, engine):
+    state = _scorer(layers, engine=engine)
+    before = state.result()
+    state.remove("supply", state.add("supply", 30100.0, 31500.0, weight=80.0))
+    _assert_close(state, before)
+
+
+@ENGINES
+def test_move_matches_a_full_rescore(layers, engine):
+    state = _scorer(layers, engine=engine)
+    state.move("supply", 3, 41000.0, 22000.0)
+    moved = layers["hawker"].copy()
+    moved.loc[3, "geometry"] = shapely.Point(41000.0, 22000.0)
+    _assert_close(state, _reference(layers, engine, hawker=moved))
+
+
+def test_set_weights_rescores_without_kernels(layers):
+    state = _scorer(layers)
+    state.set_weights(w_D=0.2, beta_BUS=0.0)
+    _assert_close(state, _reference(layers, w_D=0.2, beta_BUS=0.0))
+
+
+def test_errors(layers):
+    state = _scorer(layers)
+    with pytest.raises(ValueError):
+        state.add("school", 0.0, 0.0)
+    with pytest.raises(KeyError):
+        state.add("supply", 0.0, 0.0, point_id=0)
+    with pytest.raises(KeyError):
+        state.remove("mrt", 999)
+    with pytest.raises(TypeError):
+        state.set_weights(w_X=1.0)
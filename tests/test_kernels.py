@@ -0,0 +1,118 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import ScoreDemo
+from ScoreDemo import cached_kernel_sum, kernel_sum, pairwise_dist
+
+RNG = np.random.default_rng(7)
+XY_SRC = RNG.uniform([2000, 15000], [55000, 50000], (400, 2))
+XY_DST = RNG.uniform([2000, 15000], [55000, 50000], (250, 2))
+W = RNG.uniform(0, 100, len(XY_SRC))
+
+
+@pytest.mark.parametrize("engine", ["dense", "sparse"])
+@pytest.mark.parametrize("kind", ["exp", "gauss"])
+def test_workers_and_blocking_are_bit_identical_to_default(engine, kind):
+    ref = kernel_sum(XY_SRC, W, XY_DST, 700, kind, engine=engine)
+    for kw in ({"workers": 1}, {"workers": 4}, {"max_bytes": 2**16}, {"workers": 4, "max_bytes": 2**16}):
+        assert np.array_equal(kernel_sum(XY_SRC, W, XY_DST, 700, kind, engine=engine, **kw), ref), kw
+
+
+@pytest.mark.parametrize("kind, tail", [("exp", lambda c: np.exp(-c)), ("gauss", lambda c: np.exp(-c * c / 2))])
+@pytest.mark.parametrize("cutoff", [2.0, 5.0])
+def test_sparse_error_is_within_the_dropped_tail(kind, tail, cutoff):
+    dense = kernel_sum(XY_SRC, W, XY_DST, 2000, kind)
+    sparse = kernel_sum(XY_SRC, W, XY_DST, 2000, kind, engine="sparse", cutoff=cutoff)
+    assert np.all(sparse <= dense * (1 + 1e-12))
+    assert np.all(dense - sparse <= tail(cutoff) * W.sum())
+    assert np.any(dense - sparse > 0)  # the cutoff does drop pairs here
+
+
+def test_sparse_engine_keeps_the_2sfca_denominator_exact(monkeypatch, points):
+    calls = []
+    real = ScoreDemo.kernel_sum
+
+    def spy(XY_src, w, XY_dst, lam, kind="exp", **kw):
+        calls.append((len(XY_src), len(XY_dst), kw["engine"], kw["cutoff"]))
+        return real(XY_src, w, XY_dst, lam, kind, **kw)
+    monkeypatch.setattr(ScoreDemo, "kernel_sum", spy)
+    rng = np.random.default_rng(2)
+    ScoreDemo.compute_components(points(50, rng), points(400, rng, population=W), points(30, rng, capacity=np.ones(30)),
+                                 engine="sparse", cutoff=3.0)
+    # Dem (demand -> units), denom (demand -> hawkers), Sup (hawkers -> units)
+    assert calls == [(400, 50, "sparse", 3.0), (400, 30, "dense", None), (30, 50, "sparse", 3.0)]
+
+
+def test_cached_kernel_sum_reuses_the_file(tmp_path, monkeypatch):
+    ref = cached_kernel_sum(str(tmp_path), "dem", XY_SRC, W, XY_DST, 700)
+    assert len(list(tmp_path.glob("dem_*.npy"))) == 1
+    assert np.array_equal(ref, kernel_sum(XY_SRC, W, XY_DST, 700))
+
+    def boom(*a, **kw):
+        raise AssertionError("recomputed")
+    monkeypatch.setattr(ScoreDemo, "kernel_sum", boom)
+    # blocking does not change the numbers, so it shares the entry
+    for kw in ({}, {"workers": 4}, {"max_bytes": 2**16}):
+        assert np.array_equal(cached_kernel_sum(str(tmp_path), "dem", XY_SRC, W, XY_DST, 700, **kw), ref)
+    for args, kw in (((700,), {"engine": "sparse"}), ((700,), {"dtype": np.float32}), ((701,), {})):
+        with pytest.raises(AssertionError, match="recomputed"):
+            cached_kernel_sum(str(tmp_path), "dem", XY_SRC, W, XY_DST, *args, **kw)
+    with pytest.raises(AssertionError, match="recomputed"):
+        cached_kernel_sum(str(tmp_path), "dem", XY_SRC, W * 2, XY_DST, 700)
+
+
+def test_cached_sparse_sum_is_keyed_on_the_cutoff_in_use(tmp_path, monkeypatch):
+    kw = dict(engine="sparse")
+    ref = cached_kernel_sum(str(tmp_path), "dem", XY_SRC, W, XY_DST, 2000, **kw)
+    # the explicit default and the implicit one are the same entry
+    explicit = cached_kernel_sum(str(tmp_path), "dem", XY_SRC, W, XY_DST, 2000,
+                                 cutoff=ScoreDemo.SPARSE_CUTOFF["exp"], **kw)
+    assert np.array_equal(explicit, ref) and len(list(tmp_path.glob("dem_*.npy"))) == 1
+    # a new default cutoff must not be served the old entry
+    monkeypatch.setitem(ScoreDemo.SPARSE_CUTOFF, "exp", 2.0)
+    got = cached_kernel_sum(str(tmp_path), "dem", XY_SRC, W, XY_DST, 2000, **kw)
+    assert len(list(tmp_path.glob("dem_*.npy"))) == 2
+    assert np.array_equal(got, kernel_sum(XY_SRC, W, XY_DST, 2000, engine="sparse", cutoff=2.0))
+    assert not np.array_equal(got, ref)
+
+
+def test_float32_is_within_its_error_bound():
+    ref = kernel_sum(XY_SRC, W, XY_DST, 700)
+    f32 = kernel_sum(XY_SRC, W, XY_DST, 700, dtype=np.float32)
+    assert f32.dtype == np.float64
+    assert np.allclose(f32, ref, rtol=1e-5, atol=0)
+    with pytest.raises(ValueError):
+        kernel_sum(XY_SRC, W, XY_DST, 700, engine="sparse", dtype=np.float32)
+
+
+def test_pairwise_dist_has_no_cancellation_for_close_points():
+    A = np.array([[30000.0, 30000.0]])
+    B = A + [[0.001, 0.0], [3.0, 4.0]]
+    assert np.allclose(pairwise_dist(A, B), [[0.001, 5.0]], rtol=1e-6)
+
+
+def _peak_bytes(f):
+    """Peak traced allocation while f() runs, less what f() returns."""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        out = f()
+        return tracemalloc.get_traced_memory()[1] - base - getattr(out, "nbytes", 0)
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("engine", ["dense", "sparse"])
+@pytest.mark.parametrize("max_bytes", [2**21, 2**23])
+def test_blocked_scratch_stays_within_max_bytes(engine, max_bytes):
+    from scipy.spatial import cKDTree
+    # every pair within the cutoff: the sparse engine's worst case
+    rng = np.random.default_rng(3)
+    src, dst = rng.uniform(0, 1000, (2000, 2)), rng.uniform(0, 1000, (1000, 2))
+    w = rng.uniform(0, 1, len(src))
+    peak = _peak_bytes(lambda: kernel_sum(src, w, dst, 100.0, engine=engine, cutoff=100.0, max_bytes=max_bytes))
+    tree = _peak_bytes(lambda: cKDTree(src)) if engine == "sparse" else 0  # built once per call
+    # + numpy's fixed-size ufunc buffers
+    assert peak <= max_bytes + tree + 2**18
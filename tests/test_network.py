@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import shapely
+
+from network import NetworkDistances, graph_from_lines
+
+# 2 km x 1 km street grid at 100 m, every street one straight line, so the
+# streets only meet where they cross (no shared vertices). A river runs
+# between y=500 and y=600: the north-south streets stop at its banks except
+# for the bridge at x=1000.
+XS, YS = np.arange(0, 2001, 100), np.arange(0, 1001, 100)
+RIVER, BRIDGE = (500, 600), 1000
+
+
+def _lines():
+    rows = [shapely.LineString([(XS[0], y), (XS[-1], y)]) for y in YS]
+    cols = []
+    for x in XS:
+        if x == BRIDGE:
+            cols.append(shapely.LineString([(x, YS[0]), (x, YS[-1])]))
+        else:
+            cols += [shapely.LineString([(x, YS[0]), (x, RIVER[0])]), shapely.LineString([(x, RIVER[1]), (x, YS[-1])])]
+    return rows + cols
+
+
+def test_crossing_lines_are_noded():
+    g = graph_from_lines(_lines())
+    assert len(g.xy) == len(XS) * len(YS)
+    assert len(g.main) == len(g.xy)  # one connected component
+
+
+def test_river_is_crossed_at_the_bridge():
+    net = NetworkDistances(graph_from_lines(_lines()))
+    src, dst = np.array([[100.0, 400.0]]), np.array([[100.0, 700.0], [100.0, 300.0]])
+    m = net.matrix(src, dst)
+    assert np.allclose(m.dist, [100 + 900 + 100 + 900 + 100, 100])  # via x=1000, then along the bank
+    assert np.allclose(net.nearest(src, dst), m.dist)
+
+
+def test_levels_keep_a_bridge_off_what_it_passes_over():
+    # a footbridge over the river at x=1550 that meets no street vertex
+    lines = _lines() + [shapely.LineString([(1550, 400), (1550, 700)])]
+    joined = graph_from_lines(lines)
+    apart = graph_from_lines(lines, levels=["0"] * len(_lines()) + ["1"])
+    a, b = np.array([[1500.0, 400.0]]), np.array([[1500.0, 700.0]])
+    assert NetworkDistances(joined).nearest(a, b)[0] == pytest.approx(50 + 300 + 50)
+    assert NetworkDistances(apart).nearest(a, b)[0] == pytest.approx(100 + 500 + 100 + 500 + 100)
+
+
+def test_matrix_matches_dijkstra_and_nearest():
+    from scipy.sparse.csgraph import dijkstra
+    g = graph_from_lines(_lines())
+    rng = np.random.default_rng(3)
+    src = g.xy[rng.choice(len(g.xy), 15, replace=False)]
+    dst = g.xy[rng.choice(len(g.xy), 40, replace=False)]
+    net = NetworkDistances(g, cutoff=1500.0, max_bytes=8 * len(g.xy) * 4)  # several Dijkstra batches
+    m = net.matrix(src, dst)
+    full = dijkstra(g.csr, directed=False, indices=g.snap(src)[0])[:, g.snap(dst)[0]].T
+    dense = np.full(m.shape, np.inf)
+    dense[m.row, m.indices] = m.dist
+    assert np.allclose(dense, np.where(full <= 1500.0, full, np.inf))
+    near = net.nearest(src, dst)
+    within = dense.min(axis=1) < np.inf
+    assert np.allclose(near[within], dense.min(axis=1)[within])
+    assert np.allclose(near, full.min(axis=1))
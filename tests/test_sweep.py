@@ -0,0 +1,47 @@
+import tracemalloc
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from ScoreDemo import TARGET_CRS, compute_hawker_opportunity
+from sweep import batched_kernel_sums, grid, run_sweep
+
+
+def _units(rng, n):
+    x, y = rng.uniform([2000, 15000], [54000, 49000], (n, 2)).T
+    return gpd.GeoDataFrame({"SUBZONE_N": [f"SZ{i}" for i in range(n)]},
+                            geometry=shapely.box(x, y, x + 800, y + 600), crs=TARGET_CRS)
+
+
+def test_sweep_scores_are_bit_identical_to_compute_hawker_opportunity(tmp_path, points, rng):
+    units = _units(rng, 60)
+    demand = points(300, rng, population=rng.uniform(0, 5000, 300))
+    hawker = points(40, rng, capacity=rng.integers(20, 200, 40).astype(float))
+    mrt, bus = points(25, rng), points(120, rng)
+    configs = grid(kernel_kind=["exp", "gauss"], lambda_D=[500, 900], lambda_C=[600, 800], w_D=[0.4, 0.5])
+    # a small scratch budget splits the lambdas over several broadcast passes
+    run_sweep({"subzones": units, "demand": demand, "hawker": hawker, "mrt": mrt, "bus": bus},
+              configs, str(tmp_path), max_bytes=2**16)
+    scores = np.loadtxt(tmp_path / "scores.csv", delimiter=",", skiprows=1, usecols=(0, 2))
+    for cid, c in enumerate(configs):
+        ref = compute_hawker_opportunity(units, demand, hawker, mrt, bus, **c)["H_score"].to_numpy()
+        assert np.array_equal(scores[scores[:, 0] == cid, 1], ref), c
+
+
+@pytest.mark.parametrize("max_bytes", [1, 2**18, 2**20, 2**23])
+def test_batched_kernel_sums_scratch_is_bounded(rng, max_bytes):
+    D = rng.uniform(0, 5000, (200, 2000))
+    W = rng.uniform(0, 10, (2, 2000))
+    lams = np.array([300.0, 600.0, 900.0])
+    ref = batched_kernel_sums(D, W, lams, "gauss", max_bytes=2**30)
+    tracemalloc.start()
+    try:
+        got = batched_kernel_sums(D, W, lams, "gauss", max_bytes=max_bytes)
+        peak = tracemalloc.get_traced_memory()[1] - got.nbytes
+    finally:
+        tracemalloc.stop()
+    assert np.array_equal(got, ref)
+    floor = 2 * 8 * D.shape[1]  # one row for one lambda
+    assert peak <= max(max_bytes, floor) + 2**16 + 4096  # + numpy's broadcast buffer